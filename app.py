@@ -17,184 +17,252 @@ Author(s): [Your Names Here]
 Course: Computational Visual Analytics
 Date: July 2025
 """
+import math
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+# Created before the heavy imports so the boot report (/metrics) covers them
+from startup import BootTimer
+boot = BootTimer()
+
 import dash
 from dash import html, dcc
-from dash import Input, Output
-import pandas as pd
-from utils import load_combined_data
-import plotly.express as px
+from dash import Input, Output, State
+from dash.exceptions import PreventUpdate
+import numpy as np
+from reloader import DatasetStore
+from utils import DATA_DIR, load_layout_meta, save_layout_meta
+from cache import cache_from_env
+from metrics import metrics_from_env
+from jobs import background_manager_from_env
+from wire import wire_from_env
+from downloads import downloads_from_env
+from prewarm import warmer_from_env
+from memory import deep_size, memory_from_env
+from flask import Response, jsonify
+import figures
+from trends import trend_series
+
+boot.mark("imports")
+
+
+# Load data and build the (Country, Topic) partition index
+# (STREAMING_INGEST=1 builds a missing cache with the chunked ingest,
+# bounded by INGEST_MEMORY_MB; QUERY_BACKEND=sqlite queries an on-disk
+# SQLite store instead of holding the rows in memory)
+# Callbacks read store.current() so each request sees one consistent snapshot.
+# The sources are loaded on first use unless create_app() installs a dataset.
+def load_data():
+    # Imported here: pandas is only needed once the data is loaded
+    from dataset import load_backend
+    return load_backend(
+        os.environ.get("QUERY_BACKEND", "pandas"),
+        base=DATA_DIR,
+        streaming=os.environ.get("STREAMING_INGEST") == "1",
+        memory_limit_mb=int(os.environ.get("INGEST_MEMORY_MB", 0)) or None)
+
+
+store = DatasetStore(None, base=DATA_DIR, loader=load_data)
+
+# Shared figure cache, keyed by dataset version
+figure_cache = cache_from_env(version=lambda: store.current().version)
+
+# Per-callback latency/phase/payload histograms, served on /metrics
+metrics = metrics_from_env()
+
+# Countries compared on the Advanced Insights tab (comma-separated override)
+DEFAULT_INSIGHT_COUNTRIES = "Austria,France,Germany,Portugal,Spain"
+VALID_COUNTRIES = [c.strip() for c in os.environ.get("INSIGHT_COUNTRIES", DEFAULT_INSIGHT_COUNTRIES).split(",")
+                   if c.strip()]
+
+# Chart callbacks run as background jobs when BACKGROUND_CALLBACKS_DIR is set
+# (see jobs.py); switching tabs cancels the jobs of the tab being left
+background_manager = background_manager_from_env(version=lambda: store.current().version)
+BACKGROUND = {"background": True, "cancel": [Input('main-tabs', 'value')]} if background_manager else {}
+
+# Create app
+app = dash.Dash(__name__, suppress_callback_exceptions=True, background_callback_manager=background_manager)
+app.title = "Gender Gap in Energy Sector"
 
+# === Layout ===
+# Only the tab bar and the active tab's content are in the page. A tab's
+# controls and graphs (and so its callbacks) only exist once it is opened,
+# so a visit computes just the figures the user actually looks at.
+# Selections persist for the browser session across tab switches.
+
+def country_dropdown(component_id, countries, **kwargs):
+    return dcc.Dropdown(
+        id=component_id,
+        options=[{'label': c, 'value': c} for c in countries],
+        value=kwargs.pop('value', 'France'),
+        clearable=False,
+        persistence=True,
+        persistence_type='session',
+        **kwargs
+    )
 
-# Load data
-df = load_combined_data()
 
-# Extract dropdown options
-countries = sorted(df['Country'].dropna().unique())
-years = sorted(df['Year'].dropna().unique())
+def compare_dropdown(component_id, countries):
+    return dcc.Dropdown(
+        id=component_id,
+        options=[{'label': c, 'value': c} for c in countries],
+        value=[],
+        multi=True,
+        placeholder="Overlay other countries...",
+        persistence=True,
+        persistence_type='session'
+    )
 
-# Create app
-app = dash.Dash(__name__, suppress_callback_exceptions=True)
-app.title = "Gender Gap in Energy Sector"
 
-# Layout
-app.layout = html.Div([
-    html.H1("Gender Gap Visual Analytics Dashboard", style={'textAlign': 'center'}),
-
-    dcc.Tabs([
-
-        # Overview Tab
-        dcc.Tab(label='Overview', children=[
-            html.Div([
-                html.Div([
-                    html.Label("Select Country:"),
-                    dcc.Dropdown(
-                        id='country-dropdown',
-                        options=[{'label': c, 'value': c} for c in countries],
-                        value=['France'],  # default selected country as a list
-                        multi=True,
-                        clearable=False
+def overview_tab(data):
+    years = data.years
+    return html.Div([
+        html.Div([
+            html.Label("Select Country:"),
+            country_dropdown('country-dropdown', data.countries,
+                             value=['France'],  # default selected country as a list
+                             multi=True)
+        ], style={'width': '30%', 'display': 'inline-block'}),
+
+        html.Div([
+            html.Label("Select Year Range:"),
+            dcc.RangeSlider(
+                id='year-slider',
+                min=min(years),
+                max=max(years),
+                value=[min(years), max(years)],
+                marks={str(y): str(y) for y in years[::2]},
+                step=1,
+                persistence=True,
+                persistence_type='session'
             )
+        ], style={'width': '65%', 'display': 'inline-block', 'paddingLeft': '30px'}),
 
-                ], style={'width': '30%', 'display': 'inline-block'}),
-
-                html.Div([
-                    html.Label("Select Year Range:"),
-                    dcc.RangeSlider(
-                        id='year-slider',
-                        min=min(years),
-                        max=max(years),
-                        value=[min(years), max(years)],
-                        marks={str(y): str(y) for y in years[::2]},
-                        step=1
-                    )
-                ], style={'width': '65%', 'display': 'inline-block', 'paddingLeft': '30px'}),
-
-                html.Br(), html.Br(),
-
-                html.Div([
-                    html.Div(id="kpi-wage-gap", className="kpi-box"),
-                    html.Div(id="kpi-senior-roles", className="kpi-box"),
-                    html.Div(id="kpi-inventors", className="kpi-box"),
-                    html.Div(id="kpi-founders", className="kpi-box"),
-                ], style={'display': 'flex', 'justifyContent': 'space-around', 'marginTop': '20px'})
-            ])
-        ]),
+        html.Br(), html.Br(),
 
-        # Employment Tab
-        dcc.Tab(label='Employment', children=[
-            html.Div([
-                html.H3("Employment Analytics", style={'textAlign': 'center'}),
-
-                html.Div([
-                    html.Label("Select Country:"),
-                    dcc.Dropdown(
-                        id='emp-country',
-                        options=[{'label': c, 'value': c} for c in countries],
-                        value='France',
-                        clearable=False
-                    ),
-                ], style={'width': '30%', 'margin': '10px'}),
-
-                dcc.Graph(id='emp-wage-line'),
-                html.Br(),
-                dcc.Graph(id='emp-bar-gap'),
-            ])
-        ]),
+        html.Div([
+            html.Div(id="kpi-wage-gap", className="kpi-box"),
+            html.Div(id="kpi-senior-roles", className="kpi-box"),
+            html.Div(id="kpi-inventors", className="kpi-box"),
+            html.Div(id="kpi-founders", className="kpi-box"),
+        ], style={'display': 'flex', 'justifyContent': 'space-around', 'marginTop': '20px'})
+    ])
 
-        # Senior Management Tab
-        dcc.Tab(label='Senior Management', children=[
-            html.Div([
-                html.H3("Senior Management Representation", style={'textAlign': 'center'}),
-
-                html.Div([
-                    html.Label("Select Country:"),
-                    dcc.Dropdown(
-                        id='sm-country',
-                        options=[{'label': c, 'value': c} for c in countries],
-                        value='France',
-                        clearable=False
-                    ),
-                ], style={'width': '30%', 'margin': '10px'}),
-
-                dcc.Graph(id='sm-role-bar'),
-                html.Br(),
-                dcc.Graph(id='sm-role-trend')
-            ])
-        ]),
 
-        # Innovation & Patents Tab — FIXED!
-        dcc.Tab(label='Innovation & Patents', children=[
-            html.Div([
-                html.H3("Innovation & Patents", style={'textAlign': 'center'}),
-
-                html.Div([
-                    html.Label("Select Country:"),
-                    dcc.Dropdown(
-                        id='innovation-country',
-                        options=[{'label': c, 'value': c} for c in countries],
-                        value='France',
-                        clearable=False
-                    ),
-                ], style={'width': '30%', 'margin': '10px'}),
-
-                html.Div([
-                    html.Label("Select Technology or Sector:"),
-                    dcc.Dropdown(
-                        id='innovation-sector',
-                        options=[{'label': 'All', 'value': 'All'}],
-                        value='All',
-                        clearable=False
-                    ),
-                ], style={'width': '50%', 'margin': '10px'}),
-
-                dcc.Graph(id='innovation-tech-bar'),
-                html.Br(),
-                dcc.Graph(id='innovation-trend-line')
-            ])
-        ]),
+def employment_tab(data):
+    return html.Div([
+        html.H3("Employment Analytics", style={'textAlign': 'center'}),
 
-        # Empty Tabs (you can fill them later!)
-        dcc.Tab(label='Entrepreneurship', children=[
-    html.Div([
-        html.H3("Entrepreneurship & Startups", style={'textAlign': 'center'}),
+        html.Div([
+            html.Label("Select Country:"),
+            country_dropdown('emp-country', data.countries),
+        ], style={'width': '30%', 'margin': '10px'}),
+
+        html.Div([
+            html.Label("Compare with:"),
+            compare_dropdown('emp-compare', data.countries),
+        ], style={'width': '50%', 'margin': '10px'}),
+
+        dcc.Graph(id='emp-wage-line'),
+        html.Br(),
+        dcc.Graph(id='emp-bar-gap'),
+    ])
+
+
+def senior_tab(data):
+    return html.Div([
+        html.H3("Senior Management Representation", style={'textAlign': 'center'}),
+
+        html.Div([
+            html.Label("Select Country:"),
+            country_dropdown('sm-country', data.countries),
+        ], style={'width': '30%', 'margin': '10px'}),
+
+        dcc.Graph(id='sm-role-bar'),
+        html.Br(),
+        dcc.Graph(id='sm-role-trend')
+    ])
+
+
+def innovation_tab(data):
+    return html.Div([
+        html.H3("Innovation & Patents", style={'textAlign': 'center'}),
 
         html.Div([
             html.Label("Select Country:"),
+            country_dropdown('innovation-country', data.countries),
+        ], style={'width': '30%', 'margin': '10px'}),
+
+        html.Div([
+            html.Label("Compare with:"),
+            compare_dropdown('innovation-compare', data.countries),
+        ], style={'width': '50%', 'margin': '10px'}),
+
+        html.Div([
+            html.Label("Select Technology or Sector:"),
             dcc.Dropdown(
-                id='entrepreneurship-country',
-                options=[{'label': c, 'value': c} for c in countries],
-                value='France',
+                id='innovation-sector',
+                options=[{'label': 'All', 'value': 'All'}],
+                value='All',
                 clearable=False
             ),
+        ], style={'width': '50%', 'margin': '10px'}),
+
+        dcc.Graph(id='innovation-tech-bar'),
+        html.Br(),
+        dcc.Graph(id='innovation-trend-line')
+    ])
+
+
+def entrepreneurship_tab(data):
+    return html.Div([
+        html.H3("Entrepreneurship & Startups", style={'textAlign': 'center'}),
+
+        html.Div([
+            html.Label("Select Country:"),
+            country_dropdown('entrepreneurship-country', data.countries),
         ], style={'width': '30%', 'margin': '10px'}),
 
+        html.Div([
+            html.Label("Compare with:"),
+            compare_dropdown('entrepreneurship-compare', data.countries),
+        ], style={'width': '50%', 'margin': '10px'}),
+
         dcc.Graph(id='entrepreneurship-sector-bar'),
         html.Br(),
         dcc.Graph(id='entrepreneurship-trend-line')
     ])
-]),
 
-        dcc.Tab(label='Explorer', children=[
-    html.Div([
+
+def explorer_default_topic(data):
+    return 'Employment' if 'Employment' in data.topics else data.topics[0]
+
+
+def explorer_tab(data):
+    return html.Div([
         html.H3("Explorer", style={'textAlign': 'center'}),
 
         html.Div([
             html.Label("Select Country:"),
-            dcc.Dropdown(
-                id='explorer-country',
-                options=[{'label': c, 'value': c} for c in countries],
-                value='France',
-                clearable=False
-            ),
+            country_dropdown('explorer-country', data.countries),
         ], style={'width': '30%', 'margin': '10px'}),
 
+        html.Div([
+            html.Label("Compare with:"),
+            compare_dropdown('explorer-compare', data.countries),
+        ], style={'width': '50%', 'margin': '10px'}),
+
         html.Div([
             html.Label("Select Topic:"),
             dcc.Dropdown(
                 id='explorer-topic',
-                options=[{'label': t, 'value': t} for t in sorted(df['Topic'].dropna().unique())],
-                value='Employment',
-                clearable=False
+                options=[{'label': t, 'value': t} for t in data.topics],
+                value=explorer_default_topic(data),
+                clearable=False,
+                persistence=True,
+                persistence_type='session'
             ),
         ], style={'width': '30%', 'margin': '10px'}),
 
@@ -208,12 +276,28 @@ app.layout = html.Div([
             ),
         ], style={'width': '50%', 'margin': '10px'}),
 
-        dcc.Graph(id='explorer-trend-line')
+        dcc.Graph(id='explorer-trend-line'),
+
+        # Rows behind the chart, streamed by downloads.py
+        html.Div([
+            html.Label("Download the rows for years:"),
+            dcc.RangeSlider(
+                id='explorer-download-years',
+                min=min(data.years),
+                max=max(data.years),
+                value=[min(data.years), max(data.years)],
+                marks={str(y): str(y) for y in data.years[::2]},
+                step=1
+            ),
+            html.A("Download CSV", id='explorer-download-csv', download="", href="",
+                   style={'marginRight': '20px'}),
+            html.A("Download Parquet", id='explorer-download-parquet', download="", href=""),
+        ], style={'width': '65%', 'margin': '10px'})
     ])
-]),
 
-       dcc.Tab(label='Advanced Insights', children=[
-    html.Div([
+
+def advanced_tab(data):
+    return html.Div([
         html.H3("Advanced Insights", style={'textAlign': 'center'}),
 
         dcc.Graph(id='advanced-senior-chart'),
@@ -221,14 +305,142 @@ app.layout = html.Div([
         dcc.Graph(id='advanced-wage-gap-chart'),
         dcc.Graph(id='advanced-founders-chart')
     ])
-])
-    ])  # 👈 Add this to close dcc.Tabs
-    ])  # 👈 This closes html.Div([
 
 
+# value -> (label, content builder), in tab order
+TABS = {
+    'overview': ('Overview', overview_tab),
+    'employment': ('Employment', employment_tab),
+    'senior': ('Senior Management', senior_tab),
+    'innovation': ('Innovation & Patents', innovation_tab),
+    'entrepreneurship': ('Entrepreneurship', entrepreneurship_tab),
+    'explorer': ('Explorer', explorer_tab),
+    'advanced': ('Advanced Insights', advanced_tab),
+}
+DEFAULT_TAB = 'overview'
+# Tabs that show a single topic; they degrade to a notice when its source is missing
+TAB_TOPICS = {
+    'employment': 'Employment',
+    'senior': 'Senior Management',
+    'innovation': 'Innovation',
+    'entrepreneurship': 'Entrepreneurship',
+}
+
+
+def tab_available(tab, data):
+    topic = TAB_TOPICS.get(tab)
+    return topic is None or topic in data.topics
+
+
+def build_tab(tab, data):
+    label, build = TABS.get(tab, TABS[DEFAULT_TAB])
+    if not tab_available(tab, data):
+        return html.Div([
+            html.H3(label, style={'textAlign': 'center'}),
+            html.P(f"No {TAB_TOPICS[tab]} data is loaded: its source file is missing or unreadable.",
+                   style={'textAlign': 'center'}),
+        ])
+    return build(data)
+
+
+# Built per page load so a reloaded dataset's options show up
+def layout_data():
+    """
+    The loaded dataset, or, while it is still loading (LAZY_START), the
+    option lists saved from it by an earlier run, so the page can be served
+    straight away.
+    """
+    data = store.peek()
+    if data is None:
+        meta = load_layout_meta(store.base)
+        if meta is not None:
+            return SimpleNamespace(**meta)
+    return store.current()
+
+
+def serve_layout():
+    data = layout_data()
+
+    return html.Div([
+        html.H1("Gender Gap Visual Analytics Dashboard", style={'textAlign': 'center'}),
+
+        # Static Country x Topic -> Indicator (and Innovation sector) lookups
+        # used by the clientside dropdown callbacks
+        dcc.Store(id='availability-store', data=data.availability),
+
+        dcc.Tabs(id='main-tabs', value=DEFAULT_TAB, children=[
+            dcc.Tab(label=label if tab_available(value, data) else f"{label} (no data)", value=value)
+            for value, (label, _) in TABS.items()
+        ]),
+
+        # The default tab ships with the page; others are rendered when opened
+        html.Div(id='tab-content', children=build_tab(DEFAULT_TAB, data))
+    ])
+
+
+app.layout = serve_layout
+
 
 # End of layout above...
 
+@app.server.route("/cache-stats")
+def cache_stats():
+    return jsonify(figure_cache.stats())
+
+@app.server.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render() + boot.render() + downloads.render() + warmer.render()
+                    + memory.render(),
+                    mimetype="text/plain; version=0.0.4")
+
+@app.server.before_request
+def record_first_request():
+    boot.first_request()
+
+# ETags, compression and (COMPACT_WIRE=1) coded labels on the Dash responses
+wire = wire_from_env(store)
+wire.attach(app)
+
+# Streaming CSV/Parquet export of the Explorer selection
+downloads = downloads_from_env(store)
+downloads.attach(app)
+
+@app.callback(
+    Output('tab-content', 'children'),
+    Input('main-tabs', 'value'),
+    prevent_initial_call=True
+)
+@metrics.instrument
+def render_tab(tab):
+    return build_tab(tab, layout_data())
+
+# === Trend overlays ===
+
+def overlay_countries(country, compare):
+    """The selected country followed by the other countries overlaid on its trend chart."""
+    return [country] + [c for c in compare or [] if c != country]
+
+
+def overlay_traces(trend, country, name, color):
+    """
+    One line per country of a by-Country trend (yearly mean Value, see
+    Dataset.trend). A lone selected country keeps the chart's own trace
+    name; it is always drawn in the chart's color.
+    """
+    years, labels, matrix = trend
+    traces = []
+    for label, x, y in trend_series(years, labels, matrix):
+        trace = {
+            "x": x.tolist(),
+            "y": y.tolist(),
+            "type": "line",
+            "name": name if labels == [country] else label
+        }
+        if label == country:
+            trace["line"] = {"color": color}
+        traces.append(trace)
+    return traces
+
 @app.callback(
     Output("kpi-wage-gap", "children"),
     Output("kpi-senior-roles", "children"),
@@ -237,46 +449,42 @@ app.layout = html.Div([
     Input("country-dropdown", "value"),
     Input("year-slider", "value")
 )
+@metrics.instrument
 def update_kpis(selected_countries, year_range):
-    dff = df[(df["Country"].isin(selected_countries)) & 
-             (df["Year"] >= year_range[0]) & 
-             (df["Year"] <= year_range[1])]
-
-    wage_gap = dff[dff["Indicator"].str.contains("wage gap", case=False, na=False)]
-    avg_wage_gap = wage_gap["Value"].mean()
-
-    senior = dff[(dff["Topic"] == "Senior Management") & 
-                 (dff["Indicator Categories"].str.lower() == "women")]
-    senior_pct = senior["Value"].mean()
-
-    inventors = dff[(dff["Topic"] == "Innovation") & 
-                    (dff["Indicator"].str.contains("female inventors", case=False, na=False))]
-    inventors_pct = inventors["Value"].mean()
-
-    founders = dff[(dff["Topic"] == "Entrepreneurship") & 
-                   (df["Indicator"].str.contains("gender diverse", case=False, na=False))]
-    founders_pct = founders["Value"].mean()
+    data = store.current()
+    # Served from the precomputed rollup: no row scan per slider move
+    kpis = data.kpis.means(selected_countries, year_range)
+    metrics.mark("groupby")
+    avg_wage_gap = kpis["wage_gap"]
+    senior_pct = kpis["senior_roles"]
+    inventors_pct = kpis["inventors"]
+    founders_pct = kpis["founders"]
 
     return (
-        f"📊 Avg Gender Wage Gap: {avg_wage_gap:.2f}%" if not pd.isna(avg_wage_gap) else "📊 No data",
-        f"👩‍💼 % Women in Senior Roles: {senior_pct:.2f}%" if not pd.isna(senior_pct) else "👩‍💼 No data",
-        f"💡 % Female Inventors: {inventors_pct:.2f}%" if not pd.isna(inventors_pct) else "💡 No data",
-        f"🚀 % Gender-Diverse Founders: {founders_pct:.2f}%" if not pd.isna(founders_pct) else "🚀 No data"
+        f"📊 Avg Gender Wage Gap: {avg_wage_gap:.2f}%" if not math.isnan(avg_wage_gap) else "📊 No data",
+        f"👩‍💼 % Women in Senior Roles: {senior_pct:.2f}%" if not math.isnan(senior_pct) else "👩‍💼 No data",
+        f"💡 % Female Inventors: {inventors_pct:.2f}%" if not math.isnan(inventors_pct) else "💡 No data",
+        f"🚀 % Gender-Diverse Founders: {founders_pct:.2f}%" if not math.isnan(founders_pct) else "🚀 No data"
     )
 
 @app.callback(
     Output('emp-wage-line', 'figure'),
     Output('emp-bar-gap', 'figure'),
-    Input('emp-country', 'value')
+    Input('emp-country', 'value'),
+    Input('emp-compare', 'value'),
+    **BACKGROUND
 )
-def update_employment_charts(selected_country):
-    dff = df[(df['Country'] == selected_country) & (df['Topic'] == 'Employment')]
+@metrics.instrument
+@figure_cache.memoize
+def update_employment_charts(selected_country, compare=None):
+    data = store.current()
+    countries = overlay_countries(selected_country, compare)
 
-    # Line chart: Wage gap over time
-    wage_data = dff[dff['Indicator'].str.contains("wage gap", case=False, na=False)]
-    wage_data = wage_data[(wage_data['Value'] > -100) & (wage_data['Value'] < 100)]
+    # Line chart: Wage gap over time (one line per overlaid country)
+    wage_trend = data.trend(countries, 'Employment', by='Country', family="wage_gap", value_range=(-100, 100))
+    metrics.mark("groupby")
 
-    if wage_data.empty:
+    if not wage_trend[1]:
         line_fig = {
             "layout": {
                 "title": f"No Data Available for {selected_country} in this Period",
@@ -294,30 +502,25 @@ def update_employment_charts(selected_country):
             }
         }
     else:
-        # Group by year and calculate average wage gap
-        grouped = wage_data.groupby("Year")["Value"].mean().reset_index()
+        # Average wage gap per year and country
+        traces = overlay_traces(wage_trend, selected_country, "Avg Wage Gap (%)", "blue")
 
         line_fig = {
-            "data": [
-                {
-                    "x": grouped["Year"],
-                    "y": grouped["Value"],
-                    "type": "line",
-                    "name": "Avg Wage Gap (%)",
-                    "line": {"color": "blue"}
-                }
-            ],
+            "data": traces,
             "layout": {
-                "title": f"Average Gender Wage Gap Over Time in {selected_country}",
+                "title": f"Average Gender Wage Gap Over Time in {', '.join(countries)}",
                 "yaxis": {"title": "Wage Gap (%)"},
                 "xaxis": {"title": "Year"},
                 "height": 400
             }
         }
 
+    metrics.mark("figure")
+
     # Bar chart: Gap by contract type or occupation
-    bar_data = dff[dff["Indicator"].str.contains("contract|occupation", case=False, na=False)]
-    bar_data = bar_data[(bar_data['Value'] > -100) & (bar_data['Value'] < 100)]
+    bar_data = data.rows([selected_country], 'Employment', ["Indicator", "Value"],
+                         family="contract_occupation", value_range=(-100, 100))
+    metrics.mark("filter")
 
     if bar_data.empty:
         bar_fig = {
@@ -331,8 +534,8 @@ def update_employment_charts(selected_country):
         bar_fig = {
             "data": [
                 {
-                    "x": bar_data["Indicator"],
-                    "y": bar_data["Value"],
+                    "x": bar_data["Indicator"].tolist(),
+                    "y": bar_data["Value"].tolist(),
                     "type": "bar",
                     "name": "Gap (%)"
                 }
@@ -344,28 +547,30 @@ def update_employment_charts(selected_country):
             }
         }
 
+    metrics.mark("figure")
     return line_fig, bar_fig
 
 @app.callback(
     Output('sm-role-bar', 'figure'),
     Output('sm-role-trend', 'figure'),
-    Input('sm-country', 'value')
+    Input('sm-country', 'value'),
+    **BACKGROUND
 )
+@metrics.instrument
+@figure_cache.memoize
 def update_senior_management_charts(country):
-    dff = df[(df['Country'] == country) & 
-             (df['Topic'] == 'Senior Management') & 
-             (df['Indicator'].str.contains("Share of female senior managers", case=False, na=False))]
+    data = store.current()
 
     # === Bar Chart ===
     # Filter out decade-like categories (those that end with 's' and are 4 characters long, like '1950s')
-    dff_filtered = dff[~dff["Indicator Categories"].str.match(r"^\d{4}s$", na=False)]
-
-    grouped = dff_filtered.groupby("Indicator Categories")["Value"].mean().reset_index()
+    roles, means = data.group_means("Indicator Categories", [country], 'Senior Management',
+                                    family="senior_managers", exclude_category=r"^\d{4}s$")
+    metrics.mark("groupby")
 
     bar_fig = {
         "data": [{
-            "x": grouped["Indicator Categories"],
-            "y": grouped["Value"],
+            "x": roles,
+            "y": means.tolist(),
             "type": "bar",
             "name": "Women (%)"
         }],
@@ -376,8 +581,15 @@ def update_senior_management_charts(country):
         }
     }
 
+    metrics.mark("figure")
+
     # === Time Series Chart ===
-    if dff.empty:
+    # Every role's yearly mean in one pass
+    years, roles, matrix = data.trend([country], 'Senior Management', by="Indicator Categories",
+                                      family="senior_managers")
+    metrics.mark("groupby")
+
+    if not roles:
         trend_fig = {
             "layout": {
                 "title": f"No time series data for {country}",
@@ -393,54 +605,53 @@ def update_senior_management_charts(country):
             }
         }
     else:
-        trend_data = []
-        for role in dff["Indicator Categories"].dropna().unique():
-            role_data = dff[dff["Indicator Categories"] == role].groupby("Year")["Value"].mean().reset_index()
-            trend_data.append({
-                "x": role_data["Year"],
-                "y": role_data["Value"],
-                "type": "line",
-                "name": role
-            })
-
-        trend_fig = {
-            "data": trend_data,
-            "layout": {
-                "title": f"Women in Senior Roles Over Time – {country}",
-                "yaxis": {"title": "% of Women"},
-                "xaxis": {"title": "Year"}
-            }
-        }
-
+        trend_fig = figures.lines(
+            trend_series(years, roles, matrix),
+            title=f"Women in Senior Roles Over Time – {country}",
+            x_title="Year",
+            y_title="% of Women"
+        )
+
+    metrics.mark("figure")
     return bar_fig, trend_fig
 
+app.clientside_callback(
+    """
+    function(country, availability) {
+        var sectors = availability.innovation_sectors[country] || [];
+        return [{label: 'All', value: 'All'}].concat(
+            sectors.map(function(tech) { return {label: tech, value: tech}; }));
+    }
+    """,
+    Output('innovation-sector', 'options'),
+    Input('innovation-country', 'value'),
+    State('availability-store', 'data')
+)
+
 @app.callback(
     Output('innovation-tech-bar', 'figure'),
     Output('innovation-trend-line', 'figure'),
-    Output('innovation-sector', 'options'),
     Input('innovation-country', 'value'),
-    Input('innovation-sector', 'value')
+    Input('innovation-sector', 'value'),
+    Input('innovation-compare', 'value'),
+    **BACKGROUND
 )
-def update_innovation_charts(country, selected_sector):
-    dff = df[(df['Country'] == country) & 
-             (df['Topic'] == 'Innovation') & 
-             (df['Indicator'].str.contains("female inventors", case=False, na=False))]
-
-    # Build sector dropdown options dynamically
-    sector_options = [{'label': 'All', 'value': 'All'}]
-    sector_options += [{'label': tech, 'value': tech} for tech in sorted(dff['Technology or Sector'].dropna().unique())]
-
+@metrics.instrument
+@figure_cache.memoize
+def update_innovation_charts(country, selected_sector, compare=None):
+    data = store.current()
+    countries = overlay_countries(country, compare)
     # Apply sector filter if not 'All'
-    if selected_sector != 'All':
-        dff = dff[dff['Technology or Sector'] == selected_sector]
+    filters = {"family": "female_inventors", "sector": None if selected_sector == 'All' else selected_sector}
 
     # === Bar Chart: % Female Inventors by Technology ===
-    tech_grouped = dff.groupby("Technology or Sector")["Value"].mean().reset_index()
+    techs, means = data.group_means("Technology or Sector", [country], 'Innovation', **filters)
+    metrics.mark("groupby")
 
     tech_bar_fig = {
         "data": [{
-            "x": tech_grouped["Technology or Sector"],
-            "y": tech_grouped["Value"],
+            "x": techs,
+            "y": means.tolist(),
             "type": "bar",
             "name": "Female Inventors (%)"
         }],
@@ -451,8 +662,13 @@ def update_innovation_charts(country, selected_sector):
         }
     }
 
+    metrics.mark("figure")
+
     # === Line Chart: % Female Inventors Over Time ===
-    if dff.empty:
+    trend = data.trend(countries, 'Innovation', by='Country', **filters)
+    metrics.mark("groupby")
+
+    if not trend[1]:
         trend_fig = {
             "layout": {
                 "title": f"No innovation data for {country}",
@@ -468,49 +684,52 @@ def update_innovation_charts(country, selected_sector):
             }
         }
     else:
-        trend_grouped = dff.groupby("Year")["Value"].mean().reset_index()
+        traces = overlay_traces(trend, country, "% Female Inventors", "green")
 
         trend_fig = {
-            "data": [{
-                "x": trend_grouped["Year"],
-                "y": trend_grouped["Value"],
-                "type": "line",
-                "name": "% Female Inventors",
-                "line": {"color": "green"}
-            }],
+            "data": traces,
             "layout": {
-                "title": f"% Female Inventors Over Time – {country} ({selected_sector})",
+                "title": f"% Female Inventors Over Time – {', '.join(countries)} ({selected_sector})",
                 "yaxis": {"title": "% Female Inventors"},
                 "xaxis": {"title": "Year"}
             }
         }
 
-    return tech_bar_fig, trend_fig, sector_options
+    metrics.mark("figure")
+    return tech_bar_fig, trend_fig
 
 @app.callback(
     Output('entrepreneurship-sector-bar', 'figure'),
     Output('entrepreneurship-trend-line', 'figure'),
-    Input('entrepreneurship-country', 'value')
+    Input('entrepreneurship-country', 'value'),
+    Input('entrepreneurship-compare', 'value'),
+    **BACKGROUND
 )
-def update_entrepreneurship_charts(country):
-    dff = df[(df['Country'] == country) & 
-             (df['Topic'] == 'Entrepreneurship') & 
-             (df['Indicator'].str.contains("gender diverse", case=False, na=False))]
+@metrics.instrument
+@figure_cache.memoize
+def update_entrepreneurship_charts(country, compare=None):
+    data = store.current()
+    countries = overlay_countries(country, compare)
 
     # === Treemap: % Gender-Diverse Founders by Sector ===
-    sector_grouped = dff.groupby("Technology or Sector")["Value"].mean().reset_index()
+    sectors, means = data.group_means("Technology or Sector", [country], 'Entrepreneurship',
+                                      family="gender_diverse")
+    metrics.mark("groupby")
 
-    sector_tree_fig = px.treemap(
-        sector_grouped,
-        path=['Technology or Sector'],
-        values='Value',
+    sector_tree_fig = figures.treemap(
+        sectors,
+        means,
         title=f'% Gender-Diverse Founders by Sector – {country}',
-        color='Value',
-        color_continuous_scale='Oranges'
+        scale='Oranges'
     )
 
+    metrics.mark("figure")
+
     # === Line Chart: % Gender-Diverse Founders Over Time ===
-    if dff.empty:
+    trend = data.trend(countries, 'Entrepreneurship', by='Country', family="gender_diverse")
+    metrics.mark("groupby")
+
+    if not trend[1]:
         trend_fig = {
             "layout": {
                 "title": f"No entrepreneurship data for {country}",
@@ -526,53 +745,82 @@ def update_entrepreneurship_charts(country):
             }
         }
     else:
-        trend_grouped = dff.groupby("Year")["Value"].mean().reset_index()
+        traces = overlay_traces(trend, country, "% Gender-Diverse Founders", "purple")
 
         trend_fig = {
-            "data": [{
-                "x": trend_grouped["Year"],
-                "y": trend_grouped["Value"],
-                "type": "line",
-                "name": "% Gender-Diverse Founders",
-                "line": {"color": "purple"}
-            }],
+            "data": traces,
             "layout": {
-                "title": f"% Gender-Diverse Founders Over Time – {country}",
+                "title": f"% Gender-Diverse Founders Over Time – {', '.join(countries)}",
                 "yaxis": {"title": "% Gender-Diverse Founders"},
                 "xaxis": {"title": "Year"}
             }
         }
 
+    metrics.mark("figure")
     return sector_tree_fig, trend_fig
 
-@app.callback(
+# Indicator choices come from the availability map shipped in
+# 'availability-store', so picking a country/topic never hits the server
+app.clientside_callback(
+    """
+    function(country, topic, availability) {
+        var byTopic = availability.indicators[country] || {};
+        var indicators = byTopic[topic] || [];
+        var options = indicators.map(function(ind) { return {label: ind, value: ind}; });
+        // Auto-select the first indicator by default
+        return [options, indicators.length ? indicators[0] : null];
+    }
+    """,
     Output('explorer-indicator', 'options'),
     Output('explorer-indicator', 'value'),
     Input('explorer-country', 'value'),
-    Input('explorer-topic', 'value')
+    Input('explorer-topic', 'value'),
+    State('availability-store', 'data')
 )
-def update_explorer_indicator_options(country, topic):
-    dff = df[(df['Country'] == country) & (df['Topic'] == topic)]
-    indicator_options = sorted(dff['Indicator'].dropna().unique())
 
-    options = [{'label': ind, 'value': ind} for ind in indicator_options]
-
-    # Auto-select the first indicator by default
-    value = indicator_options[0] if indicator_options else None
+# The download links follow the Explorer selection without a server round trip
+app.clientside_callback(
+    """
+    function(country, compare, topic, indicator, years) {
+        var params = new URLSearchParams();
+        params.append('country', country || '');
+        (compare || []).forEach(function(c) { params.append('compare', c); });
+        params.append('topic', topic || '');
+        if (indicator) {
+            params.append('indicator', indicator);
+        }
+        params.append('start', years[0]);
+        params.append('end', years[1]);
+        var query = '?' + params.toString();
+        return ['download/explorer.csv' + query, 'download/explorer.parquet' + query];
+    }
+    """,
+    Output('explorer-download-csv', 'href'),
+    Output('explorer-download-parquet', 'href'),
+    Input('explorer-country', 'value'),
+    Input('explorer-compare', 'value'),
+    Input('explorer-topic', 'value'),
+    Input('explorer-indicator', 'value'),
+    Input('explorer-download-years', 'value')
+)
 
-    return options, value
 @app.callback(
     Output('explorer-trend-line', 'figure'),
     Input('explorer-country', 'value'),
     Input('explorer-topic', 'value'),
-    Input('explorer-indicator', 'value')
+    Input('explorer-indicator', 'value'),
+    Input('explorer-compare', 'value'),
+    **BACKGROUND
 )
-def update_explorer_trend(country, topic, indicator):
-    dff = df[(df['Country'] == country) & 
-             (df['Topic'] == topic) & 
-             (df['Indicator'] == indicator)]
-
-    if dff.empty or indicator is None:
+@metrics.instrument
+@figure_cache.memoize
+def update_explorer_trend(country, topic, indicator, compare=None):
+    data = store.current()
+    countries = overlay_countries(country, compare)
+    trend = data.trend(countries, topic, by='Country', indicator=indicator) if indicator is not None else None
+    metrics.mark("groupby")
+
+    if trend is None or not trend[1]:
         fig = {
             "layout": {
                 "title": "No data available",
@@ -588,98 +836,216 @@ def update_explorer_trend(country, topic, indicator):
             }
         }
     else:
-        grouped = dff.groupby("Year")["Value"].mean().reset_index()
+        traces = overlay_traces(trend, country, indicator, "orange")
 
         fig = {
-            "data": [{
-                "x": grouped["Year"],
-                "y": grouped["Value"],
-                "type": "line",
-                "name": indicator,
-                "line": {"color": "orange"}
-            }],
+            "data": traces,
             "layout": {
-                "title": f"{indicator} Over Time – {country} ({topic})",
+                "title": f"{indicator} Over Time – {', '.join(countries)} ({topic})",
                 "yaxis": {"title": indicator},
                 "xaxis": {"title": "Year"}
             }
         }
 
+    metrics.mark("figure")
     return fig
 
-@app.callback(
-    Output('advanced-senior-chart', 'figure'),
-    Output('advanced-inventors-chart', 'figure'),
-    Output('advanced-wage-gap-chart', 'figure'),
-    Output('advanced-founders-chart', 'figure'),
-    Input('explorer-country', 'value')  # Just a dummy input to trigger update
-)
-def update_advanced_insights(_):
+def advanced_figures(data):
+    """The four Advanced Insights figure dicts for `data`."""
 
-    VALID_COUNTRIES = ['Austria', 'France', 'Germany', 'Portugal', 'Spain']
+    def by_country(topic, family):
+        countries, means = data.group_means('Country', VALID_COUNTRIES, topic, family=family)
+        metrics.mark("groupby")
+        order = np.argsort(means, kind="stable")
+        return [str(countries[i]) for i in order], means[order]
 
     # === 1. Senior Roles ===
-    senior = df[(df['Topic'] == 'Senior Management') &
-                (df['Indicator'].str.contains("Share of female senior managers", case=False, na=False)) &
-                (df['Country'].isin(VALID_COUNTRIES))]
-    senior_grouped = senior.groupby('Country').agg(mean_value=('Value', 'mean')).reset_index()
-    senior_fig = px.bar(
-        senior_grouped.sort_values(by='mean_value', ascending=True),
-        x='mean_value', y='Country', orientation='h',
-        title='% Women in Senior Roles by Country',
-        labels={'mean_value': '% Women'},
-        color='mean_value',
-        color_continuous_scale='Blues'
-    )
+    countries, means = by_country('Senior Management', "senior_managers")
+    senior_fig = figures.hbar(countries, means, title='% Women in Senior Roles by Country',
+                              x_title='% Women', scale='Blues')
+    metrics.mark("figure")
 
     # === 2. Female Inventors ===
-    inventors = df[(df['Topic'] == 'Innovation') &
-                   (df['Indicator'].str.contains("female inventors", case=False, na=False)) &
-                   (df['Country'].isin(VALID_COUNTRIES))]
-    inventors_grouped = inventors.groupby('Country').agg(mean_value=('Value', 'mean')).reset_index()
-    inventors_fig = px.bar(
-        inventors_grouped.sort_values(by='mean_value', ascending=True),
-        x='mean_value', y='Country', orientation='h',
-        title='% Female Inventors by Country',
-        labels={'mean_value': '% Female Inventors'},
-        color='mean_value',
-        color_continuous_scale='Purples'
-    )
+    countries, means = by_country('Innovation', "female_inventors")
+    inventors_fig = figures.hbar(countries, means, title='% Female Inventors by Country',
+                                 x_title='% Female Inventors', scale='Purples')
+    metrics.mark("figure")
 
     # === 3. Wage Gap (red = worse for women) ===
-    wage = df[(df['Topic'] == 'Employment') &
-              (df['Indicator'].str.contains("wage gap", case=False, na=False)) &
-              (df['Country'].isin(VALID_COUNTRIES))]
-    wage_grouped = wage.groupby('Country').agg(mean_value=('Value', 'mean')).reset_index()
-    wage_grouped['Color'] = wage_grouped['mean_value'].apply(lambda x: 'red' if x < 0 else 'green')
-    wage_fig = px.bar(
-        wage_grouped.sort_values(by='mean_value'),
-        x='mean_value', y='Country', orientation='h',
-        title='Average Gender Wage Gap by Country',
-        labels={'mean_value': 'Wage Gap (%)'},
-        color='Color',
-        color_discrete_map={'red': 'crimson', 'green': 'seagreen'}
-    )
+    countries, means = by_country('Employment', "wage_gap")
+    wage_fig = figures.hbar(countries, means, title='Average Gender Wage Gap by Country',
+                            x_title='Wage Gap (%)', colors=np.where(means < 0, 'crimson', 'seagreen'))
+    metrics.mark("figure")
 
     # === 4. Gender-Diverse Founders ===
-    founders = df[(df['Topic'] == 'Entrepreneurship') &
-                  (df['Indicator'].str.contains("gender diverse", case=False, na=False)) &
-                  (df['Country'].isin(VALID_COUNTRIES))]
-    founders_grouped = founders.groupby('Country').agg(mean_value=('Value', 'mean')).reset_index()
-    founders_fig = px.bar(
-        founders_grouped.sort_values(by='mean_value', ascending=True),
-        x='mean_value', y='Country', orientation='h',
-        title='% Gender-Diverse Founders by Country',
-        labels={'mean_value': '% Diverse Founders'},
-        color='mean_value',
-        color_continuous_scale='Oranges'
-    )
+    countries, means = by_country('Entrepreneurship', "gender_diverse")
+    founders_fig = figures.hbar(countries, means, title='% Gender-Diverse Founders by Country',
+                                x_title='% Diverse Founders', scale='Oranges')
 
     return senior_fig, inventors_fig, wage_fig, founders_fig
 
 
+def build_advanced_insights(data):
+    # Pre-serialized once; every later visit just embeds the JSON
+    frozen = tuple(figures.freeze(fig) for fig in advanced_figures(data))
+    metrics.mark("figure")
+    return frozen
+
+
+# The insights depend only on the data, so they are built once per dataset
+# version (on the first visit to the tab) and then served from this store
+_insights_store = {}
+_insights_lock = threading.Lock()
+
 
+def advanced_insights():
+    data = store.current()
+    with _insights_lock:
+        figures = _insights_store.get(data.version)
+        if figures is None:
+            figures = build_advanced_insights(data)
+            _insights_store.clear()
+            _insights_store[data.version] = figures
+    return figures
+
+
+@app.callback(
+    Output('advanced-senior-chart', 'figure'),
+    Output('advanced-inventors-chart', 'figure'),
+    Output('advanced-wage-gap-chart', 'figure'),
+    Output('advanced-founders-chart', 'figure'),
+    Input('main-tabs', 'value')
+)
+@metrics.instrument
+def update_advanced_insights(tab):
+    if tab != 'advanced':
+        raise PreventUpdate
+    return advanced_insights()
+
+
+# === Pre-warming ===
+# Once a dataset is loaded (and after every reload), the default page and the
+# configured and most requested (tab, country) selections are computed in the
+# background so their first visitors hit the figure cache (see prewarm.py)
+
+def warm_page(data):
+    """What the first page load computes: the layout, label dictionary and default KPIs."""
+    serve_layout()
+    wire.dictionary(data)
+    update_kpis(['France'], [min(data.years), max(data.years)])
+
+
+def warm_explorer(data, country):
+    topic = explorer_default_topic(data)
+    # The indicator the clientside callback selects first
+    indicators = data.availability["indicators"].get(country, {}).get(topic, [])
+    update_explorer_trend(country, topic, indicators[0] if indicators else None, [])
+
+
+# tab -> its callbacks called with the inputs its controls start with, so
+# the results land under the keys a browser's first request looks up
+WARM_TABS = {
+    'employment': lambda data, country: update_employment_charts(country, []),
+    'senior': lambda data, country: update_senior_management_charts(country),
+    'innovation': lambda data, country: update_innovation_charts(country, 'All', []),
+    'entrepreneurship': lambda data, country: update_entrepreneurship_charts(country, []),
+    'explorer': warm_explorer,
+    'advanced': lambda data, country: advanced_insights(),
+}
+# Country input of each tab -> tab, for counting the requested selections
+WARM_INPUTS = {
+    'emp-country': 'employment',
+    'sm-country': 'senior',
+    'innovation-country': 'innovation',
+    'entrepreneurship-country': 'entrepreneurship',
+    'explorer-country': 'explorer',
+}
+
+warmer = warmer_from_env(store, warm_page, WARM_TABS, WARM_INPUTS, available=tab_available,
+                         on_ready=lambda seconds: boot.record("warm_up", seconds))
+warmer.attach(app)
+store.on_swap(warmer.start)
+
+# === Memory budget ===
+# Each worker accounts for its dataset, the structures derived from it and
+# its caches on /admin/memory. With MEMORY_BUDGET_MB set, the caches are
+# evicted, cheapest to rebuild first, whenever its RSS goes over (see memory.py).
+
+def loaded(measure, default=None):
+    """`measure(data)` for the loaded dataset; `default` while it is still loading."""
+    data = store.peek()
+    return measure(data) if data is not None else default
+
+
+def insights_usage():
+    with _insights_lock:
+        return deep_size(_insights_store)
+
+
+def drop_insights(excess):
+    with _insights_lock:
+        _insights_store.clear()
+
+
+memory = memory_from_env(columns=lambda: loaded(lambda data: data.column_usage(), {}))
+memory.track("dataset", lambda: loaded(lambda data: data.memory_usage(), {}))
+memory.track("wire_dictionaries", wire.memory_usage, evict=lambda excess: wire.clear(), cost=0,
+             rebuild="from the dataset's labels on the next response")
+if os.environ.get("QUERY_BACKEND", "pandas") == "sqlite":
+    memory.track("sqlite_page_cache", lambda: None, cost=1,
+                 evict=lambda excess: loaded(lambda data: data.release_caches()),
+                 rebuild="read back from the SQLite file (or the OS page cache) by the next queries")
+memory.track("figure_cache", figure_cache.memory_usage, evict=figure_cache.shed, cost=2,
+             rebuild="recomputed by the next request for that selection")
+memory.track("advanced_insights", insights_usage, evict=drop_insights, cost=3,
+             rebuild="on the next visit to the Advanced Insights tab")
+memory.track("kpi_partials", lambda: loaded(lambda data: data.kpis.partials_nbytes(), 0), cost=4,
+             evict=lambda excess: loaded(lambda data: data.kpis.drop_partials()),
+             rebuild="from the rows on the next hot reload")
+
+
+@app.server.route("/admin/memory")
+def memory_report():
+    return jsonify(memory.report())
+
+
+# Record every server callback registered above
+metrics.attach(app)
+boot.mark("app")
+
+
+def warm_up():
+    started = time.perf_counter()
+    data = store.current()
+    boot.record("dataset", time.perf_counter() - started)
+    boot.sources(getattr(data, "sources", None))
+    save_layout_meta(store.base, data)
+    warmer.start(data)
+    store.start(float(os.environ.get("DATA_RELOAD_INTERVAL", 0)))
+    memory.start(float(os.environ.get("MEMORY_CHECK_INTERVAL", 10)))
+
+
+def create_app(dataset=None, loader=None, merge=True):
+    """
+    App factory used by wsgi.py. Installs `dataset` (e.g. the shared
+    memory-mapped snapshot) behind the callbacks, or loads the sources
+    (with `loader` if given), starts the reloader (DATA_RELOAD_INTERVAL
+    seconds, 0 = off; with `merge=False` it reloads with `loader` rather
+    than merging the changed rows) and returns the app. With LAZY_START=1 the data is
+    loaded in a background thread instead: the page is served from the
+    cached option lists meanwhile and callbacks wait for the data.
+    """
+    if dataset is not None:
+        store.install(dataset)
+    elif loader is not None:
+        store.set_loader(loader, merge)
+    if os.environ.get("LAZY_START") == "1":
+        threading.Thread(target=warm_up, name="dataset-warm-up", daemon=True).start()
+    else:
+        warm_up()
+    return app
 
 
 if __name__ == '__main__':
+    create_app()
     app.run(debug=True)
\ No newline at end of file
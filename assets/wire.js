@@ -0,0 +1,105 @@
+/*
+ * Client half of wire.py: wraps window.fetch for Dash's layout and callback
+ * requests.
+ *  - Announces support for coded labels (X-Compact-Labels) and, when a
+ *    response carries X-Label-Dictionary, replaces every {"__l": [codes]}
+ *    with the labels from /_wire-labels/<version> (fetched once per page).
+ *  - Sends If-None-Match for a request it has seen before and replays the
+ *    remembered body when the server answers 304.
+ */
+(function () {
+    'use strict';
+
+    var CODE_KEY = '__l';
+    var MAX_REMEMBERED = 64;
+    var MAX_REMEMBERED_BYTES = 2 * 1024 * 1024;
+    var DASH_PATH = /_dash-(update-component|layout)/;
+
+    var nativeFetch = window.fetch.bind(window);
+    var dictionaries = {};
+    var remembered = new Map();
+
+    function labelsUrl(url, version) {
+        return url.split('?')[0].replace(/_dash-(update-component|layout)$/, '_wire-labels/' + version);
+    }
+
+    function dictionary(url, version) {
+        if (!dictionaries[version]) {
+            dictionaries[version] = nativeFetch(labelsUrl(url, version)).then(function (res) {
+                if (!res.ok) {
+                    delete dictionaries[version];
+                    throw new Error('Label dictionary ' + version + ' unavailable');
+                }
+                return res.json();
+            });
+        }
+        return dictionaries[version];
+    }
+
+    function decode(value, labels) {
+        if (Array.isArray(value)) {
+            for (var i = 0; i < value.length; i++) {
+                value[i] = decode(value[i], labels);
+            }
+            return value;
+        }
+        if (value !== null && typeof value === 'object') {
+            var keys = Object.keys(value);
+            if (keys.length === 1 && keys[0] === CODE_KEY) {
+                return value[CODE_KEY].map(function (code) { return labels[code]; });
+            }
+            keys.forEach(function (key) { value[key] = decode(value[key], labels); });
+        }
+        return value;
+    }
+
+    function remember(key, entry) {
+        if (entry.body.length > MAX_REMEMBERED_BYTES) {
+            return;
+        }
+        remembered.delete(key);
+        remembered.set(key, entry);
+        if (remembered.size > MAX_REMEMBERED) {
+            remembered.delete(remembered.keys().next().value);
+        }
+    }
+
+    window.fetch = function (input, init) {
+        var url = typeof input === 'string' ? input : input.url;
+        if (!DASH_PATH.test(url)) {
+            return nativeFetch(input, init);
+        }
+        init = Object.assign({}, init);
+        var headers = new Headers(init.headers || {});
+        headers.set('X-Compact-Labels', '1');
+        var key = (init.method || 'GET') + ' ' + url + ' ' + (init.body || '');
+        var previous = remembered.get(key);
+        if (previous) {
+            headers.set('If-None-Match', previous.etag);
+        }
+        init.headers = headers;
+
+        return nativeFetch(input, init).then(function (res) {
+            if (res.status === 304 && previous) {
+                return new Response(previous.body, {status: 200, headers: previous.headers});
+            }
+            var version = res.headers.get('X-Label-Dictionary');
+            var etag = res.headers.get('ETag');
+            if (!version && !etag) {
+                return res;
+            }
+            var responseHeaders = {'Content-Type': res.headers.get('Content-Type') || 'application/json'};
+            return res.text().then(function (text) {
+                var body = version ? dictionary(url, version).then(function (labels) {
+                    return JSON.stringify(decode(JSON.parse(text), labels));
+                }) : Promise.resolve(text);
+                return body.then(function (decoded) {
+                    if (etag && res.status === 200) {
+                        remember(key, {etag: etag, body: decoded, headers: responseHeaders});
+                    }
+                    return new Response(decoded, {status: res.status, headers: responseHeaders});
+                });
+            });
+        });
+    };
+})();
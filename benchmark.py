@@ -0,0 +1,224 @@
+"""
+Callback latency benchmark on synthetic data.
+
+For every scale, synthetic sources are generated (synthetic.py) or reused,
+loaded the way the app loads them, and every server callback in app.py is
+called for every country (KPIs over representative year ranges). A call is
+timed including the JSON encoding Dash does for the response; the figure
+cache and the Advanced Insights store are bypassed so each call computes.
+A second pass under tracemalloc records the memory each call allocates.
+With --backends pandas,sqlite the same calls run against each query backend
+(dataset.load_backend); results for a non-default backend are keyed
+"<scale>-<backend>".
+
+Usage:
+    python benchmark.py [--scales 1,10,100] [--repeat 3] [--backends pandas,sqlite]
+                        [--json results.json]
+                        [--baseline results.json --max-regression 0.25]
+
+With --baseline, the run exits non-zero if any callback's p95 latency grew by
+more than --max-regression (and by more than --min-delta-ms) at a scale both
+runs cover, which makes it usable as a CI regression gate.
+"""
+import argparse
+import inspect
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from plotly.io.json import to_json_plotly
+
+from dataset import BACKENDS, load_backend
+from synthetic import generate, split_scale
+from utils import SOURCE_FILES
+
+CALLBACKS = ["update_kpis", "update_employment_charts", "update_senior_management_charts",
+             "update_innovation_charts", "update_entrepreneurship_charts",
+             "update_explorer_trend", "update_advanced_insights"]
+
+
+def year_ranges(years):
+    """Full range, latest year, first half and second half of `years`."""
+    lo, hi = int(years[0]), int(years[-1])
+    mid = int(years[len(years) // 2])
+    ranges = [[lo, hi], [hi, hi], [lo, mid], [mid, hi]]
+    return [r for i, r in enumerate(ranges) if r not in ranges[:i]]
+
+
+def callback_cases(data, max_countries=None):
+    """{callback name: [argument tuples]} covering every country of `data`."""
+    countries = data.countries[:max_countries] if max_countries else data.countries
+    indicators = data.availability["indicators"]
+    sectors = data.availability["innovation_sectors"]
+
+    cases = {name: [] for name in CALLBACKS}
+    for year_range in year_ranges(data.years):
+        cases["update_kpis"].append((list(countries), year_range))
+        cases["update_kpis"].extend(([c], year_range) for c in countries)
+    for country in countries:
+        cases["update_employment_charts"].append((country,))
+        cases["update_senior_management_charts"].append((country,))
+        cases["update_entrepreneurship_charts"].append((country,))
+        cases["update_innovation_charts"].append((country, "All"))
+        cases["update_innovation_charts"].extend((country, s) for s in sectors.get(country, [])[:1])
+        for topic, names in indicators.get(country, {}).items():
+            cases["update_explorer_trend"].append((country, topic, names[0]))
+    cases["update_advanced_insights"].append(("advanced",))
+    return cases
+
+
+def _target(app_module, name):
+    # The undecorated function: skips the figure cache so every call does the work
+    func = inspect.unwrap(getattr(app_module, name))
+    if name == "update_advanced_insights":
+        def call(*args):
+            app_module._insights_store.clear()
+            return func(*args)
+        return call
+    return func
+
+
+def _run(func, args):
+    result = func(*args)
+    return len(to_json_plotly(result))
+
+
+def bench_callback(func, cases, repeat):
+    timings, payload = [], 0
+    for _ in range(repeat):
+        for args in cases:
+            started = time.perf_counter()
+            payload = _run(func, args)
+            timings.append(time.perf_counter() - started)
+
+    allocated = []
+    tracemalloc.start()
+    try:
+        for args in cases:
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            _run(func, args)
+            allocated.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+
+    ms = np.array(timings) * 1000
+    return {
+        "calls": len(timings),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+        "alloc_mean_kb": float(np.mean(allocated)) / 1024,
+        "alloc_max_kb": float(np.max(allocated)) / 1024,
+        "payload_kb": payload / 1024,
+    }
+
+
+def prepare(work_dir, scale, seed=0):
+    """Directory holding the synthetic sources for `scale` (generated if missing)."""
+    base = os.path.join(work_dir, f"x{scale}")
+    if not all(os.path.exists(os.path.join(base, f)) for f in SOURCE_FILES):
+        generate(base, scale, seed)
+    return base
+
+
+def run(scales, repeat=3, work_dir=None, max_countries=None, report=print, backends=("pandas",)):
+    import app as app_module
+
+    work_dir = work_dir or os.path.join(tempfile.gettempdir(), "gender-gap-bench")
+    results = {"scales": {}}
+    for scale in scales:
+        base = prepare(work_dir, scale)
+        for backend in backends:
+            key = str(scale) if backend == "pandas" else f"{scale}-{backend}"
+            results["scales"][key] = _run_backend(app_module, base, scale, backend, repeat,
+                                                  max_countries, report)
+    return results
+
+
+def _run_backend(app_module, base, scale, backend, repeat, max_countries, report):
+    started = time.perf_counter()
+    data = load_backend(backend, base)
+    load_seconds = time.perf_counter() - started
+    app_module.store.install(data)
+
+    cases = callback_cases(data, max_countries)
+    entry = {
+        "backend": backend,
+        "rows": len(data),
+        "countries": len(data.countries),
+        "factors": split_scale(scale),
+        "load_s": load_seconds,
+        "callbacks": {},
+    }
+    report(f"scale x{scale} ({backend}): {entry['rows']:,} rows, {entry['countries']} countries, "
+           f"loaded in {load_seconds:.2f}s")
+    for name in CALLBACKS:
+        stats = bench_callback(_target(app_module, name), cases[name], repeat)
+        entry["callbacks"][name] = stats
+        report(f"  {name:34s} n={stats['calls']:<5d} p50={stats['p50_ms']:8.2f}ms "
+               f"p95={stats['p95_ms']:8.2f}ms p99={stats['p99_ms']:8.2f}ms "
+               f"alloc={stats['alloc_mean_kb']:9.1f}KiB (max {stats['alloc_max_kb']:.1f}) "
+               f"payload={stats['payload_kb']:.1f}KiB")
+    # Peak of the whole process so far, not of this backend alone
+    entry["peak_rss_mb"] = _peak_rss_mb()
+    return entry
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def regressions(results, baseline, max_regression=0.25, min_delta_ms=1.0):
+    """(scale, callback, baseline p95, current p95) for every p95 regression."""
+    found = []
+    for scale, entry in results["scales"].items():
+        before = baseline.get("scales", {}).get(scale)
+        if before is None:
+            continue
+        for name, stats in entry["callbacks"].items():
+            old = before["callbacks"].get(name)
+            if old is None:
+                continue
+            delta = stats["p95_ms"] - old["p95_ms"]
+            if delta > min_delta_ms and stats["p95_ms"] > old["p95_ms"] * (1 + max_regression):
+                found.append((scale, name, old["p95_ms"], stats["p95_ms"]))
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", default="1,10", help="comma-separated multipliers, e.g. 1,10,100,1000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--work-dir", help="where synthetic sources are kept between runs")
+    parser.add_argument("--max-countries", type=int, help="only benchmark the first N countries")
+    parser.add_argument("--backends", default="pandas", help="comma-separated query backends: " + ",".join(BACKENDS))
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    parser.add_argument("--min-delta-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    results = run([int(s) for s in args.scales.split(",")], args.repeat, args.work_dir,
+                  args.max_countries, backends=args.backends.split(","))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        slower = regressions(results, baseline, args.max_regression, args.min_delta_ms)
+        for scale, name, old, new in slower:
+            print(f"REGRESSION x{scale} {name}: p95 {old:.2f}ms -> {new:.2f}ms")
+        sys.exit(1 if slower else 0)
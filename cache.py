@@ -0,0 +1,251 @@
+import functools
+import glob
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from memory import deep_size
+
+DEFAULT_MAXSIZE = 256
+
+
+class DiskBackend:
+    """
+    Pickle-per-entry store in a local directory, shared by every worker
+    process on the host. Least recently read entries are removed once the
+    directory holds more than `max_entries` files.
+    """
+
+    def __init__(self, directory, max_entries=2048):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + ".pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                stored_key, value = pickle.load(fh)
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return value if stored_key == key else None
+
+    def set(self, key, value):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as fh:
+                pickle.dump((key, value), fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        self._trim()
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.directory, "*.pkl")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _trim(self):
+        entries = glob.glob(os.path.join(self.directory, "*.pkl"))
+        if len(entries) <= self.max_entries:
+            return
+        def mtime(p):
+            try:
+                return os.path.getmtime(p)
+            except OSError:
+                return 0
+        for path in sorted(entries, key=mtime)[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class _Flight:
+    """One in-progress computation that concurrent identical calls wait on."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+
+    def finish(self, value=None, error=None):
+        self._value, self._error = value, error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class FigureCache:
+    """
+    Bounded LRU memoization for callbacks that are pure functions of their
+    inputs and the loaded dataset. Keys include the dataset version, so a
+    data reload invalidates every entry. An optional backend (DiskBackend)
+    is consulted on local misses so worker processes share results.
+    Concurrent misses on the same key are single-flight: the first call
+    computes and the others wait for its result (or exception).
+    The compute time of each entry is kept so that `shed` (the memory
+    budget) drops the cheapest entries to recompute first.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, backend=None, version=lambda: None):
+        self.maxsize = maxsize
+        self.backend = backend
+        self.version = version
+        self._entries = OrderedDict()
+        self._costs = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self.shed_entries = 0
+
+    def make_key(self, name, args, kwargs=None):
+        payload = [name, self.version(), list(args), kwargs or {}]
+        return json.dumps(payload, sort_keys=True, default=str)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+        if self.backend is not None:
+            value = self.backend.get(key)
+            if value is not None:
+                with self._lock:
+                    self.backend_hits += 1
+                self._store(key, value)
+                return True, value
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def set(self, key, value, cost=0.0):
+        self._store(key, value, cost)
+        if self.backend is not None:
+            self.backend.set(key, value)
+
+    def _store(self, key, value, cost=0.0):
+        # Entries read back from the backend cost (next to) nothing to get again
+        with self._lock:
+            self._entries[key] = value
+            self._costs[key] = cost
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                oldest, _ = self._entries.popitem(last=False)
+                self._costs.pop(oldest, None)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._costs.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def memoize(self, func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = self.make_key(name, args, kwargs)
+            found, value = self.get(key)
+            if found:
+                return value
+
+            with self._lock:
+                flight = self._inflight.get(key)
+                if flight is not None:
+                    self.coalesced += 1
+                else:
+                    self._inflight[key] = leader = _Flight()
+            if flight is not None:
+                return flight.wait()
+
+            try:
+                started = time.perf_counter()
+                value = func(*args, **kwargs)
+            except BaseException as exc:
+                leader.finish(error=exc)
+                raise
+            else:
+                self.set(key, value, time.perf_counter() - started)
+                leader.finish(value)
+                return value
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+        return wrapper
+
+    def memory_usage(self):
+        """Approximate bytes held by the in-memory entries."""
+        with self._lock:
+            entries = list(self._entries.items())
+        return sum(deep_size(key) + deep_size(value) for key, value in entries)
+
+    def shed(self, nbytes):
+        """
+        Drop in-memory entries, cheapest to recompute first (least recently
+        used among equals), until about `nbytes` are freed. Returns the bytes freed.
+        """
+        with self._lock:
+            entries = [(self._costs.get(key, 0.0), position, key, value)
+                       for position, (key, value) in enumerate(self._entries.items())]
+        entries.sort(key=lambda e: e[:2])
+        freed, dropped = 0, []
+        for _, _, key, value in entries:
+            if freed >= nbytes:
+                break
+            freed += deep_size(key) + deep_size(value)
+            dropped.append(key)
+        with self._lock:
+            for key in dropped:
+                if self._entries.pop(key, None) is not None:
+                    self.shed_entries += 1
+                self._costs.pop(key, None)
+        return freed
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.backend_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "backend_hits": self.backend_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+                "shed": self.shed_entries,
+                "in_flight": len(self._inflight),
+                "hit_ratio": (self.hits + self.backend_hits) / lookups if lookups else None,
+                "backend": type(self.backend).__name__ if self.backend is not None else None,
+            }
+
+
+def cache_from_env(version):
+    """FigureCache configured from FIGURE_CACHE_SIZE and (optional) FIGURE_CACHE_DIR."""
+    maxsize = int(os.environ.get("FIGURE_CACHE_SIZE", DEFAULT_MAXSIZE))
+    directory = os.environ.get("FIGURE_CACHE_DIR")
+    backend = DiskBackend(directory) if directory else None
+    return FigureCache(maxsize=maxsize, backend=backend, version=version)
@@ -0,0 +1,299 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+from indicators import family_flags, in_family
+from memory import deep_size
+from rollup import KpiRollup
+from trends import trend_matrix
+from utils import CATEGORY_COLUMNS, DATA_DIR, concat_compact, load_combined_data, load_kpi_partials
+
+# Columns identifying one observation; a reloaded row replaces the row with the same key
+MERGE_KEY = ["Country", "Year", "Technology or Sector", "Topic", "Indicator",
+             "Indicator Categories", "Unit", "Source"]
+BACKENDS = ("pandas", "sqlite")
+
+
+class Dataset:
+    """
+    Read-only snapshot of the combined data with its access indexes.
+
+    Rows are stably sorted once by (Country, Topic) so every partition is a
+    contiguous block (keeping the source row order inside it); lookups return
+    `iloc` slices of that block instead of scanning the whole frame with
+    boolean masks.
+    """
+    # Per-source load report (utils.read_sources) when built from the sources
+    sources = None
+
+    def __init__(self, df, kpi_partials=None):
+        version = df.attrs.get("version")
+        sources = df.attrs.get("sources")
+        df = df.sort_values(["Country", "Topic"], kind="stable").reset_index(drop=True)
+        df["family"] = family_flags(df["Indicator"])
+        if kpi_partials is not None:
+            kpis = KpiRollup(kpi_partials)
+        else:
+            kpis = KpiRollup.from_frame(df)
+        self._assemble(df, version, kpis, availability_map(df))
+        self.sources = sources
+
+    @classmethod
+    def prepared(cls, df, version, kpi_partials, availability):
+        """
+        Wrap a frame that is already in Dataset layout (sorted, with the
+        family column), e.g. one mapped from shared memory, without copying it.
+        """
+        dataset = cls.__new__(cls)
+        dataset._assemble(df, version, KpiRollup(kpi_partials), availability)
+        return dataset
+
+    def _assemble(self, df, version, kpis, availability):
+        self.version = version
+        df.attrs["version"] = version
+        self.df = df
+        self._empty = df.iloc[0:0]
+
+        self._partitions = _block_bounds(df, ["Country", "Topic"])
+        self._country_bounds = _block_bounds(df, ["Country"])
+
+        self.countries = sorted(self._country_bounds)
+        self.topics = sorted(df["Topic"].dropna().unique())
+        self.years = sorted(df["Year"].dropna().unique())
+
+        self.kpis = kpis
+        self.availability = availability
+        self._column_usage = None
+
+    def __len__(self):
+        return len(self.df)
+
+    # === Memory accounting (memory.py) ===
+
+    def column_usage(self):
+        """Bytes per column of the rows (measured once: the snapshot is read-only)."""
+        if self._column_usage is None:
+            usage = self.df.memory_usage(index=True, deep=True)
+            self._column_usage = {str(col): int(nbytes) for col, nbytes in usage.items()}
+        return self._column_usage
+
+    def memory_usage(self):
+        """Bytes per structure kept for the whole life of the snapshot."""
+        return {
+            "rows": sum(self.column_usage().values()),
+            "partition_index": deep_size(self._partitions) + deep_size(self._country_bounds),
+            "kpi_rollup": self.kpis.nbytes(),
+            "availability": deep_size(self.availability),
+        }
+
+    def category_labels(self):
+        """Sorted distinct labels of the categorical columns (the wire format's dictionary)."""
+        labels = set()
+        for col in CATEGORY_COLUMNS:
+            if col in self.df.columns and isinstance(self.df[col].dtype, pd.CategoricalDtype):
+                labels.update(label for label in self.df[col].cat.categories if isinstance(label, str))
+        return sorted(labels)
+
+    def slice(self, country, topic):
+        """Rows for one (country, topic) pair; an empty frame if there are none."""
+        bounds = self._partitions.get((country, topic))
+        if bounds is None:
+            return self._empty
+        return self.df.iloc[bounds[0]:bounds[1]]
+
+    def country(self, country):
+        bounds = self._country_bounds.get(country)
+        if bounds is None:
+            return self._empty
+        return self.df.iloc[bounds[0]:bounds[1]]
+
+    def for_countries(self, countries, topic=None):
+        """Rows for several countries, optionally restricted to one topic."""
+        parts = [self.country(c) if topic is None else self.slice(c, topic) for c in countries]
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return self._empty
+        if len(parts) == 1:
+            return parts[0]
+        return pd.concat(parts)
+
+    # === Queries used by the callbacks (the query-backend interface) ===
+    # Filters: family (INDICATOR_FAMILIES name), indicator, sector (exact
+    # labels), value_range (exclusive (low, high)), year_range (inclusive
+    # (first, last)) and exclude_category (regex on Indicator Categories;
+    # missing categories are kept).
+
+    def select(self, countries, topic=None, **filters):
+        """Rows of `countries` (in that order) and `topic` that pass the filters."""
+        return _filtered(self.for_countries(countries, topic), **filters)
+
+    def rows(self, countries, topic, columns, **filters):
+        return self.select(countries, topic, **filters)[columns]
+
+    def iter_rows(self, countries, topic, columns, chunk_rows=50_000, **filters):
+        """`rows` in frames of at most `chunk_rows`, filtering one block of the index at a time."""
+        for country in countries:
+            block = self.country(country) if topic is None else self.slice(country, topic)
+            for start in range(0, len(block), chunk_rows):
+                chunk = _filtered(block.iloc[start:start + chunk_rows], **filters)
+                if len(chunk):
+                    yield chunk[columns]
+
+    def group_means(self, column, countries, topic=None, **filters):
+        """(labels, mean Values) per `column` label, in category order."""
+        grouped = self.select(countries, topic, **filters).groupby(column, observed=True)["Value"].mean()
+        return list(grouped.index), grouped.to_numpy()
+
+    def trend(self, countries, topic=None, by=None, **filters):
+        """Year x `by` matrix of mean Values (see trends.trend_matrix)."""
+        return trend_matrix(self.select(countries, topic, **filters), by=by)
+
+    def merge(self, updates, version):
+        """
+        New snapshot with `updates` (compact rows, as from utils.read_source)
+        upserted on MERGE_KEY. Only the (Country, Topic) partitions the updates
+        touch are rebuilt; the others are reused as-is, and the KPI rollup and
+        availability map are adjusted rather than recomputed. Rows are only
+        added or replaced, never removed, and every update needs a Country
+        and a Topic (DatasetStore.check reloads fully otherwise).
+        """
+        updates = updates.reset_index(drop=True)
+        updates["family"] = family_flags(updates["Indicator"])
+        new_parts = {key: rows for key, rows in updates.groupby(["Country", "Topic"], observed=True, sort=False)}
+
+        parts, replaced = [], []
+        for key in sorted(set(self._partitions) | set(new_parts)):
+            old = self.slice(*key)
+            if key not in new_parts:
+                parts.append(old)
+                continue
+            new = new_parts[key]
+            stale = merge_keys(old).isin(merge_keys(new))
+            replaced.append(old[stale])
+            parts.append(concat_compact([old[~stale], new]))
+
+        df = concat_compact(parts).reset_index(drop=True)
+        if self.kpis.partials is not None:
+            kpis = self.kpis.updated(removed=concat_compact(replaced), added=updates)
+        else:
+            # Partials dropped under the memory budget: rebuilt from the rows
+            kpis = KpiRollup.from_frame(df)
+
+        availability = copy.deepcopy(self.availability)
+        touched = availability_map(concat_compact(list(new_parts.values())))
+        for country, topic in new_parts:
+            by_topic = availability["indicators"].setdefault(country, {})
+            added = touched["indicators"].get(country, {}).get(topic, [])
+            by_topic[topic] = sorted(set(by_topic.get(topic, [])) | set(added))
+            added = touched["innovation_sectors"].get(country, []) if topic == "Innovation" else []
+            if added:
+                sectors = set(availability["innovation_sectors"].get(country, []))
+                availability["innovation_sectors"][country] = sorted(sectors | set(added))
+
+        merged = Dataset.__new__(Dataset)
+        merged._assemble(df, version, kpis, availability)
+        merged.sources = self.sources
+        return merged
+
+
+def _filtered(rows, family=None, indicator=None, sector=None, value_range=None, year_range=None,
+              exclude_category=None):
+    """The `rows` that pass the query filters (see Dataset.select)."""
+    if rows.empty:
+        return rows
+    mask = np.ones(len(rows), dtype=bool)
+    if family is not None:
+        mask &= in_family(rows, family)
+    if indicator is not None:
+        mask &= (rows["Indicator"] == indicator).to_numpy()
+    if sector is not None:
+        mask &= (rows["Technology or Sector"] == sector).to_numpy()
+    if year_range is not None:
+        years = rows["Year"]
+        mask &= ((years >= year_range[0]) & (years <= year_range[1])).to_numpy()
+    if value_range is not None:
+        values = rows["Value"]
+        mask &= ((values > value_range[0]) & (values < value_range[1])).to_numpy()
+    if exclude_category is not None:
+        mask &= ~rows["Indicator Categories"].str.match(exclude_category, na=False).to_numpy(dtype=bool)
+    return rows if mask.all() else rows[mask]
+
+
+def merge_keys(frame):
+    """MERGE_KEY of every row of `frame`, as an index of strings (NaN parts compare equal)."""
+    return pd.MultiIndex.from_frame(frame[MERGE_KEY].astype(str))
+
+
+def load_dataset(base=DATA_DIR, streaming=False, memory_limit_mb=None):
+    """Load the sources under `base` into a Dataset, reusing ingest-built aggregates when present."""
+    df = load_combined_data(base, streaming=streaming, memory_limit_mb=memory_limit_mb)
+    partials = load_kpi_partials(base, df.attrs["version"]) if streaming else None
+    return Dataset(df, kpi_partials=partials)
+
+
+def load_backend(name="pandas", base=DATA_DIR, streaming=False, memory_limit_mb=None):
+    """
+    Query backend behind the callbacks: the in-memory Dataset ("pandas") or
+    the on-disk SQLite store ("sqlite", see sqlstore.py), which keeps memory
+    bounded whatever the size of the extract.
+    """
+    if name == "sqlite":
+        from sqlstore import SQLiteDataset, ensure_sqlite
+        return SQLiteDataset(ensure_sqlite(base, memory_limit_mb=memory_limit_mb))
+    if name != "pandas":
+        raise ValueError(f"Unknown query backend {name!r} (expected one of {BACKENDS})")
+    return load_dataset(base, streaming=streaming, memory_limit_mb=memory_limit_mb)
+
+
+def availability_map(df):
+    """
+    JSON-ready lookup tables for the dropdowns that only depend on the data:
+    indicators[country][topic] and innovation_sectors[country] (sectors with
+    female-inventor indicators), all sorted.
+    """
+    indicators = {}
+    combos = df[["Country", "Topic", "Indicator"]].dropna().drop_duplicates()
+    for country, topic, indicator in combos.itertuples(index=False):
+        indicators.setdefault(country, {}).setdefault(topic, []).append(indicator)
+    for by_topic in indicators.values():
+        for topic in by_topic:
+            by_topic[topic].sort()
+
+    innovation = df[(df["Topic"] == "Innovation").to_numpy() & in_family(df, "female_inventors")]
+    sectors = {}
+    combos = innovation[["Country", "Technology or Sector"]].dropna().drop_duplicates()
+    for country, sector in combos.itertuples(index=False):
+        sectors.setdefault(country, []).append(sector)
+    for country in sectors:
+        sectors[country].sort()
+
+    return {"indicators": indicators, "innovation_sectors": sectors}
+
+
+def _block_bounds(df, columns):
+    """Map each key of the (already sorted) `columns` to its (start, stop) row range."""
+    if df.empty:
+        return {}
+    codes = [_codes(df[col]) for col in columns]
+    change = np.zeros(len(df), dtype=bool)
+    change[0] = True
+    for c in codes:
+        change[1:] |= c[1:] != c[:-1]
+    starts = np.flatnonzero(change)
+    stops = np.append(starts[1:], len(df))
+
+    keys = [df[col].iloc[starts].tolist() for col in columns]
+    bounds = {}
+    for i, (start, stop) in enumerate(zip(starts.tolist(), stops.tolist())):
+        key = tuple(k[i] for k in keys)
+        if any(pd.isna(k) for k in key):
+            continue
+        bounds[key[0] if len(key) == 1 else key] = (start, stop)
+    return bounds
+
+
+def _codes(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy()
+    return pd.factorize(series)[0]
@@ -0,0 +1,200 @@
+"""
+Streaming download of the rows behind the Explorer chart.
+
+    GET /download/explorer.csv?country=France&compare=Spain&topic=Employment
+        &indicator=...&start=2010&end=2020            (or explorer.parquet)
+
+streams the (countries, topic, indicator, year range) slice of the snapshot
+that was current when the request started. Rows come from the query
+backend's iter_rows in chunks of EXPORT_CHUNK_ROWS and are encoded one chunk
+at a time (CSV text, or one Parquet row group per chunk), so a download
+holds about one chunk in memory whatever its size. The WSGI server writes
+each chunk to the socket before asking for the next one, so a slow client
+slows down its own download instead of piling it up in memory.
+
+At most EXPORT_MAX_CONCURRENT downloads stream at once per process; further
+requests are answered 429 with Retry-After, so large exports cannot take
+every worker thread away from the dashboard.
+"""
+import io
+import os
+import re
+import threading
+
+from flask import Response, request
+
+# Source columns of the exported rows, in file order
+EXPORT_COLUMNS = ["Country", "Year", "Technology or Sector", "Topic", "Indicator",
+                  "Indicator Categories", "Unit", "Value", "Number of observations", "Source"]
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+DEFAULT_CHUNK_ROWS = 50_000
+RETRY_AFTER_S = 5
+
+
+def _csv(chunks):
+    yield (",".join(EXPORT_COLUMNS) + "\n").encode()
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=False, lineterminator="\n").encode()
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands its bytes over on every drain()."""
+
+    def __init__(self):
+        self._parts = []
+        self._written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._written += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._written
+
+    def drain(self):
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def _parquet(chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Fixed so every chunk (from either backend, even an all-null column) fits
+    schema = pa.schema([(col, pa.string()) for col in EXPORT_COLUMNS])
+    schema = schema.set(EXPORT_COLUMNS.index("Year"), pa.field("Year", pa.int16()))
+    schema = schema.set(EXPORT_COLUMNS.index("Value"), pa.field("Value", pa.float32()))
+    schema = schema.set(EXPORT_COLUMNS.index("Number of observations"),
+                        pa.field("Number of observations", pa.int32()))
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema)
+    for chunk in chunks:
+        writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {"csv": _csv, "parquet": _parquet}
+
+
+def _slug(text):
+    return re.sub(r"[^A-Za-z0-9]+", "-", str(text)).strip("-").lower()[:60]
+
+
+class Downloads:
+    """The Explorer download route, bound to a DatasetStore."""
+
+    def __init__(self, store, max_concurrent=2, chunk_rows=DEFAULT_CHUNK_ROWS):
+        self.store = store
+        self.max_concurrent = max_concurrent
+        self.chunk_rows = chunk_rows
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.counts = {"started": 0, "completed": 0, "rejected": 0, "rows": 0, "bytes": 0}
+
+    def attach(self, app):
+        prefix = app.config.routes_pathname_prefix
+        app.server.add_url_rule(prefix + "download/explorer.<fmt>", "download_explorer", self.explorer)
+
+    def explorer(self, fmt):
+        if fmt not in FORMATS:
+            return Response(f"Unknown format {fmt!r}", status=404)
+        args = request.args
+        country = args.get("country")
+        topic, indicator = args.get("topic") or None, args.get("indicator") or None
+        if not country:
+            return Response("Missing country", status=400)
+        try:
+            years = (int(args["start"]), int(args["end"])) if "start" in args and "end" in args else None
+        except ValueError:
+            return Response("start and end must be years", status=400)
+        countries = list(dict.fromkeys([country] + args.getlist("compare")))
+
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected", 1)
+            response = Response("Too many downloads in progress, retry shortly", status=429)
+            response.headers["Retry-After"] = str(RETRY_AFTER_S)
+            return response
+        try:
+            data = self.store.current()
+            chunks = data.iter_rows(countries, topic, EXPORT_COLUMNS, self.chunk_rows,
+                                    indicator=indicator, year_range=years)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.in_flight += 1
+            self.counts["started"] += 1
+        response = Response(self._stream(ENCODERS[fmt], chunks), mimetype=FORMATS[fmt])
+        response.call_on_close(self._finished())
+        name = "-".join(_slug(p) for p in ["explorer", *countries, topic, indicator, *(years or ())] if p)
+        response.headers["Content-Disposition"] = f'attachment; filename="{name}.{fmt}"'
+        response.headers["X-Dataset-Version"] = str(data.version)
+        return response
+
+    def _stream(self, encoder, chunks):
+        def counted():
+            for chunk in chunks:
+                self._count("rows", len(chunk))
+                yield chunk
+
+        try:
+            for payload in encoder(counted()):
+                self._count("bytes", len(payload))
+                yield payload
+            self._count("completed", 1)
+        finally:
+            # Closes the backend's cursor when the client goes away mid-download
+            chunks.close()
+
+    def _finished(self):
+        released = []
+
+        def release():
+            # Runs when the server closes the response, whether or not it was streamed
+            if released:
+                return
+            released.append(True)
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+        return release
+
+    def _count(self, key, n):
+        with self._lock:
+            self.counts[key] += n
+
+    def render(self):
+        with self._lock:
+            counts, in_flight = dict(self.counts), self.in_flight
+        lines = ["# HELP dash_downloads_total Explorer downloads by outcome.",
+                 "# TYPE dash_downloads_total counter"]
+        lines += [f'dash_downloads_total{{outcome="{key}"}} {counts[key]}'
+                  for key in ("started", "completed", "rejected")]
+        lines += ["# HELP dash_download_rows_total Rows streamed by Explorer downloads.",
+                  "# TYPE dash_download_rows_total counter",
+                  f"dash_download_rows_total {counts['rows']}",
+                  "# HELP dash_download_bytes_total Bytes streamed by Explorer downloads.",
+                  "# TYPE dash_download_bytes_total counter",
+                  f"dash_download_bytes_total {counts['bytes']}",
+                  "# HELP dash_downloads_in_flight Explorer downloads currently streaming.",
+                  "# TYPE dash_downloads_in_flight gauge",
+                  f"dash_downloads_in_flight {in_flight}"]
+        return "\n".join(lines) + "\n"
+
+
+def downloads_from_env(store):
+    """Downloads configured from EXPORT_MAX_CONCURRENT and EXPORT_CHUNK_ROWS."""
+    return Downloads(
+        store,
+        max_concurrent=int(os.environ.get("EXPORT_MAX_CONCURRENT", 2)),
+        chunk_rows=int(os.environ.get("EXPORT_CHUNK_ROWS", DEFAULT_CHUNK_ROWS)),
+    )
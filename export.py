@@ -0,0 +1,273 @@
+"""
+Offline snapshot export of every dashboard figure.
+
+Renders each (country, tab[, sector or indicator]) combination with the
+callbacks in app.py and writes the figures as JSON and as a standalone HTML
+page. The work is spread over a process pool; every worker maps the shared
+dataset file (shared.py) once instead of loading the sources. A manifest
+records the digest of the data partitions (and rendering code) behind each
+output, so a re-run only renders outputs whose inputs changed.
+
+Usage:
+    python export.py OUT_DIR [--data-dir DIR] [--workers N] [--countries A,B]
+                     [--tabs employment,explorer] [--formats json,html]
+                     [--plotlyjs cdn|inline] [--force]
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import plotly.io as pio
+
+import figures
+from shared import ensure_shared, open_shared
+from utils import DATA_DIR
+
+TABS = ["overview", "employment", "senior", "innovation", "entrepreneurship", "explorer", "advanced"]
+TITLES = {
+    "overview": "Overview",
+    "employment": "Employment",
+    "senior": "Senior Management",
+    "innovation": "Innovation & Patents",
+    "entrepreneurship": "Entrepreneurship",
+    "explorer": "Explorer",
+    "advanced": "Advanced Insights",
+}
+# tab -> (callback in app.py, topic of its partition)
+CALLBACKS = {
+    "employment": ("update_employment_charts", "Employment"),
+    "senior": ("update_senior_management_charts", "Senior Management"),
+    "innovation": ("update_innovation_charts", "Innovation"),
+    "entrepreneurship": ("update_entrepreneurship_charts", "Entrepreneurship"),
+    "explorer": ("update_explorer_trend", None),
+}
+MANIFEST = "manifest.json"
+
+
+def slug(text, limit=80):
+    text = re.sub(r"[^A-Za-z0-9]+", "-", str(text)).strip("-").lower()
+    if len(text) > limit:
+        text = text[:limit].rstrip("-") + "-" + hashlib.sha1(text.encode()).hexdigest()[:8]
+    return text
+
+
+def render_version():
+    """
+    Hash of the code that computes and draws the figures (the callbacks, the
+    query backends and their aggregations); changing it re-renders everything.
+    """
+    import app
+    import dataset
+    import indicators
+    import rollup
+    import shared
+    import sqlstore
+    import trends
+    digest = hashlib.sha1()
+    for module in (app, figures, dataset, trends, indicators, rollup, sqlstore, shared):
+        with open(module.__file__, "rb") as fh:
+            digest.update(fh.read())
+    return digest.hexdigest()[:16]
+
+
+def plan(data, countries, tabs, insight_countries):
+    """[(key, tab, callback args, [(country, topic) partitions it reads])] for the export."""
+    indicators = data.availability["indicators"]
+    sectors = data.availability["innovation_sectors"]
+    jobs = []
+    for country in countries:
+        folder = slug(country)
+        if "overview" in tabs:
+            jobs.append((f"{folder}/overview", "overview", (country,),
+                         [(country, t) for t in data.topics]))
+        for tab in ("employment", "senior", "entrepreneurship"):
+            if tab in tabs:
+                topic = CALLBACKS[tab][1]
+                jobs.append((f"{folder}/{tab}", tab, (country,), [(country, topic)]))
+        if "innovation" in tabs:
+            for sector in ["All"] + sectors.get(country, []):
+                jobs.append((f"{folder}/innovation-{slug(sector)}", "innovation", (country, sector),
+                             [(country, "Innovation")]))
+        if "explorer" in tabs:
+            for topic, names in indicators.get(country, {}).items():
+                for indicator in names:
+                    jobs.append((f"{folder}/explorer-{slug(topic)}-{slug(indicator)}", "explorer",
+                                 (country, topic, indicator), [(country, topic)]))
+    if "advanced" in tabs:
+        jobs.append(("advanced", "advanced", (),
+                     [(c, t) for c in insight_countries for t in data.topics]))
+    return jobs
+
+
+def partition_digests(data, partitions):
+    """{(country, topic): content hash} for the given partitions."""
+    digests = {}
+    for country, topic in partitions:
+        rows = data.slice(country, topic)
+        hashed = pd.util.hash_pandas_object(rows, index=False).to_numpy()
+        digests[(country, topic)] = hashlib.sha1(hashed.tobytes()).hexdigest()[:16]
+    return digests
+
+
+def job_digest(partitions, digests, version, args):
+    payload = json.dumps([version, list(args), [digests[p] for p in partitions]], default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+# === Workers ===
+
+_app = None
+
+
+def _init_worker(shared_file):
+    global _app
+    import app
+    app.store.install(open_shared(shared_file))
+    _app = app
+
+
+def _render(tab, args):
+    """(figures, extra JSON payload) for one job."""
+    data = _app.store.current()
+    if tab == "overview":
+        years = [int(data.years[0]), int(data.years[-1])]
+        return [], {"kpis": data.kpis.means(list(args), years), "year_range": years}
+    if tab == "advanced":
+        return list(_app.advanced_figures(data)), {}
+    # The undecorated callback: no figure cache in a batch job
+    callback = inspect.unwrap(getattr(_app, CALLBACKS[tab][0]))
+    result = callback(*args)
+    return list(result) if isinstance(result, tuple) else [result], {}
+
+
+def _write(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(payload)
+    os.replace(tmp, path)
+
+
+def _html(title, figs, plotlyjs):
+    parts = []
+    for i, fig in enumerate(figs):
+        parts.append(pio.to_html(fig, full_html=False, validate=False,
+                                 include_plotlyjs=plotlyjs if i == 0 else False))
+    body = "\n".join(parts) or "<p>No figures</p>"
+    return (f'<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"><title>{title}</title></head>\n'
+            f"<body>\n<h1>{title}</h1>\n{body}\n</body>\n</html>\n")
+
+
+def _export(jobs, out_dir, formats, plotlyjs):
+    """Render and write `jobs` [(key, tab, args, digest)]; returns [(key, digest)] written."""
+    done = []
+    for key, tab, args, digest in jobs:
+        figs, extra = _render(tab, args)
+        title = " – ".join([TITLES[tab]] + [str(a) for a in args])
+        stem = os.path.join(out_dir, key)
+        if "json" in formats:
+            _write(stem + ".json", figures.dumps({"title": title, "args": list(args),
+                                                  "figures": figs, **extra}))
+        if "html" in formats and figs:
+            _write(stem + ".html", _html(title, figs, plotlyjs).encode("utf-8"))
+        done.append((key, digest))
+    return done
+
+
+# === Driver ===
+
+def _load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(out_dir, manifest):
+    _write(os.path.join(out_dir, MANIFEST), json.dumps(manifest, indent=1, sort_keys=True).encode())
+
+
+def _present(out_dir, key, formats):
+    # Every output has a JSON file; HTML is only written for outputs with figures
+    return "json" not in formats or os.path.exists(os.path.join(out_dir, key + ".json"))
+
+
+def export(out_dir, base=DATA_DIR, workers=None, countries=None, tabs=TABS,
+           formats=("json", "html"), plotlyjs="cdn", force=False, report=print):
+    """Export the snapshot to `out_dir`. Returns {"rendered": n, "skipped": n, "seconds": s}."""
+    started = time.perf_counter()
+    shared_file = ensure_shared(base)
+    data = open_shared(shared_file)
+
+    import app
+    countries = [c for c in (countries or data.countries) if c in data.countries]
+    jobs = plan(data, countries, tabs, [c for c in app.VALID_COUNTRIES if c in data.countries])
+    digests = partition_digests(data, {p for job in jobs for p in job[3]})
+    version = render_version()
+
+    manifest = {} if force else _load_manifest(out_dir)
+    pending = {}
+    skipped = 0
+    for key, tab, args, partitions in jobs:
+        digest = job_digest(partitions, digests, version, args)
+        if manifest.get(key) == digest and _present(out_dir, key, formats):
+            skipped += 1
+            continue
+        # One task per country folder keeps the per-task overhead low
+        pending.setdefault(key.split("/")[0], []).append((key, tab, args, digest))
+
+    rendered = 0
+    total = sum(len(batch) for batch in pending.values())
+    report(f"{len(jobs)} outputs: {skipped} up to date, {total} to render")
+    if pending:
+        workers = workers or os.cpu_count() or 1
+        if workers == 1:
+            _init_worker(shared_file)
+            results = (_export(batch, out_dir, formats, plotlyjs) for batch in pending.values())
+            for done in results:
+                rendered = _record(out_dir, manifest, done, rendered, total, report)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(shared_file,)) as pool:
+                futures = [pool.submit(_export, batch, out_dir, formats, plotlyjs)
+                           for batch in pending.values()]
+                for future in as_completed(futures):
+                    rendered = _record(out_dir, manifest, future.result(), rendered, total, report)
+
+    seconds = time.perf_counter() - started
+    report(f"Rendered {rendered}, skipped {skipped} in {seconds:.1f}s")
+    return {"rendered": rendered, "skipped": skipped, "seconds": seconds}
+
+
+def _record(out_dir, manifest, done, rendered, total, report):
+    # Saved after every batch so an interrupted run resumes where it stopped
+    manifest.update(done)
+    _save_manifest(out_dir, manifest)
+    rendered += len(done)
+    report(f"  {rendered}/{total} rendered")
+    return rendered
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--countries", help="comma-separated subset of countries")
+    parser.add_argument("--tabs", default=",".join(TABS), help="comma-separated subset of " + ",".join(TABS))
+    parser.add_argument("--formats", default="json,html")
+    parser.add_argument("--plotlyjs", choices=["cdn", "inline"], default="cdn",
+                        help="load plotly.js from the CDN or embed it in every page")
+    parser.add_argument("--force", action="store_true", help="re-render everything")
+    args = parser.parse_args()
+    export(args.out_dir, args.data_dir, args.workers,
+           args.countries.split(",") if args.countries else None,
+           [t for t in args.tabs.split(",") if t in TABS],
+           tuple(args.formats.split(",")), "cdn" if args.plotlyjs == "cdn" else True, args.force)
@@ -0,0 +1,132 @@
+"""
+Minimal plotly figure dicts built straight from arrays.
+
+These skip plotly.graph_objects validation and the embedded template that
+plotly.express adds, so the payloads are a fraction of the size and cost
+microseconds to build. Arrays are emitted as plain lists, which the JSON
+encoders handle without the numpy/pandas fallback path.
+"""
+import json
+
+import numpy as np
+from plotly.colors import sequential
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+
+def colorscale(name):
+    """plotly.express-style named sequential scale as an explicit [[pos, color], ...] list."""
+    colors = getattr(sequential, name)
+    step = 1 / (len(colors) - 1)
+    return [[round(i * step, 6), c] for i, c in enumerate(colors)]
+
+
+def values(a):
+    """Plain list for JSON (NaN -> None)."""
+    if isinstance(a, list):
+        return a
+    arr = np.asarray(a)
+    if arr.dtype.kind == "f":
+        return [None if v != v else v for v in arr.tolist()]
+    return arr.tolist()
+
+
+def treemap(labels, sizes, title, scale="Oranges", colorbar_title="Value"):
+    labels = values(labels)
+    sizes = values(sizes)
+    return {
+        "data": [{
+            "type": "treemap",
+            "labels": labels,
+            "parents": [""] * len(labels),
+            "values": sizes,
+            "branchvalues": "total",
+            "marker": {
+                "colors": sizes,
+                "colorscale": colorscale(scale),
+                "showscale": True,
+                "colorbar": {"title": {"text": colorbar_title}},
+            },
+            "hovertemplate": "%{label}<br>%{value}<extra></extra>",
+        }],
+        "layout": {"title": {"text": title}, "margin": {"t": 60, "l": 25, "r": 25, "b": 25}},
+    }
+
+
+def hbar(labels, lengths, title, x_title, y_title="Country", scale=None, colors=None):
+    """
+    Horizontal bar chart. Bars are coloured by value on the named sequential
+    `scale`, or with the explicit per-bar `colors`.
+    """
+    lengths = values(lengths)
+    marker = {}
+    if colors is not None:
+        marker["color"] = values(colors)
+    elif scale is not None:
+        marker = {"color": lengths, "colorscale": colorscale(scale), "showscale": True,
+                  "colorbar": {"title": {"text": x_title}}}
+    return {
+        "data": [{
+            "type": "bar",
+            "orientation": "h",
+            "x": lengths,
+            "y": values(labels),
+            "marker": marker,
+            "hovertemplate": f"{y_title}=%{{y}}<br>{x_title}=%{{x}}<extra></extra>",
+        }],
+        "layout": {
+            "title": {"text": title},
+            "xaxis": {"title": {"text": x_title}},
+            "yaxis": {"title": {"text": y_title}},
+            "showlegend": False,
+        },
+    }
+
+
+def lines(series, title, x_title, y_title, colors=None):
+    """Line chart with one trace per (name, x, y) in `series`."""
+    colors = colors or {}
+    traces = []
+    for name, x, y in series:
+        trace = {"x": values(x), "y": values(y), "type": "line", "name": name}
+        if name in colors:
+            trace["line"] = {"color": colors[name]}
+        traces.append(trace)
+    return {
+        "data": traces,
+        "layout": {
+            "title": title,
+            "yaxis": {"title": y_title},
+            "xaxis": {"title": x_title},
+        },
+    }
+
+
+def dumps(fig):
+    """Compact JSON bytes for a figure dict, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(fig, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(fig, separators=(",", ":"), default=_default).encode()
+
+
+def freeze(fig):
+    """
+    Pre-serialized form of `fig` for values that are served many times.
+    Dash's encoder (orjson) embeds it verbatim instead of walking the dict
+    again; without orjson.Fragment the dict itself is returned.
+    """
+    fragment = getattr(orjson, "Fragment", None)
+    if fragment is None:
+        return fig
+    return fragment(dumps(fig))
+
+
+def _default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return values(obj)
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,19 @@
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8050")
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+threads = int(os.environ.get("GUNICORN_THREADS", 2))
+
+
+def on_starting(server):
+    # Build the shared dataset file once in the master; forked workers find
+    # it and only memory-map it
+    if os.environ.get("QUERY_BACKEND", "pandas") == "sqlite":
+        from sqlstore import ensure_sqlite
+
+        ensure_sqlite(memory_limit_mb=int(os.environ.get("INGEST_MEMORY_MB", 0)) or None)
+        return
+
+    from shared import ensure_shared
+
+    ensure_shared()
@@ -0,0 +1,32 @@
+import numpy as np
+
+# Indicator families used by the dashboard: name -> case-insensitive regex on
+# the Indicator label. Each family owns one bit of the `family` column.
+INDICATOR_FAMILIES = {
+    "wage_gap": "wage gap",
+    "contract_occupation": "contract|occupation",
+    "senior_managers": "Share of female senior managers",
+    "female_inventors": "female inventors",
+    "gender_diverse": "gender diverse",
+}
+FAMILY_BITS = {name: 1 << i for i, name in enumerate(INDICATOR_FAMILIES)}
+
+
+def family_flags(indicator):
+    """
+    Bitmask of INDICATOR_FAMILIES for every row. The regexes run once per
+    distinct Indicator label and are broadcast to rows through the codes.
+    """
+    indicator = indicator.astype("category")
+    labels = indicator.cat.categories.to_series()
+    dtype = np.uint8 if len(FAMILY_BITS) <= 8 else np.uint32
+    per_label = np.zeros(len(labels) + 1, dtype=dtype)  # last slot: missing
+    for name, pattern in INDICATOR_FAMILIES.items():
+        hits = labels.str.contains(pattern, case=False, regex=True).to_numpy()
+        per_label[:-1][hits] |= FAMILY_BITS[name]
+    return per_label[indicator.cat.codes.to_numpy()]
+
+
+def in_family(frame, name):
+    """Boolean mask selecting the rows of `frame` in the given indicator family."""
+    return (frame["family"].to_numpy() & FAMILY_BITS[name]) != 0
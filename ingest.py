@@ -0,0 +1,188 @@
+"""
+Out-of-core ingest of the LinkEED sources into the compact Parquet store.
+
+Each source CSV is read in chunks sized from a memory ceiling. Every chunk is
+normalized to the compact dtypes, appended to the store as its own row group
+and folded into the KPI partial aggregates, so neither the raw text frame nor
+the combined frame is ever held in memory.
+
+Usage:
+    python ingest.py [--data-dir DIR] [--memory-mb 256]
+"""
+import argparse
+import logging
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from indicators import family_flags
+from rollup import PARTIAL_COLUMNS, kpi_partials
+from utils import (CATEGORY_COLUMNS, CSV_DTYPES, DATA_DIR, cache_paths, check_columns, remove_stale_caches,
+                   source_fingerprint, source_name, source_paths)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_MB = 256
+PROBE_ROWS = 5_000
+MIN_CHUNK_ROWS = 1_000
+# A chunk briefly exists as parsed frame, Arrow table and partial aggregates
+CHUNK_OVERHEAD = 4
+
+STORE_COLUMNS = ["Country", "Year", "Technology or Sector", "Topic", "Indicator",
+                 "Indicator Categories", "Unit", "Value", "Number of observations",
+                 "updated_at", "Source"]
+STORE_SCHEMA = pa.schema(
+    [(col, pa.dictionary(pa.int32(), pa.string())) for col in CATEGORY_COLUMNS]
+    + [("Year", pa.int16()), ("Value", pa.float32()), ("Number of observations", pa.int32()),
+       ("updated_at", pa.timestamp("ns", tz="UTC"))]
+)
+STORE_SCHEMA = pa.schema([STORE_SCHEMA.field(col) for col in STORE_COLUMNS])
+
+
+def normalize_chunk(chunk, source):
+    """Bring one parsed chunk to the store's column set and compact dtypes."""
+    chunk["Source"] = pd.Categorical([source] * len(chunk))
+    if "updated_at" in chunk.columns:
+        chunk["updated_at"] = pd.to_datetime(chunk["updated_at"], unit="ms", utc=True)
+    for col in STORE_COLUMNS:
+        if col not in chunk.columns:
+            chunk[col] = pd.Series(pd.NA, index=chunk.index).astype(
+                "category" if col in CATEGORY_COLUMNS else CSV_DTYPES.get(col, "datetime64[ns, UTC]"))
+    return chunk[STORE_COLUMNS]
+
+
+def _chunk_rows(probe, memory_limit):
+    per_row = max(probe.memory_usage(deep=True).sum() / max(len(probe), 1), 1)
+    return max(MIN_CHUNK_ROWS, int(memory_limit // (per_row * CHUNK_OVERHEAD)))
+
+
+def compact_partials(partials):
+    """Fold a list of KPI partial frames into a one-element list (sums per key)."""
+    if len(partials) < 2:
+        return partials
+    merged = pd.concat(partials, ignore_index=True)
+    return [merged.groupby(["Country", "kpi", "Year"], as_index=False)[["sum", "count"]].sum()[PARTIAL_COLUMNS]]
+
+
+def stream_ingest(base=DATA_DIR, memory_limit_mb=DEFAULT_MEMORY_MB, progress=None):
+    """
+    Build the compact store and KPI partials for the sources under `base`.
+
+    `progress`, if given, is called after every chunk with the running report
+    dict (rows, bytes, seconds, rows_per_s, mb_per_s, ...). Returns the final
+    report. Sources are read one after another to stay within the memory
+    ceiling; missing sources and sources without the required columns are
+    skipped and listed under "skipped".
+    """
+    memory_limit = memory_limit_mb * 1024 * 1024
+    all_paths = source_paths(base)
+    version = source_fingerprint(all_paths)
+    paths = [p for p in all_paths if os.path.exists(p)]
+    if not paths:
+        raise FileNotFoundError(f"No data sources under {base}")
+    for name in (os.path.basename(p) for p in all_paths if p not in paths):
+        logger.warning("Source %s is missing; its tab will show no data", name)
+    store_path, kpi_path = cache_paths(base, version)
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+
+    total_bytes = sum(os.path.getsize(p) for p in paths)
+    report = {"version": version, "rows": 0, "bytes": 0, "total_bytes": total_bytes,
+              "chunks": 0, "max_chunk_rows": 0, "memory_limit_mb": memory_limit_mb,
+              "sources": {}, "skipped": {os.path.basename(p): "missing" for p in all_paths if p not in paths}}
+    partials = []
+    started = time.perf_counter()
+
+    tmp_store = f"{store_path}.{os.getpid()}.tmp"
+    writer = None
+    try:
+        for path in paths:
+            source = source_name(os.path.basename(path))
+            source_rows = 0
+            with open(path, "rb") as fh, pd.read_csv(fh, dtype=CSV_DTYPES, chunksize=PROBE_ROWS) as reader:
+                chunk_rows = PROBE_ROWS
+                while True:
+                    try:
+                        chunk = reader.get_chunk(chunk_rows)
+                    except StopIteration:
+                        break
+                    if source_rows == 0:
+                        try:
+                            check_columns(chunk.columns, path)
+                        except ValueError as exc:
+                            logger.warning("Skipping source: %s", exc)
+                            report["skipped"][os.path.basename(path)] = str(exc)
+                            break
+                        # Size the remaining chunks from the probe's real footprint
+                        chunk_rows = _chunk_rows(chunk, memory_limit)
+
+                    chunk = normalize_chunk(chunk, source)
+                    table = pa.Table.from_pandas(chunk, schema=STORE_SCHEMA, preserve_index=False)
+                    if writer is None:
+                        # The first chunk's schema carries the pandas dtype metadata
+                        writer = pq.ParquetWriter(tmp_store, table.schema)
+                    writer.write_table(table)
+
+                    chunk["family"] = family_flags(chunk["Indicator"])
+                    partials.append(kpi_partials(chunk))
+                    if len(partials) >= 16:
+                        partials = compact_partials(partials)
+
+                    source_rows += len(chunk)
+                    report["rows"] += len(chunk)
+                    report["chunks"] += 1
+                    report["max_chunk_rows"] = max(report["max_chunk_rows"], len(chunk))
+                    report["bytes"] = sum(os.path.getsize(p) for p in paths[:paths.index(path)]) + fh.tell()
+                    _update_rates(report, started)
+                    if progress is not None:
+                        progress(report)
+            if os.path.basename(path) not in report["skipped"]:
+                report["sources"][source] = source_rows
+        if writer is None:
+            writer = pq.ParquetWriter(tmp_store, STORE_SCHEMA)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    partials = compact_partials(partials)
+    kpis = partials[0] if partials else pd.DataFrame(columns=PARTIAL_COLUMNS)
+    tmp_kpis = f"{kpi_path}.{os.getpid()}.tmp"
+    kpis.to_parquet(tmp_kpis, engine="pyarrow", index=False)
+    os.replace(tmp_kpis, kpi_path)
+    os.replace(tmp_store, store_path)
+    remove_stale_caches(base, version)
+
+    report["bytes"] = total_bytes
+    _update_rates(report, started)
+    logger.info("Ingested %d rows (%.1f MB) in %.2fs: %.0f rows/s, %.1f MB/s",
+                report["rows"], total_bytes / 1e6, report["seconds"],
+                report["rows_per_s"], report["mb_per_s"])
+    return report
+
+
+def _update_rates(report, started):
+    elapsed = time.perf_counter() - started
+    report["seconds"] = elapsed
+    report["rows_per_s"] = report["rows"] / elapsed if elapsed else float("nan")
+    report["mb_per_s"] = report["bytes"] / 1e6 / elapsed if elapsed else float("nan")
+
+
+def _print_progress(report):
+    pct = 100 * report["bytes"] / report["total_bytes"] if report["total_bytes"] else 100
+    print(f"\r{pct:5.1f}%  {report['rows']:>12,} rows  "
+          f"{report['rows_per_s']:>10,.0f} rows/s  {report['mb_per_s']:6.1f} MB/s", end="", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--memory-mb", type=int, default=DEFAULT_MEMORY_MB)
+    args = parser.parse_args()
+    result = stream_ingest(args.data_dir, args.memory_mb, progress=_print_progress)
+    print()
+    print(f"{result['rows']:,} rows from {len(result['sources'])} sources in {result['seconds']:.2f}s "
+          f"(max chunk {result['max_chunk_rows']:,} rows, limit {result['memory_limit_mb']} MB)")
+    for name, reason in result["skipped"].items():
+        print(f"Skipped {name}: {reason}")
@@ -0,0 +1,253 @@
+"""
+Background execution of the chart callbacks.
+
+With BACKGROUND_CALLBACKS_DIR set, the figure callbacks run as Dash
+background callbacks: a request starts a job in a worker process and the
+browser polls for the result, which is stored in a diskcache directory.
+Dash already kills the superseded job when the same browser session fires a
+callback again, so a burst of dropdown changes only finishes its last job.
+
+SingleFlightManager adds, on top of Dash's DiskcacheManager:
+
+- single-flight: a request whose key (callback source, inputs and dataset
+  version) matches a running job attaches to that job instead of starting
+  another, and a finished result is reused for BACKGROUND_RESULT_TTL seconds;
+- reference-counted cancellation: cancelling one session's request only
+  kills the job once no other session waits on it;
+- a bounded pool: at most BACKGROUND_WORKERS jobs compute at once, the others
+  wait for a slot (the slots are keys of the same disk cache, so the bound
+  holds across server worker processes). Waiting jobs look for a free slot
+  with reads and back off, so they never hold the cache's write lock while
+  they wait; a job that finds no slot within BACKGROUND_SLOT_WAIT seconds
+  runs anyway rather than being lost.
+
+Jobs are forked from a server process whose other threads use the same
+SQLite database. A child forked while one of them is inside SQLite inherits
+its lock state (and mutexes) without their owner: it blocks forever, or can
+never write its result. fork_safe makes os.fork wait until no thread is
+inside a call on the cache.
+
+Requires `pip install "dash[diskcache]"`.
+"""
+import contextlib
+import functools
+import logging
+import os
+import threading
+import time
+
+from dash import DiskcacheManager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESULT_TTL = 300
+DEFAULT_SLOT_WAIT = 300
+# A job that outlives this is assumed dead when deciding whether to attach to
+# it, and its slot is given to another job
+JOB_TTL = 600
+SLOT_KEY = "jobs:slot:{}"
+
+# Methods of diskcache.Cache that run SQLite statements
+CACHE_METHODS = ("get", "set", "add", "incr", "decr", "delete", "touch", "pop")
+
+
+class _ForkGate:
+    """Lets any number of threads into the cache at once, and os.fork in only when none is."""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._active = 0
+        self._forking = False
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def entered(self):
+        depth = getattr(self._local, "depth", 0)
+        if not depth:
+            with self._cond:
+                # A pending fork goes first, or busy threads would starve it
+                while self._forking:
+                    self._cond.wait()
+                self._active += 1
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if not depth:
+                with self._cond:
+                    self._active -= 1
+                    if not self._active:
+                        self._cond.notify_all()
+
+    def before_fork(self):
+        # Held until after_fork: no thread enters while the process forks
+        self._cond.acquire()
+        self._forking = True
+        while self._active:
+            self._cond.wait()
+
+    def after_fork(self):
+        self._forking = False
+        self._cond.notify_all()
+        self._cond.release()
+
+
+_gate = _ForkGate()
+os.register_at_fork(before=lambda: _gate.before_fork(), after_in_parent=lambda: _gate.after_fork(),
+                    after_in_child=lambda: _gate.__init__())
+
+
+def fork_safe(cache):
+    """Wrap the SQLite-using methods of `cache` so that os.fork never happens during one."""
+    def wrap(method):
+        @functools.wraps(method)
+        def gated(*args, **kwargs):
+            with _gate.entered():
+                return method(*args, **kwargs)
+
+        return gated
+
+    for name in CACHE_METHODS:
+        setattr(cache, name, wrap(getattr(cache, name)))
+    transact = cache.transact
+
+    @contextlib.contextmanager
+    def gated_transact(retry=False):
+        with _gate.entered(), transact(retry):
+            yield
+
+    cache.transact = gated_transact
+    return cache
+
+
+class SingleFlightManager(DiskcacheManager):
+    """DiskcacheManager with single-flight jobs, shared cancellation and a worker bound."""
+
+    def __init__(self, cache, workers, version, result_ttl=DEFAULT_RESULT_TTL, slot_wait=DEFAULT_SLOT_WAIT):
+        # Set first: the base class wraps the already registered callbacks
+        # with make_job_fn
+        self.workers = workers
+        self.slot_wait = slot_wait
+        # Results are kept per dataset version so late pollers and identical
+        # requests can read them
+        super().__init__(cache, cache_by=[version], expire=result_ttl)
+
+    def call_job_fn(self, key, job_fn, args, context):
+        from diskcache import Lock
+
+        with Lock(self.handle, f"jobs:start:{key}", expire=30):
+            if self.result_ready(key):
+                # Finished already: 0 tells the poll there is no process to watch
+                return 0
+            job = self.handle.get(f"jobs:key:{key}")
+            if job is not None and self.job_running(job):
+                self.handle.incr(f"jobs:waiters:{job}", default=1, retry=True)
+                return job
+            job = super().call_job_fn(key, job_fn, args, context)
+            self.handle.set(f"jobs:key:{key}", job, expire=JOB_TTL, retry=True)
+            self.handle.set(f"jobs:waiters:{job}", 1, expire=JOB_TTL, retry=True)
+        return job
+
+    def job_running(self, job):
+        # The poll for a result served from the cache carries no job
+        return bool(job) and super().job_running(job)
+
+    def terminate_job(self, job):
+        if not job or not int(job):
+            return
+        waiters_key = f"jobs:waiters:{int(job)}"
+        # decr is atomic on its own; no transaction needed around it
+        if self.handle.decr(waiters_key, default=1, retry=True) > 0:
+            return
+        self.handle.delete(waiters_key, retry=True)
+        super().terminate_job(job)
+
+    def make_job_fn(self, fn, progress, key=None):
+        handle, workers, wait = self.handle, self.workers, self.slot_wait
+
+        def run_in_slot(*args, **kwargs):
+            slot = acquire_slot(handle, workers, wait)
+            if slot is None:
+                logger.warning("No background job slot came free in %.0fs; running unbounded", wait)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                if slot is not None:
+                    release_slot(handle, slot)
+
+        return super().make_job_fn(run_in_slot, progress, key)
+
+
+def _alive(pid):
+    import psutil
+
+    try:
+        return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+
+def acquire_slot(handle, workers, wait=DEFAULT_SLOT_WAIT, poll=0.02, max_poll=0.2):
+    """
+    Claim one of `workers` slots for this process and return its key, or
+    None if none came free within `wait` seconds. Slots are looked up with
+    reads; a write is only attempted on a slot that is free or whose owner
+    died, and the poll interval doubles up to `max_poll` between rounds.
+    """
+    from diskcache import Timeout
+
+    pid = os.getpid()
+    deadline = time.monotonic() + wait
+    while True:
+        for i in range(workers):
+            key = SLOT_KEY.format(i)
+            try:
+                owner = handle.get(key)
+                if owner is not None:
+                    if _alive(owner):
+                        continue
+                    _reclaim_slot(handle, key, owner)
+                if handle.add(key, pid, expire=JOB_TTL):
+                    return key
+            except Timeout:
+                # The cache is busy; try again next round
+                continue
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(poll)
+        poll = min(poll * 2, max_poll)
+
+
+def _reclaim_slot(handle, key, owner):
+    # Only delete the slot if it still belongs to the dead job
+    with handle.transact(retry=True):
+        if handle.get(key) == owner:
+            handle.delete(key)
+
+
+def release_slot(handle, key):
+    from diskcache import Timeout
+
+    try:
+        if handle.get(key) == os.getpid():
+            handle.delete(key, retry=True)
+    except Timeout:
+        # Freed by the next acquire_slot once this process has exited
+        logger.warning("Could not release background job slot %s", key)
+
+
+def background_manager_from_env(version):
+    """SingleFlightManager if BACKGROUND_CALLBACKS_DIR is set, else None (callbacks run inline)."""
+    directory = os.environ.get("BACKGROUND_CALLBACKS_DIR")
+    if not directory:
+        return None
+    import diskcache
+
+    return SingleFlightManager(
+        fork_safe(diskcache.Cache(directory)),
+        workers=int(os.environ.get("BACKGROUND_WORKERS", 0)) or os.cpu_count() or 1,
+        version=version,
+        result_ttl=float(os.environ.get("BACKGROUND_RESULT_TTL", DEFAULT_RESULT_TTL)),
+        slot_wait=float(os.environ.get("BACKGROUND_SLOT_WAIT", DEFAULT_SLOT_WAIT)),
+    )
@@ -0,0 +1,531 @@
+"""
+Concurrent load test replaying dashboard sessions.
+
+Virtual users replay what a browser sends while someone uses the dashboard:
+the page load (index, layout, dependencies and the initial callbacks), drags
+of the Overview year slider, country changes, and a walk through the other
+tabs with their chart callbacks. Requests are built from the app's own
+/_dash-dependencies the way Dash's renderer builds them: a changed property
+fires every server callback that takes it as an input, and outputs that feed
+other callbacks fire those in turn (background callbacks are polled until
+they finish, within --poll-timeout seconds per session; a job that ends
+without a response counts as a failed request). Each concurrency level runs for --duration seconds and reports
+throughput, latency percentiles (overall and per request) and the peak RSS
+of every server process.
+
+Usage:
+    python loadtest.py [--server inproc|dev|gunicorn] [--workers 4]
+                       [--url http://127.0.0.1:8050 --pid PID]
+                       [--concurrency 1,4,16] [--duration 20] [--think-ms 0]
+                       [--poll-timeout 120]
+                       [--json load.json]
+                       [--baseline load.json --max-regression 0.25]
+
+`inproc` drives app.server through Flask's test client in this process;
+`dev` and `gunicorn` start that server on a free local port and talk HTTP to
+it (DATA_DIR, QUERY_BACKEND and the other settings come from the
+environment); --url targets a server that is already running. Per-process
+RSS needs psutil. With --baseline the run exits non-zero if a level's p95
+latency grew, or its throughput fell, by more than --max-regression, as
+benchmark.py does for single callbacks.
+"""
+import argparse
+import gzip
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+try:
+    import psutil
+except ImportError:  # optional: no RSS figures
+    psutil = None
+
+UPDATE_PATH = "/_dash-update-component"
+# Marks a rendered component in a session's props ("<id>.__mounted")
+MOUNTED = "__mounted"
+TABS = ["employment", "senior", "innovation", "entrepreneurship", "explorer", "advanced"]
+# Seconds a session may spend polling background callbacks before giving up
+POLL_TIMEOUT = 120.0
+HEADERS = {"Content-Type": "application/json", "Accept-Encoding": "gzip"}
+
+
+# === Transports ===
+
+class InProcess:
+    """Requests through Flask's test client (one client per virtual user)."""
+
+    def __init__(self, server):
+        self._client = server.test_client()
+
+    def request(self, method, path, body=None):
+        response = self._client.open(path, method=method, data=body, headers=HEADERS)
+        return response.status_code, _decoded(response.headers.get("Content-Encoding"), response.get_data())
+
+    def close(self):
+        pass
+
+
+class HTTP:
+    """Requests over one keep-alive HTTP connection (one per virtual user)."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self._prefix = parts.path.rstrip("/")
+        self._connect = lambda: http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=120)
+        self._conn = self._connect()
+
+    def request(self, method, path, body=None):
+        for attempt in range(2):
+            try:
+                self._conn.request(method, self._prefix + path, body=body, headers=HEADERS)
+                response = self._conn.getresponse()
+                data = response.read()
+                return response.status, _decoded(response.getheader("Content-Encoding"), data)
+            except (OSError, http.client.HTTPException):
+                # The server closed the kept-alive connection: reconnect once
+                self._conn.close()
+                self._conn = self._connect()
+                if attempt:
+                    raise
+
+    def close(self):
+        self._conn.close()
+
+
+def _decoded(encoding, data):
+    return gzip.decompress(data) if encoding == "gzip" else data
+
+
+# === Dash sessions ===
+
+def _components(tree, found):
+    """Collect {"id.prop": value} for every component with an id in a layout tree."""
+    if isinstance(tree, list):
+        for item in tree:
+            _components(item, found)
+    elif isinstance(tree, dict):
+        props = tree.get("props")
+        if isinstance(props, dict) and "type" in tree:
+            if isinstance(props.get("id"), str):
+                for prop, value in props.items():
+                    if prop not in ("id", "children"):
+                        found[f"{props['id']}.{prop}"] = value
+                found[f"{props['id']}.{MOUNTED}"] = True
+            _components(props.get("children"), found)
+    return found
+
+
+def _outputs(spec):
+    """[{"id", "property"}] of a dependency's output string ("a.b" or "..a.b...c.d..")."""
+    parts = spec[2:-2].split("...") if spec.startswith("..") else [spec]
+    return [dict(zip(("id", "property"), part.rsplit(".", 1))) for part in parts]
+
+
+class Session:
+    """One browser tab: the props it holds and the callbacks its changes fire."""
+
+    def __init__(self, transport, rng, record, think_s=0.0, poll_timeout=POLL_TIMEOUT):
+        self.transport = transport
+        self.rng = rng
+        self.record = record
+        self.think_s = think_s
+        self.poll_deadline = time.perf_counter() + poll_timeout
+        self.props = {}
+        # component id -> ids rendered inside its children (dropped when they are replaced)
+        self.subtrees = {}
+        self.callbacks = []
+
+    def get(self, path):
+        started = time.perf_counter()
+        status, body = self.transport.request("GET", path)
+        self.record(f"GET {path}", time.perf_counter() - started, status == 200)
+        return body
+
+    def load(self):
+        self.get("/")
+        self.props = _components(json.loads(self.get("/_dash-layout")), {})
+        self.callbacks = [d for d in json.loads(self.get("/_dash-dependencies"))
+                          if not d.get("clientside_function")]
+        self._fire({k for k in self.props if k.endswith(MOUNTED)})
+
+    def mounted(self, component_id):
+        return f"{component_id}.{MOUNTED}" in self.props
+
+    def set(self, changes):
+        self.props.update(changes)
+        self._fire(set(changes))
+        if self.think_s:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.think_s)
+
+    def _fire(self, changed):
+        """
+        Call the server callbacks fired by `changed` ("id.prop" keys, and
+        "id.__mounted" for newly rendered components, which fire the initial
+        callbacks), then the ones fired by their outputs, until nothing changes.
+        """
+        while changed:
+            changed |= self._clientside(changed)
+            fired = []
+            for dep in self.callbacks:
+                keys = [f"{i['id']}.{i['property']}" for i in dep["inputs"]]
+                triggers = [k for k in keys if k in changed]
+                ids = [i["id"] for i in dep["inputs"]] + [o["id"] for o in _outputs(dep["output"])]
+                # Like the renderer: newly rendered inputs or outputs make the initial call
+                mounting = any(f"{i}.{MOUNTED}" in changed for i in ids)
+                if not triggers and (not mounting or dep.get("prevent_initial_call")):
+                    continue
+                if all(self.mounted(i) for i in ids):
+                    fired.append((dep, triggers))
+            changed = set()
+            for dep, triggers in fired:
+                changed |= self._call(dep, triggers)
+
+    def _clientside(self, changed):
+        """Outputs of the clientside callbacks that feed server callbacks (the Explorer indicator)."""
+        inputs = {"explorer-country.value", "explorer-topic.value", f"explorer-country.{MOUNTED}"}
+        if not (inputs & changed) or not self.mounted("explorer-indicator"):
+            return set()
+        availability = self.props.get("availability-store.data") or {}
+        by_topic = availability.get("indicators", {}).get(self.props.get("explorer-country.value"), {})
+        indicators = by_topic.get(self.props.get("explorer-topic.value"), [])
+        self.props["explorer-indicator.value"] = indicators[0] if indicators else None
+        return {"explorer-indicator.value"}
+
+    def _call(self, dep, triggers):
+        outputs = _outputs(dep["output"])
+        payload = {
+            "output": dep["output"],
+            "outputs": outputs if dep["output"].startswith("..") else outputs[0],
+            "inputs": [dict(i, value=self.props.get(f"{i['id']}.{i['property']}")) for i in dep["inputs"]],
+            "state": [dict(s, value=self.props.get(f"{s['id']}.{s['property']}")) for s in dep["state"]],
+            "changedPropIds": triggers,
+        }
+        body = json.dumps(payload).encode()
+        label = outputs[0]["id"]
+        started = time.perf_counter()
+        status, data = self.transport.request("POST", UPDATE_PATH, body)
+        if status == 200 and dep.get("long") and b'"cacheKey"' in data:
+            # Background callback started: poll the job the way the renderer
+            # does, until an answer with the response (or a 204 if it was lost)
+            job = json.loads(data)
+            interval = dep["long"].get("interval", 1000) / 1000
+            query = f"?cacheKey={job['cacheKey']}" + (f"&job={job['job']}" if job.get("job") else "")
+            while status == 200 and b'"response"' not in data:
+                if time.perf_counter() + interval > self.poll_deadline:
+                    break
+                time.sleep(interval)
+                status, data = self.transport.request("POST", UPDATE_PATH + query, body)
+            # A job that was lost (204) or never finished has no response to show
+            ok = status == 200 and b'"response"' in data
+        else:
+            ok = status in (200, 204)
+        self.record(label, time.perf_counter() - started, ok)
+        if not ok or status != 200:
+            return set()
+
+        changed = set()
+        for component_id, props in json.loads(data).get("response", {}).items():
+            for prop, value in props.items():
+                self.props[f"{component_id}.{prop}"] = value
+                changed.add(f"{component_id}.{prop}")
+                if prop == "children":
+                    changed |= self._render(component_id, value)
+        return changed
+
+    def _render(self, parent, children):
+        """Replace the components inside `parent`; returns the new components' mount keys."""
+        for old in self.subtrees.pop(parent, ()):
+            for key in [k for k in self.props if k.startswith(f"{old}.")]:
+                del self.props[key]
+        new = _components(children, {})
+        self.props.update(new)
+        mounted = {k for k in new if k.endswith(MOUNTED)}
+        self.subtrees[parent] = {k[:-len(MOUNTED) - 1] for k in mounted}
+        return mounted
+
+    # === The replayed user ===
+
+    def replay(self):
+        """Page load, Overview slider drags and country changes, then a few other tabs."""
+        rng = self.rng
+        self.load()
+        countries = [o["value"] for o in self.props.get("country-dropdown.options") or []]
+        lo, hi = self.props.get("year-slider.min"), self.props.get("year-slider.max")
+        if countries and lo is not None:
+            for _ in range(3):
+                first = rng.randint(lo, hi)
+                self.set({"year-slider.value": [first, rng.randint(first, hi)]})
+            self.set({"country-dropdown.value": rng.sample(countries, min(len(countries), rng.randint(1, 3)))})
+
+        for tab in rng.sample(TABS, 3):
+            self.set({"main-tabs.value": tab})
+            rendered = sorted(self.subtrees.get("tab-content", ()))
+            dropdown = next((i for i in rendered if i.endswith("-country")), None)
+            if dropdown is None or not countries:
+                continue
+            for _ in range(2):
+                self.set({f"{dropdown}.value": rng.choice(countries)})
+            compare = dropdown.replace("-country", "-compare")
+            if self.mounted(compare):
+                self.set({f"{compare}.value": rng.sample(countries, min(len(countries), 2))})
+
+
+# === Load levels ===
+
+class Recorder:
+    def __init__(self):
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def __call__(self, label, seconds, ok):
+        with self._lock:
+            self.samples.append((label, seconds, ok))
+
+
+class RSSSampler:
+    """Peak RSS (MB) of `pid` and its child processes, sampled in a thread."""
+
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peaks = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        if psutil is None:
+            return
+        try:
+            root = psutil.Process(self.pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return
+        for process in processes:
+            try:
+                rss = process.memory_info().rss / 1024 / 1024
+            except psutil.NoSuchProcess:
+                continue
+            if rss:  # a finished background job lingers as a zombie with no memory
+                self.peaks[process.pid] = max(self.peaks.get(process.pid, 0.0), rss)
+
+    def __enter__(self):
+        def run():
+            while not self._stop.wait(self.interval):
+                self.sample()
+
+        self.sample()
+        self._thread = threading.Thread(target=run, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+def run_level(make_transport, users, duration, seed=0, think_s=0.0, pid=None, poll_timeout=POLL_TIMEOUT):
+    """Run `users` virtual users for `duration` seconds; returns the level's stats."""
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+    sessions = [0] * users
+    errors = []
+
+    def user(index):
+        rng = random.Random(seed * 1000 + index)
+        transport = make_transport()
+        try:
+            while time.perf_counter() < deadline:
+                Session(transport, rng, recorder, think_s, poll_timeout).replay()
+                sessions[index] += 1
+        except Exception as exc:  # reported, the other users carry on
+            errors.append(repr(exc))
+        finally:
+            transport.close()
+
+    started = time.perf_counter()
+    with RSSSampler(pid or os.getpid()) as rss:
+        threads = [threading.Thread(target=user, args=(i,), name=f"user-{i}") for i in range(users)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    elapsed = time.perf_counter() - started
+    return summarize(recorder.samples, elapsed, users, sum(sessions), errors, rss.peaks)
+
+
+def _percentiles(seconds):
+    ms = np.array(seconds) * 1000
+    return {"p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99)), "max_ms": float(ms.max())}
+
+
+def summarize(samples, elapsed, users, sessions, errors, rss_peaks):
+    ok = [s for _, s, good in samples if good]
+    stats = {
+        "users": users,
+        "seconds": elapsed,
+        "sessions": sessions,
+        "requests": len(samples),
+        "failed": len(samples) - len(ok),
+        "errors": errors[:5],
+        "throughput_rps": len(samples) / elapsed if elapsed else 0.0,
+        "sessions_per_s": sessions / elapsed if elapsed else 0.0,
+        "rss_mb": {str(pid): round(mb, 1) for pid, mb in sorted(rss_peaks.items())},
+        "requests_by_label": {},
+    }
+    if ok:
+        stats.update(_percentiles(ok))
+    by_label = {}
+    for label, seconds, _ in samples:
+        by_label.setdefault(label, []).append(seconds)
+    for label, seconds in sorted(by_label.items()):
+        stats["requests_by_label"][label] = dict(_percentiles(seconds), count=len(seconds))
+    return stats
+
+
+# === Servers ===
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, workers=None, timeout=180):
+    """(process, url) of a dev or gunicorn server started on a free local port."""
+    port = _free_port()
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    if kind == "dev":
+        command = [sys.executable, "-c",
+                   "import app; app.create_app(); "
+                   f"app.app.run(host='127.0.0.1', port={port}, debug=False, threaded=True)"]
+    else:
+        env["BIND"] = f"127.0.0.1:{port}"
+        if workers:
+            env["WEB_CONCURRENCY"] = str(workers)
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:server"]
+    # A file, not a pipe: the server logs every request and would block on a full pipe
+    log = tempfile.TemporaryFile()
+    process = subprocess.Popen(command, cwd=here, env=env, stdout=subprocess.DEVNULL, stderr=log)
+    process.log = log
+    url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            log.seek(0)
+            raise RuntimeError(f"{kind} server exited:\n{log.read().decode(errors='replace')[-2000:]}")
+        try:
+            if HTTP(url).request("GET", "/")[0] == 200:
+                return process, url
+        except OSError:
+            time.sleep(0.25)
+    process.kill()
+    raise RuntimeError(f"{kind} server did not answer within {timeout}s")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+    process.log.close()
+
+
+def run(levels, duration=20.0, server="inproc", workers=None, url=None, pid=None, think_ms=0.0,
+        seed=0, report=print, poll_timeout=POLL_TIMEOUT):
+    process = None
+    if url:
+        make_transport = lambda: HTTP(url)
+    elif server == "inproc":
+        import app
+
+        app.create_app()
+        make_transport = lambda: InProcess(app.app.server)
+        pid = os.getpid()
+    else:
+        process, url = start_server(server, workers)
+        pid = process.pid
+        make_transport = lambda: HTTP(url)
+
+    target = url or "in-process test client"
+    results = {"server": server if not url or process else "url", "target": target, "workers": workers,
+               "levels": {}}
+    try:
+        # One unrecorded session first: imports, lazy data loading and caches
+        Session(make_transport(), random.Random(seed), lambda *a: None, poll_timeout=poll_timeout).replay()
+        for users in levels:
+            stats = run_level(make_transport, users, duration, seed, think_ms / 1000, pid, poll_timeout)
+            results["levels"][str(users)] = stats
+            rss = ", ".join(f"{mb:.0f}" for mb in stats["rss_mb"].values()) or "n/a"
+            report(f"{users:4d} users: {stats['throughput_rps']:8.1f} req/s "
+                   f"{stats['sessions_per_s']:6.2f} sessions/s  p50={stats.get('p50_ms', 0):8.1f}ms "
+                   f"p95={stats.get('p95_ms', 0):8.1f}ms p99={stats.get('p99_ms', 0):8.1f}ms "
+                   f"failed={stats['failed']}  RSS MB per process: {rss}")
+            for error in stats["errors"]:
+                report(f"      error: {error}")
+    finally:
+        if process is not None:
+            stop_server(process)
+    return results
+
+
+def regressions(results, baseline, max_regression=0.25, min_delta_ms=5.0):
+    """(level, measure, baseline, current) for every latency or throughput regression."""
+    found = []
+    for level, stats in results["levels"].items():
+        before = baseline.get("levels", {}).get(level)
+        if before is None:
+            continue
+        old, new = before.get("p95_ms"), stats.get("p95_ms")
+        if old is not None and new is not None and new - old > min_delta_ms and new > old * (1 + max_regression):
+            found.append((level, "p95_ms", old, new))
+        old, new = before["throughput_rps"], stats["throughput_rps"]
+        if new < old / (1 + max_regression):
+            found.append((level, "throughput_rps", old, new))
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--server", choices=["inproc", "dev", "gunicorn"], default="inproc")
+    parser.add_argument("--workers", type=int, help="gunicorn workers (default: WEB_CONCURRENCY)")
+    parser.add_argument("--url", help="load an already running server instead of starting one")
+    parser.add_argument("--pid", type=int, help="with --url: server process whose RSS (and children's) to sample")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated numbers of virtual users")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per concurrency level")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause after each user action")
+    parser.add_argument("--poll-timeout", type=float, default=POLL_TIMEOUT,
+                        help="seconds a session may spend polling background callbacks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    parser.add_argument("--min-delta-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    results = run([int(n) for n in args.concurrency.split(",")], args.duration, args.server, args.workers,
+                  args.url, args.pid, args.think_ms, args.seed, poll_timeout=args.poll_timeout)
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        slower = regressions(results, baseline, args.max_regression, args.min_delta_ms)
+        for level, measure, old, new in slower:
+            print(f"REGRESSION {level} users {measure}: {old:.1f} -> {new:.1f}")
+        sys.exit(1 if slower else 0)
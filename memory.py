@@ -0,0 +1,272 @@
+"""
+Memory accounting and a per-worker RSS budget.
+
+MemoryBudget keeps a registry of what a worker process holds on top of the
+interpreter: the dataset's rows (per column), its access indexes and KPI
+rollup, and the caches built from it (figures, Advanced Insights, label
+dictionaries). /admin/memory reports the size of each next to the process
+RSS, and /metrics exports the same numbers.
+
+With MEMORY_BUDGET_MB set, a thread checks the RSS every
+MEMORY_CHECK_INTERVAL seconds. Over budget, it evicts the evictable items
+in order of rebuild cost, cheapest first, giving memory back to the OS
+after each step (gc, then malloc_trim on glibc), until the RSS is below
+MEMORY_LOW_WATER (default 0.9) of the budget. The rows and the indexes every
+request needs are never evicted; if they alone exceed the budget, a warning
+is logged and the budget is too small for the data. The checks after such a
+pass do nothing until the RSS has moved by RETRY_CHANGE of the budget, so a
+worker stuck over budget does not keep evicting (and rebuilding) its caches
+for nothing.
+"""
+import ctypes
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+RETRY_CHANGE = 0.05
+
+
+def deep_size(obj):
+    """Approximate bytes held by `obj` and the containers, arrays and frames it references."""
+    seen, total, stack = set(), 0, [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if type(item).__module__.startswith("pandas") and hasattr(item, "memory_usage"):
+            usage = item.memory_usage(deep=True)
+            total += int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+            continue
+        if type(item).__module__ == "numpy" and hasattr(item, "nbytes"):
+            total += int(item.nbytes)
+            continue
+        if type(item).__name__ == "Fragment":
+            # Pre-serialized JSON (figures.freeze); its bytes are not exposed
+            import orjson
+            total += len(orjson.dumps(item))
+            continue
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+    return total
+
+
+def _proc_status():
+    """{field: bytes} of the Rss* lines of /proc/self/status (Linux), else {}."""
+    try:
+        with open("/proc/self/status") as fh:
+            lines = fh.read().splitlines()
+    except OSError:
+        return {}
+    fields = {}
+    for line in lines:
+        key, _, value = line.partition(":")
+        if key.startswith("Rss") or key == "VmHWM":
+            fields[key] = int(value.split()[0]) * 1024
+    return fields
+
+
+def rss_bytes():
+    """Resident set size of this process, or None where it cannot be read."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def _load_malloc_trim():
+    try:
+        return ctypes.CDLL("libc.so.6").malloc_trim
+    except (OSError, AttributeError):  # not glibc
+        return None
+
+
+_malloc_trim = _load_malloc_trim()
+
+
+def release_memory():
+    """Collect garbage and hand the allocator's free pages back to the OS."""
+    gc.collect()
+    if _malloc_trim is not None:
+        _malloc_trim(0)
+
+
+class _Item:
+    __slots__ = ("name", "size", "evict", "cost", "rebuild", "evictions")
+
+    def __init__(self, name, size, evict, cost, rebuild):
+        self.name = name
+        self.size = size
+        self.evict = evict
+        self.cost = cost
+        self.rebuild = rebuild
+        self.evictions = 0
+
+
+class MemoryBudget:
+    """
+    Registry of the memory a worker holds, with eviction under `budget_mb`
+    (None = report only). Items are registered with `track`; `columns()`
+    gives the per-column bytes of the rows for the report.
+    """
+
+    def __init__(self, budget_mb=None, low_water=0.9, columns=lambda: {}):
+        self.budget = int(budget_mb * MB) if budget_mb else None
+        self.low_water = low_water
+        self.columns = columns
+        self.checks = 0
+        self.last_eviction = None
+        self.over_budget = False
+        self._stuck_rss = None
+        self._items = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def track(self, name, size, evict=None, cost=0, rebuild=None):
+        """
+        Account for `size()` bytes (an int, a {part: bytes} dict, or None if
+        unknown) under `name`. An evictable item gets `evict(excess_bytes)`,
+        which frees what it can (at least `excess_bytes` if it has that
+        much); `cost` orders the evictions, cheapest first, and `rebuild`
+        says how the item comes back.
+        """
+        self._items.append(_Item(name, size, evict, cost, rebuild))
+
+    def usage(self):
+        """[(name, bytes or None, item)] for every tracked item, parts expanded."""
+        rows = []
+        for item in self._items:
+            try:
+                size = item.size()
+            except Exception:
+                logger.debug("Sizing %s failed", item.name, exc_info=True)
+                size = None
+            if isinstance(size, dict):
+                rows += [(f"{item.name}/{part}", nbytes, item) for part, nbytes in size.items()]
+            else:
+                rows.append((item.name, size, item))
+        return rows
+
+    def check(self):
+        """Evict, cheapest to rebuild first, while the RSS is over budget. Returns True if it evicted."""
+        with self._lock:
+            self.checks += 1
+            rss = rss_bytes()
+            if self.budget is None or rss is None or rss <= self.budget:
+                self.over_budget = False
+                return False
+            was_over = self.over_budget
+            if was_over and abs(rss - self._stuck_rss) < self.budget * RETRY_CHANGE:
+                # The last pass could not get under budget and little has changed since
+                return False
+            target = int(self.budget * self.low_water)
+            started, before, evicted = time.perf_counter(), rss, []
+            for item in sorted((i for i in self._items if i.evict is not None), key=lambda i: i.cost):
+                try:
+                    item.evict(rss - target)
+                except Exception:
+                    logger.warning("Evicting %s failed", item.name, exc_info=True)
+                    continue
+                item.evictions += 1
+                evicted.append(item.name)
+                release_memory()
+                rss = rss_bytes()
+                if rss <= target:
+                    break
+            self.last_eviction = {"at": time.time(), "evicted": evicted, "rss_before_mb": round(before / MB, 1),
+                                  "rss_after_mb": round(rss / MB, 1),
+                                  "seconds": round(time.perf_counter() - started, 3)}
+            self.over_budget = over = rss > self.budget
+            self._stuck_rss = rss if over else None
+        if over and not was_over:
+            # Once while the budget stays exceeded, not on every check
+            logger.warning("RSS %.0f MB is still over the %.0f MB budget after evicting %s; "
+                           "the dataset itself needs more", rss / MB, self.budget / MB, ", ".join(evicted))
+        elif not over:
+            logger.info("RSS %.0f MB -> %.0f MB after evicting %s", before / MB, rss / MB, ", ".join(evicted))
+        return True
+
+    def start(self, interval):
+        """Check the budget every `interval` seconds in a daemon thread."""
+        if self.budget is None or not interval or self._thread is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.check()
+                except Exception:
+                    logger.exception("Memory budget check failed")
+
+        self._thread = threading.Thread(target=run, name="memory-budget", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def report(self):
+        """JSON-ready usage report for /admin/memory."""
+        rss = rss_bytes()
+        structures = [{"name": name, "bytes": size, "evictable": item.evict is not None,
+                       "rebuild": item.rebuild, "evictions": item.evictions}
+                      for name, size, item in self.usage()]
+        return {
+            "pid": os.getpid(),
+            "rss_mb": round(rss / MB, 1) if rss is not None else None,
+            "budget_mb": round(self.budget / MB, 1) if self.budget else None,
+            "process": {key: round(value / MB, 1) for key, value in _proc_status().items()},
+            "accounted_mb": round(sum(s["bytes"] or 0 for s in structures) / MB, 1),
+            "structures": sorted(structures, key=lambda s: -(s["bytes"] or 0)),
+            "columns": self.columns(),
+            "checks": self.checks,
+            "over_budget": self.over_budget,
+            "last_eviction": self.last_eviction,
+        }
+
+    def render(self):
+        rss = rss_bytes()
+        lines = []
+        if rss is not None:
+            lines += ["# HELP dash_memory_rss_bytes Resident set size of this worker process.",
+                      "# TYPE dash_memory_rss_bytes gauge",
+                      f"dash_memory_rss_bytes {rss}"]
+        if self.budget:
+            lines += ["# HELP dash_memory_budget_bytes RSS budget of this worker process.",
+                      "# TYPE dash_memory_budget_bytes gauge",
+                      f"dash_memory_budget_bytes {self.budget}"]
+        usage = self.usage()
+        lines += ["# HELP dash_memory_structure_bytes Bytes held per tracked structure.",
+                  "# TYPE dash_memory_structure_bytes gauge"]
+        lines += [f'dash_memory_structure_bytes{{structure="{name}"}} {size}'
+                  for name, size, _ in usage if size is not None]
+        lines += ["# HELP dash_memory_evictions_total Evictions per structure under the RSS budget.",
+                  "# TYPE dash_memory_evictions_total counter"]
+        lines += [f'dash_memory_evictions_total{{structure="{item.name}"}} {item.evictions}'
+                  for item in self._items if item.evict is not None]
+        return "\n".join(lines) + "\n"
+
+
+def memory_from_env(columns=lambda: {}):
+    """MemoryBudget configured from MEMORY_BUDGET_MB and MEMORY_LOW_WATER."""
+    return MemoryBudget(
+        budget_mb=float(os.environ.get("MEMORY_BUDGET_MB", 0)) or None,
+        low_water=float(os.environ.get("MEMORY_LOW_WATER", 0.9)),
+        columns=columns,
+    )
@@ -0,0 +1,257 @@
+"""
+Per-callback instrumentation served as Prometheus text on /metrics.
+
+`attach(app)` wraps every server callback Dash dispatches and records the
+request's wall time, response payload size and how many callbacks were in
+flight when it started. Inside a callback, `mark(phase)` charges the time
+since the previous mark to a phase (filter, groupby, figure); the time
+between the callback returning and the response being ready (output
+validation and JSON encoding) is the serialize phase.
+
+Optionally (CALLBACK_PROFILE_DIR), a CALLBACK_PROFILE_SAMPLE fraction of the
+requests runs under cProfile with tracemalloc tracing, and those slower than
+CALLBACK_PROFILE_SLOW_MS have their profile (.prof, read with pstats) and
+allocation snapshot (.tracemalloc, read with tracemalloc.Snapshot.load)
+dumped there. Tracing is only on while a sampled request runs, so the other
+requests do not pay for it.
+"""
+import bisect
+import cProfile
+import functools
+import logging
+import os
+import random
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+PAYLOAD_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+CONCURRENCY_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, rendered in Prometheus text format."""
+
+    def __init__(self, name, help, buckets, labelnames):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labels)]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                bucket_labels = ",".join(pairs + ['le="%s"' % le])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            label_text = "{" + ",".join(pairs) + "}" if pairs else ""
+            lines.append(f"{self.name}_sum{label_text} {total!r}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Request:
+    __slots__ = ("name", "started", "last_mark", "returned", "phases")
+
+    def __init__(self, name):
+        self.name = name
+        self.started = self.last_mark = time.perf_counter()
+        self.returned = None
+        self.phases = {}
+
+
+class CallbackMetrics:
+    """
+    Registry of callback latency, phase, payload and concurrency histograms.
+    `profile_dir` enables the slow-request profiler (`slow_ms` threshold,
+    `sample_rate` fraction of requests profiled).
+    """
+
+    def __init__(self, profile_dir=None, slow_ms=500.0, sample_rate=1.0):
+        self.latency = Histogram("dash_callback_duration_seconds",
+                                 "Wall time of a callback request, including serialization.",
+                                 LATENCY_BUCKETS, ["callback"])
+        self.phase_time = Histogram("dash_callback_phase_seconds",
+                                    "Wall time spent per phase of a callback request.",
+                                    PHASE_BUCKETS, ["callback", "phase"])
+        self.payload = Histogram("dash_callback_response_bytes",
+                                 "Size of the JSON response of a callback request.",
+                                 PAYLOAD_BUCKETS, ["callback"])
+        self.concurrency = Histogram("dash_callback_concurrency",
+                                     "Callback requests in flight when a request started (itself included).",
+                                     CONCURRENCY_BUCKETS, ["callback"])
+        self.profile_dir = profile_dir
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._traced = 0
+        self._owns_tracing = False
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    # === Inside callbacks ===
+
+    def instrument(self, func):
+        """Names the request after `func` and notes when it returned (start of serialize)."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            request = getattr(self._local, "request", None)
+            if request is not None:
+                request.name = func.__name__
+            result = func(*args, **kwargs)
+            if request is not None:
+                request.returned = time.perf_counter()
+            return result
+
+        return wrapper
+
+    def mark(self, phase):
+        """Charge the time since the previous mark (or the request start) to `phase`."""
+        request = getattr(self._local, "request", None)
+        if request is None:
+            return
+        now = time.perf_counter()
+        request.phases[phase] = request.phases.get(phase, 0.0) + now - request.last_mark
+        request.last_mark = now
+
+    # === Around Dash's dispatch ===
+
+    def attach(self, app):
+        """Wrap every server callback registered on `app` so its requests are recorded."""
+        for callback_id, entry in app.callback_map.items():
+            if "callback" in entry and not getattr(entry["callback"], "_metrics", False):
+                entry["callback"] = self._wrap(entry["callback"], callback_id)
+
+    def _wrap(self, dispatch, callback_id):
+        @functools.wraps(dispatch)
+        def wrapper(*args, **kwargs):
+            request = _Request(callback_id)
+            self._local.request = request
+            with self._lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                concurrent = self.in_flight
+            profiler = self._start_profile()
+            response = None
+            try:
+                response = dispatch(*args, **kwargs)
+                return response
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self.in_flight -= 1
+                self._local.request = None
+                self._record(request, finished, response, concurrent)
+                if profiler is not None:
+                    self._finish_profile(profiler, request, finished)
+
+        wrapper._metrics = True
+        return wrapper
+
+    def _record(self, request, finished, response, concurrent):
+        name = request.name
+        self.latency.observe(finished - request.started, name)
+        self.concurrency.observe(concurrent, name)
+        if request.returned is not None:
+            request.phases["serialize"] = finished - request.returned
+        for phase, seconds in request.phases.items():
+            self.phase_time.observe(seconds, name, phase)
+        if isinstance(response, (str, bytes)):
+            size = len(response.encode("utf-8")) if isinstance(response, str) else len(response)
+            self.payload.observe(size, name)
+
+    # === Slow-request profiling ===
+
+    def _start_profile(self):
+        if not self.profile_dir or random.random() >= self.sample_rate:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiler is active on this interpreter
+            return None
+        with self._lock:
+            # Tracing is process-wide: on while any sampled request runs
+            if not self._traced:
+                self._owns_tracing = not tracemalloc.is_tracing()
+                if self._owns_tracing:
+                    tracemalloc.start()
+            self._traced += 1
+        return profiler
+
+    def _finish_profile(self, profiler, request, finished):
+        profiler.disable()
+        try:
+            self._dump_profile(profiler, request, finished)
+        finally:
+            with self._lock:
+                self._traced -= 1
+                if not self._traced and self._owns_tracing:
+                    tracemalloc.stop()
+                    self._owns_tracing = False
+
+    def _dump_profile(self, profiler, request, finished):
+        elapsed_ms = (finished - request.started) * 1000
+        if elapsed_ms < self.slow_ms:
+            return
+        stem = os.path.join(self.profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-"
+                                              f"{request.name}-{elapsed_ms:.0f}ms")
+        try:
+            profiler.dump_stats(stem + ".prof")
+            if tracemalloc.is_tracing():
+                tracemalloc.take_snapshot().dump(stem + ".tracemalloc")
+        except OSError:
+            logger.exception("Could not write the profile for %s", request.name)
+
+    # === Exposition ===
+
+    def render(self):
+        with self._lock:
+            in_flight, max_in_flight = self.in_flight, self.max_in_flight
+        lines = []
+        for histogram in (self.latency, self.phase_time, self.payload, self.concurrency):
+            lines.extend(histogram.render())
+        lines += ["# HELP dash_callbacks_in_flight Callback requests currently running.",
+                  "# TYPE dash_callbacks_in_flight gauge",
+                  f"dash_callbacks_in_flight {in_flight}",
+                  "# HELP dash_callbacks_in_flight_max Most callback requests running at once.",
+                  "# TYPE dash_callbacks_in_flight_max gauge",
+                  f"dash_callbacks_in_flight_max {max_in_flight}"]
+        return "\n".join(lines) + "\n"
+
+
+def metrics_from_env():
+    """CallbackMetrics configured from CALLBACK_PROFILE_DIR, CALLBACK_PROFILE_SLOW_MS and CALLBACK_PROFILE_SAMPLE."""
+    return CallbackMetrics(
+        profile_dir=os.environ.get("CALLBACK_PROFILE_DIR") or None,
+        slow_ms=float(os.environ.get("CALLBACK_PROFILE_SLOW_MS", 500)),
+        sample_rate=float(os.environ.get("CALLBACK_PROFILE_SAMPLE", 1.0)),
+    )
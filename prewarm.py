@@ -0,0 +1,282 @@
+"""
+Cache pre-warming for the selections users open first.
+
+After a deploy, and after a reload (which changes the dataset version and so
+every figure cache key), the first visitor of each country and tab pays for
+the filtering and figure building. As soon as a dataset is loaded, Warmer
+runs those callbacks in a small thread pool so their results are already in
+the figure cache:
+
+- the default page: layout, label dictionary and the Overview KPIs for
+  France over the full year range;
+- every PREWARM_TABS tab for every PREWARM_COUNTRIES country;
+- the PREWARM_TOP most requested (tab, country) selections.
+
+The requested selections are counted from the callback requests themselves
+(the country input of each tab) and merged every PREWARM_LOG_INTERVAL
+seconds into a JSON file (PREWARM_LOG, default data/.cache/requests.json),
+so a deploy warms what users opened under the previous ones.
+
+GET /ready answers 503 until the dataset is loaded and its first warm-up
+has finished, then 200. Its body reports the warm-up progress either way.
+PREWARM=0 turns warming off (/ready then only waits for the data).
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import jsonify, request
+
+from utils import CACHE_DIRNAME
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COUNTRIES = "France,Germany,Spain"
+DEFAULT_TOP = 10
+LOG_FILENAME = "requests.json"
+
+
+def read_log(path):
+    """Counter of (tab, country) -> requests saved in `path` ({tab: {country: n}})."""
+    try:
+        with open(path) as fh:
+            saved = json.load(fh)
+        return Counter({(tab, country): int(n) for tab, by_country in saved.items()
+                        for country, n in by_country.items()})
+    except (OSError, ValueError, TypeError, AttributeError):
+        return Counter()
+
+
+def write_log(path, counts):
+    saved = {}
+    for (tab, country), n in counts.items():
+        saved.setdefault(tab, {})[country] = n
+    tmp = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(tmp, "w") as fh:
+        json.dump(saved, fh, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+class Warmer:
+    """
+    Background warm-up of the figure cache, bound to a DatasetStore.
+
+    `page(data)` warms the default page. `tabs` maps a tab to
+    `warm(data, country)`, which calls its callbacks with the inputs the
+    tab's controls start with. `inputs` maps the country input of a tab to
+    the tab; tabs without one are warmed once, not per country.
+    `available(tab, data)` tells whether a tab has data to show.
+    """
+
+    def __init__(self, store, page, tabs, inputs, available=lambda tab, data: True,
+                 countries=(), warm_tabs=None, top=DEFAULT_TOP, workers=2, log_path=None,
+                 flush_interval=60.0, enabled=True, on_ready=None):
+        self.store = store
+        self.page = page
+        self.tabs = tabs
+        self.inputs = inputs
+        self.available = available
+        self.countries = list(countries)
+        self.warm_tabs = list(tabs) if warm_tabs is None else list(warm_tabs)
+        self.top = top
+        self.workers = workers
+        self.log_path = log_path
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self.on_ready = on_ready
+        self.progress = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._logged = read_log(log_path) if log_path else Counter()
+        self._pending = Counter()
+        self._flusher = None
+
+    def attach(self, app):
+        app.server.add_url_rule("/ready", "ready", self.ready_endpoint)
+        app.server.before_request(self.record)
+
+    # === Request log ===
+
+    def record(self):
+        """Count the (tab, country) selection of a callback request (not of its polls)."""
+        if not request.path.endswith("_dash-update-component") or "cacheKey" in request.args:
+            return
+        data = self.store.peek()
+        body = request.get_json(silent=True)
+        if data is None or not isinstance(body, dict):
+            return
+        known = data.availability["indicators"]
+        for item in body.get("inputs") or []:
+            if not isinstance(item, dict) or item.get("property") != "value":
+                continue
+            component, country = item.get("id"), item.get("value")
+            if (isinstance(component, str) and component in self.inputs
+                    and isinstance(country, str) and country in known):
+                with self._lock:
+                    self._pending[(self.inputs[component], country)] += 1
+
+    def requested(self):
+        """Counter of every (tab, country) requested, saved and not yet saved."""
+        with self._lock:
+            return self._logged + self._pending
+
+    def flush(self):
+        """Add the counts since the last flush to the log file."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending or not self.log_path:
+            return
+        # Re-read first: other worker processes flush into the same file
+        counts = read_log(self.log_path) + pending
+        try:
+            write_log(self.log_path, counts)
+        except OSError:
+            logger.warning("Could not save the request log to %s", self.log_path, exc_info=True)
+            with self._lock:
+                self._pending.update(pending)
+            return
+        with self._lock:
+            self._logged = counts
+
+    def _start_flusher(self):
+        if self._flusher is not None or not self.log_path:
+            return
+
+        def run():
+            while True:
+                time.sleep(self.flush_interval)
+                self.flush()
+
+        self._flusher = threading.Thread(target=run, name="prewarm-log", daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
+
+    # === Warm-up ===
+
+    def plan(self, data):
+        """(tab, country) pairs to warm for `data`, the default page ((None, None)) first."""
+        known = data.availability["indicators"]
+        per_country = set(self.inputs.values())
+        tabs = [tab for tab in self.warm_tabs if tab in self.tabs and self.available(tab, data)]
+        tasks = [(None, None)] + [(tab, None) for tab in tabs if tab not in per_country]
+        tasks += [(tab, country) for country in self.countries if country in known
+                  for tab in tabs if tab in per_country]
+        popular = [(tab, country) for (tab, country), _ in self.requested().most_common()
+                   if tab in self.tabs and country in known and self.available(tab, data)
+                   and (tab, country) not in tasks]
+        return tasks + popular[:self.top]
+
+    def start(self, data):
+        """Warm the caches for `data` in the background, superseding any earlier run."""
+        self._start_flusher()
+        if not self.enabled:
+            self._finish_first(0.0)
+            return
+        tasks = self.plan(data)
+        progress = {"version": data.version, "total": len(tasks), "done": 0, "failed": 0,
+                    "skipped": 0, "seconds": None}
+        with self._lock:
+            self.progress = progress
+        threading.Thread(target=self._run, args=(data, tasks, progress), name="prewarm",
+                         daemon=True).start()
+
+    def _run(self, data, tasks, progress):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="prewarm") as pool:
+            for task in tasks:
+                pool.submit(self._warm, data, task, progress)
+        seconds = time.perf_counter() - started
+        with self._lock:
+            progress["seconds"] = round(seconds, 3)
+        logger.info("Warm-up of version %s: %d/%d selections in %.2fs (%d failed, %d skipped)",
+                    data.version, progress["done"], progress["total"], seconds,
+                    progress["failed"], progress["skipped"])
+        self._finish_first(seconds)
+
+    def _warm(self, data, task, progress):
+        tab, country = task
+        if self.store.peek() is not data:
+            # A reload superseded this run; its own run warms the new version
+            outcome = "skipped"
+        else:
+            try:
+                if tab is None:
+                    self.page(data)
+                else:
+                    self.tabs[tab](data, country)
+                outcome = "done"
+            except Exception:
+                logger.warning("Warm-up of %s/%s failed", tab or "page", country, exc_info=True)
+                outcome = "failed"
+        with self._lock:
+            progress[outcome] += 1
+
+    def _finish_first(self, seconds):
+        if self._ready.is_set():
+            return
+        self._ready.set()
+        if self.on_ready is not None:
+            self.on_ready(seconds)
+
+    # === Readiness ===
+
+    def status(self):
+        data = self.store.peek()
+        if data is None:
+            state = "loading"
+        elif not self._ready.is_set():
+            state = "warming"
+        else:
+            state = "ready"
+        with self._lock:
+            progress = dict(self.progress) if self.progress else None
+        return {"status": state, "version": data.version if data is not None else None,
+                "warm_up": progress}
+
+    def ready_endpoint(self):
+        status = self.status()
+        return jsonify(status), 200 if status["status"] == "ready" else 503
+
+    def render(self):
+        status = self.status()
+        lines = ["# HELP dash_ready Whether the dataset is loaded and its first warm-up finished.",
+                 "# TYPE dash_ready gauge",
+                 f"dash_ready {int(status['status'] == 'ready')}"]
+        progress = status["warm_up"]
+        if progress:
+            lines += ["# HELP dash_prewarm_selections Selections of the latest warm-up by outcome.",
+                      "# TYPE dash_prewarm_selections gauge"]
+            lines += [f'dash_prewarm_selections{{outcome="{key}"}} {progress[key]}'
+                      for key in ("total", "done", "failed", "skipped")]
+            if progress["seconds"] is not None:
+                lines += ["# HELP dash_prewarm_seconds Duration of the latest warm-up.",
+                          "# TYPE dash_prewarm_seconds gauge",
+                          f"dash_prewarm_seconds {progress['seconds']:.6f}"]
+        return "\n".join(lines) + "\n"
+
+
+def _names(value):
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def warmer_from_env(store, page, tabs, inputs, available=lambda tab, data: True, on_ready=None):
+    """Warmer configured from PREWARM, PREWARM_COUNTRIES, PREWARM_TABS, PREWARM_TOP,
+    PREWARM_WORKERS, PREWARM_LOG and PREWARM_LOG_INTERVAL."""
+    warm_tabs = os.environ.get("PREWARM_TABS")
+    return Warmer(
+        store, page, tabs, inputs, available,
+        countries=_names(os.environ.get("PREWARM_COUNTRIES", DEFAULT_COUNTRIES)),
+        warm_tabs=_names(warm_tabs) if warm_tabs else None,
+        top=int(os.environ.get("PREWARM_TOP", DEFAULT_TOP)),
+        workers=int(os.environ.get("PREWARM_WORKERS", 2)),
+        log_path=os.environ.get("PREWARM_LOG") or os.path.join(store.base, CACHE_DIRNAME, LOG_FILENAME),
+        flush_interval=float(os.environ.get("PREWARM_LOG_INTERVAL", 60)),
+        enabled=os.environ.get("PREWARM", "1") != "0",
+        on_ready=on_ready,
+    )
@@ -0,0 +1,180 @@
+"""
+Hot reload of the dataset without restarting the server.
+
+DatasetStore owns the current Dataset snapshot. A background thread polls the
+source files; when one changes, only its rows with a newer (or no)
+`updated_at` than the snapshot has seen are merged (Dataset.merge), and the
+resulting snapshot replaces the current one in a single reference
+assignment. The merge only upserts, so the dataset is loaded again from
+scratch instead when a source lost rows (or was removed), when new rows
+have no Country or Topic, and for a query backend that cannot merge, like
+the SQLite store. A store whose loader opens a snapshot shared between
+processes (merge=False, see shared.py) always reloads through the loader,
+so the processes do not each merge a private copy. Callbacks fetch `store.current()` once per request, so
+requests already in flight finish on the snapshot they started with.
+"""
+import logging
+import os
+import threading
+import time
+
+from utils import (concat_compact, read_source, save_cache, save_layout_meta, source_fingerprint,
+                   source_manifest, source_name, source_paths)
+
+logger = logging.getLogger(__name__)
+
+
+def source_stamps(base):
+    """{filename: (size, mtime_ns)} for the sources currently present under `base`."""
+    stamps = {}
+    for f in source_manifest(base):
+        try:
+            st = os.stat(os.path.join(base, f))
+        except OSError:
+            continue
+        stamps[f] = (st.st_size, st.st_mtime_ns)
+    return stamps
+
+
+class DatasetStore:
+    """
+    Holder of the current Dataset. Pass either a `dataset` or a `loader`
+    callable, which is then run on the first `current()` call. With
+    `merge=False`, changed sources are reloaded with the loader instead of
+    being merged into the current snapshot.
+    """
+
+    def __init__(self, dataset, base, loader=None, merge=True):
+        self.base = base
+        self.generation = 0
+        self._current = dataset
+        self._loader = loader
+        self._merge = merge
+        self._stamps = source_stamps(base)
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._listeners = []
+
+    def current(self):
+        dataset = self._current
+        if dataset is None:
+            with self._lock:
+                if self._current is None:
+                    self._current = self._loader()
+                dataset = self._current
+        return dataset
+
+    def peek(self):
+        """The current snapshot if one is loaded, without running the loader."""
+        return self._current
+
+    def install(self, dataset):
+        """Use `dataset` as the initial snapshot instead of running the loader."""
+        with self._lock:
+            self._current = dataset
+
+    def set_loader(self, loader, merge=True):
+        """Replace the loader run on the first `current()` call (and on rebuilds)."""
+        with self._lock:
+            self._loader = loader
+            self._merge = merge
+
+    def on_swap(self, listener):
+        """Call `listener(dataset)` after every swap to a new snapshot."""
+        self._listeners.append(listener)
+
+    def swap(self, dataset):
+        with self._lock:
+            self._current = dataset
+            self.generation += 1
+        logger.info("Dataset swapped to version %s (generation %d, %d rows)",
+                    dataset.version, self.generation, len(dataset))
+        for listener in self._listeners:
+            try:
+                listener(dataset)
+            except Exception:
+                logger.exception("Swap listener %r failed", listener)
+
+    def check(self):
+        """Merge any changed sources into a new snapshot. Returns True if it swapped."""
+        with self._reload_lock:
+            stamps = source_stamps(self.base)
+            changed = [f for f, stamp in stamps.items() if self._stamps.get(f) != stamp]
+            removed = set(self._stamps) - set(stamps)
+            if not changed and not removed:
+                return False
+            current = self._current
+            if current is None:
+                return False
+            if removed or not self._merge or not hasattr(current, "merge"):
+                # Backends without incremental merges (the SQLite store) are rebuilt
+                return self._rebuild(stamps)
+            sources = {f: read_source(os.path.join(self.base, f)) for f in changed}
+            if any(self._lost_rows(current, f, rows) for f, rows in sources.items()):
+                return self._rebuild(stamps)
+            updates = [self._fresh_rows(current, f, rows) for f, rows in sources.items()]
+            updates = [u for u in updates if len(u)]
+            self._stamps = stamps
+            if not updates:
+                return False
+            updates = concat_compact(updates)
+            if updates[["Country", "Topic"]].isna().any(axis=None):
+                # Rows outside any (Country, Topic) partition cannot be merged
+                return self._rebuild(stamps)
+
+            version = source_fingerprint(source_paths(self.base))
+            merged = current.merge(updates, version)
+            self.swap(merged)
+
+        try:
+            save_cache(self.base, version, merged.df.drop(columns="family"), merged.kpis.partials)
+        except OSError:
+            pass
+        # save_cache removed the previous version's layout options
+        save_layout_meta(self.base, merged)
+        return True
+
+    def _rebuild(self, stamps):
+        self._stamps = stamps
+        dataset = self._loader()
+        self.swap(dataset)
+        save_layout_meta(self.base, dataset)
+        return True
+
+    def _lost_rows(self, current, filename, rows):
+        """Whether rows of the snapshot from `filename` are no longer in its `rows`."""
+        from dataset import merge_keys
+
+        held = current.df[(current.df["Source"] == source_name(filename)).to_numpy()]
+        return len(rows) < len(held) or not merge_keys(held).isin(merge_keys(rows)).all()
+
+    def _fresh_rows(self, current, filename, rows):
+        import pandas as pd
+
+        if "updated_at" not in rows.columns:
+            return rows
+        seen = current.df.loc[current.df["Source"] == source_name(filename), "updated_at"].max()
+        if pd.isna(seen):
+            return rows
+        # Rows without a timestamp cannot be told apart: upsert them again
+        return rows[(rows["updated_at"] > seen) | rows["updated_at"].isna()]
+
+    def start(self, interval):
+        """Poll the data directory every `interval` seconds in a daemon thread."""
+        if not interval or self._thread is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.check()
+                except Exception:
+                    logger.exception("Dataset reload failed; keeping version %s", self._current.version)
+
+        self._thread = threading.Thread(target=run, name="dataset-reloader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
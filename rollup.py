@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+from indicators import in_family
+
+# Overview KPIs: name -> (topic or None, indicator family or None, category or None).
+# A row counts towards a KPI when it matches every non-None part.
+KPI_MEASURES = {
+    "wage_gap": (None, "wage_gap", None),
+    "senior_roles": ("Senior Management", None, "women"),
+    "inventors": ("Innovation", "female_inventors", None),
+    "founders": ("Entrepreneurship", "gender_diverse", None),
+}
+PARTIAL_COLUMNS = ["Country", "kpi", "Year", "sum", "count"]
+
+
+def kpi_partials(frame):
+    """
+    Long table of Value sums and counts per (Country, kpi, Year) for `frame`.
+    Partials of disjoint frames can be concatenated and summed.
+    """
+    if frame.empty:
+        return pd.DataFrame(columns=PARTIAL_COLUMNS)
+    parts = []
+    for name, (topic, family, category) in KPI_MEASURES.items():
+        mask = np.ones(len(frame), dtype=bool)
+        if topic is not None:
+            mask &= (frame["Topic"] == topic).to_numpy()
+        if family is not None:
+            mask &= in_family(frame, family)
+        if category is not None:
+            mask &= (frame["Indicator Categories"].str.lower() == category).fillna(False).to_numpy(dtype=bool)
+        rows = frame.loc[mask, ["Country", "Year", "Value"]]
+        if rows.empty:
+            continue
+        rows = rows.astype({"Value": np.float64})
+        agg = rows.groupby(["Country", "Year"], observed=True)["Value"].agg(["sum", "count"]).reset_index()
+        agg["kpi"] = name
+        parts.append(agg)
+    if not parts:
+        return pd.DataFrame(columns=PARTIAL_COLUMNS)
+    out = pd.concat(parts, ignore_index=True)
+    out["Country"] = out["Country"].astype(str)
+    return out[PARTIAL_COLUMNS]
+
+
+class KpiRollup:
+    """
+    Per (country, KPI, year) sum and count arrays with prefix sums along the
+    year axis. A KPI mean for any set of countries and any year range is two
+    array lookups per country and a division, independent of the row count.
+    """
+
+    def __init__(self, partials):
+        partials = partials.groupby(["Country", "kpi", "Year"], as_index=False)[["sum", "count"]].sum()
+        self.partials = partials
+        self.countries = sorted(partials["Country"].unique())
+        self.kpis = list(KPI_MEASURES)
+        self._country_index = {c: i for i, c in enumerate(self.countries)}
+
+        if partials.empty:
+            self.first_year, n_years = 0, 0
+        else:
+            self.first_year = int(partials["Year"].min())
+            n_years = int(partials["Year"].max()) - self.first_year + 1
+
+        shape = (len(self.countries), len(self.kpis), n_years + 1)
+        sums = np.zeros(shape, dtype=np.float64)
+        counts = np.zeros(shape, dtype=np.int64)
+        ci = partials["Country"].map(self._country_index).to_numpy()
+        ki = partials["kpi"].map({k: i for i, k in enumerate(self.kpis)}).to_numpy()
+        yi = partials["Year"].to_numpy(dtype=np.int64) - self.first_year + 1
+        sums[ci, ki, yi] = partials["sum"].to_numpy()
+        counts[ci, ki, yi] = partials["count"].to_numpy()
+
+        # Slot 0 stays zero so a range [lo, hi] is cum[hi + 1] - cum[lo]
+        self.cum_sums = np.cumsum(sums, axis=2)
+        self.cum_counts = np.cumsum(counts, axis=2)
+
+    @classmethod
+    def from_frame(cls, frame):
+        return cls(kpi_partials(frame))
+
+    def nbytes(self):
+        return self.cum_sums.nbytes + self.cum_counts.nbytes
+
+    def partials_nbytes(self):
+        return int(self.partials.memory_usage(deep=True).sum()) if self.partials is not None else 0
+
+    def drop_partials(self):
+        """Free the partials table (only `updated` needs it; see Dataset.merge)."""
+        self.partials = None
+
+    def updated(self, removed, added):
+        """New rollup with the rows of `removed` taken out and those of `added` put in."""
+        gone = kpi_partials(removed)
+        gone[["sum", "count"]] = -gone[["sum", "count"]]
+        parts = [p for p in (self.partials, gone, kpi_partials(added)) if len(p)]
+        return KpiRollup(pd.concat(parts, ignore_index=True) if parts else self.partials)
+
+    def means(self, countries, year_range):
+        """KPI name -> mean Value over `countries` and the inclusive `year_range` (NaN if no rows)."""
+        idx = [self._country_index[c] for c in countries or [] if c in self._country_index]
+        n_slots = self.cum_sums.shape[2]
+        lo = int(np.clip(year_range[0] - self.first_year, 0, n_slots - 1))
+        hi = int(np.clip(year_range[1] - self.first_year + 1, 0, n_slots - 1))
+        if not idx or hi <= lo:
+            return {k: np.nan for k in self.kpis}
+
+        sums = (self.cum_sums[idx, :, hi] - self.cum_sums[idx, :, lo]).sum(axis=0)
+        counts = (self.cum_counts[idx, :, hi] - self.cum_counts[idx, :, lo]).sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(counts > 0, sums / counts, np.nan)
+        return dict(zip(self.kpis, means.tolist()))
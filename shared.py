@@ -0,0 +1,130 @@
+"""
+Dataset snapshot shared by all server worker processes.
+
+The parent process writes the prepared Dataset (sorted partitions, family
+flags, KPI partials, availability map) once to an uncompressed Arrow IPC file.
+Every worker memory-maps that file read-only and wraps the column buffers in
+pandas without copying them, so the data lives once in the page cache no
+matter how many workers are running, and a worker boots without parsing or
+sorting anything.
+
+When the sources change, the file for the new version is built by one
+process under a lock (ensure_shared) and the others wait for it and map it,
+so a reload costs one load however many workers there are.
+"""
+import contextlib
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from dataset import Dataset
+from utils import CACHE_DIRNAME, DATA_DIR
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: no cross-process lock
+    fcntl = None
+
+
+def shared_path(base, version):
+    return os.path.join(base, CACHE_DIRNAME, f"shared-{version}.arrow")
+
+
+def materialize(dataset, path):
+    """Write `dataset` to `path` as a memory-mappable Arrow IPC file (atomically)."""
+    table = pa.Table.from_pandas(dataset.df, preserve_index=False)
+    columns = []
+    for field, column in zip(table.schema, table.columns):
+        column = column.combine_chunks()
+        if pa.types.is_dictionary(field.type):
+            # Narrowest index type, so pandas can use the codes without a cast
+            width = pa.int8() if len(column.dictionary) < 2 ** 7 else (
+                pa.int16() if len(column.dictionary) < 2 ** 15 else pa.int32())
+            column = pa.DictionaryArray.from_arrays(column.indices.cast(width), column.dictionary)
+        columns.append(column)
+
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"version"] = str(dataset.version).encode()
+    metadata[b"kpi_partials"] = dataset.kpis.partials.to_json(orient="split").encode()
+    metadata[b"availability"] = json.dumps(dataset.availability).encode()
+    table = pa.Table.from_arrays(columns, names=table.column_names).replace_schema_metadata(metadata)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+    return path
+
+
+def open_shared(path):
+    """Dataset backed by the memory-mapped file at `path` (column data is not copied)."""
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    metadata = table.schema.metadata
+    pandas_types = {c["name"]: c["numpy_type"] for c in table.schema.pandas_metadata["columns"]}
+
+    data = {}
+    for name, column in zip(table.column_names, table.columns):
+        data[name] = _wrap(column.combine_chunks(), pandas_types.get(name))
+    df = pd.DataFrame(data, copy=False)
+
+    partials = pd.read_json(io.StringIO(metadata[b"kpi_partials"].decode()), orient="split")
+    availability = json.loads(metadata[b"availability"])
+    return Dataset.prepared(df, metadata[b"version"].decode(), partials, availability)
+
+
+def _wrap(array, pandas_type):
+    if pa.types.is_dictionary(array.type):
+        indices = array.indices
+        codes = indices.to_numpy(zero_copy_only=False)
+        if indices.null_count:
+            codes = np.where(indices.is_valid().to_numpy(zero_copy_only=False), codes, -1).astype(codes.dtype)
+        categories = pd.Index(array.dictionary.to_pylist())
+        return pd.Categorical.from_codes(codes, categories=categories, validate=False)
+    if array.null_count or pa.types.is_timestamp(array.type):
+        return array.to_pandas()
+    values = array.to_numpy(zero_copy_only=True)
+    if pandas_type and pandas_type[0].isupper():
+        # Nullable extension dtype (e.g. Int32) over the mapped values
+        return pd.arrays.IntegerArray(values, np.zeros(len(values), dtype=bool))
+    return values
+
+
+@contextlib.contextmanager
+def _build_lock(base):
+    """Held by the one process that builds a shared file under `base`; the others wait."""
+    if fcntl is None:
+        yield
+        return
+    directory = os.path.join(base, CACHE_DIRNAME)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "shared.lock"), "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def ensure_shared(base=DATA_DIR, **load_kwargs):
+    """
+    Path of the shared file for the current sources, building it if needed.
+    Processes calling this at the same time build the file once.
+    """
+    from dataset import load_dataset
+    from utils import source_fingerprint, source_paths
+
+    version = source_fingerprint(source_paths(base))
+    path = shared_path(base, version)
+    if os.path.exists(path):
+        return path
+    with _build_lock(base):
+        # Built by another process while this one waited
+        if not os.path.exists(path):
+            materialize(load_dataset(base, **load_kwargs), path)
+    return path
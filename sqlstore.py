@@ -0,0 +1,399 @@
+"""
+On-disk query backend: the compact store in an indexed SQLite file.
+
+Text columns are dictionary-coded (the `labels` table maps each column's
+integer codes back to its labels), rows keep the store's order as their
+rowid, and a composite index on (country, topic, indicator, year) serves
+every callback lookup. SQLiteDataset answers the same queries as Dataset
+(select / rows / group_means / trend) with filtered GROUP BY statements, so
+only aggregates reach Python and memory stays bounded by SQLite's page cache
+(SQLITE_CACHE_MB) however large the extract is.
+
+The file is built from the Parquet store one record batch at a time, running
+the streaming ingest first if there is no store yet:
+
+    python sqlstore.py [--data-dir DIR] [--memory-mb 256]
+"""
+import argparse
+import io
+import json
+import os
+import pathlib
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from indicators import FAMILY_BITS, family_flags
+from ingest import DEFAULT_MEMORY_MB, compact_partials, stream_ingest
+from memory import deep_size
+from rollup import PARTIAL_COLUMNS, KpiRollup, kpi_partials
+from utils import (CACHE_DIRNAME, CATEGORY_COLUMNS, CSV_DTYPES, DATA_DIR, cache_paths, remove_stale_caches,
+                   source_fingerprint, source_paths)
+
+# Frame column -> SQL column, in table order
+SQL_COLUMNS = {
+    "Country": "country",
+    "Year": "year",
+    "Technology or Sector": "sector",
+    "Topic": "topic",
+    "Indicator": "indicator",
+    "Indicator Categories": "category",
+    "Unit": "unit",
+    "Value": "value",
+    "Number of observations": "n_obs",
+    "updated_at": "updated_at",
+    "Source": "source",
+    "family": "family",
+}
+NUMERIC_DTYPES = {col: dtype for col, dtype in CSV_DTYPES.items() if dtype != "category"}
+DEFAULT_CACHE_MB = 64
+# Rough Python-side cost of one row while a batch is converted and inserted
+ROW_BYTES = 2048
+
+
+def sqlite_path(base, version):
+    return os.path.join(base, CACHE_DIRNAME, f"query-{version}.sqlite")
+
+
+# === Build ===
+
+def _codes(series, mapping):
+    """Global integer codes (None for missing) of a categorical column, extending `mapping`."""
+    series = series.astype("category")
+    lookup = np.array([mapping.setdefault(label, len(mapping)) for label in series.cat.categories],
+                      dtype=np.int64)
+    codes = series.cat.codes.to_numpy()
+    if not len(lookup):
+        return [None] * len(series)
+    out = pd.Series(lookup[np.maximum(codes, 0)], dtype=object)
+    return out.where(codes >= 0, None).tolist()
+
+
+def _nullable(series):
+    if series.hasnans:
+        return series.astype(object).where(series.notna(), None).tolist()
+    return series.tolist()
+
+
+def _epoch_ms(series):
+    ms = (series.array.asi8 // 1_000_000).astype(object)
+    ms[series.isna().to_numpy()] = None
+    return ms.tolist()
+
+
+def _availability(conn, labels):
+    """Same lookups as dataset.availability_map, from the coded table."""
+    indicators = {}
+    rows = conn.execute("SELECT DISTINCT country, topic, indicator FROM obs WHERE country IS NOT NULL "
+                        "AND topic IS NOT NULL AND indicator IS NOT NULL")
+    for country, topic, indicator in rows:
+        (indicators.setdefault(labels["Country"][country], {})
+         .setdefault(labels["Topic"][topic], []).append(labels["Indicator"][indicator]))
+    for by_topic in indicators.values():
+        for topic in by_topic:
+            by_topic[topic].sort()
+
+    sectors = {}
+    innovation = {label: code for code, label in labels["Topic"].items()}.get("Innovation")
+    if innovation is not None:
+        rows = conn.execute("SELECT DISTINCT country, sector FROM obs WHERE topic = ? AND (family & ?) != 0 "
+                            "AND country IS NOT NULL AND sector IS NOT NULL",
+                            (innovation, FAMILY_BITS["female_inventors"]))
+        for country, sector in rows:
+            sectors.setdefault(labels["Country"][country], []).append(labels["Technology or Sector"][sector])
+        for country in sectors:
+            sectors[country].sort()
+    return {"indicators": indicators, "innovation_sectors": sectors}
+
+
+def build_sqlite(store_path, path, version, batch_rows=65_536):
+    """Load the Parquet store at `store_path` into a new SQLite file at `path` (atomically)."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("CREATE TABLE labels (col TEXT, code INTEGER, label TEXT, PRIMARY KEY (col, code))")
+        conn.execute(f"CREATE TABLE obs ({', '.join(SQL_COLUMNS.values())})")
+        insert = f"INSERT INTO obs VALUES ({', '.join('?' * len(SQL_COLUMNS))})"
+
+        dictionaries = {col: {} for col in CATEGORY_COLUMNS}
+        partials, n_rows = [], 0
+        for batch in pq.ParquetFile(store_path).iter_batches(batch_size=batch_rows):
+            chunk = batch.to_pandas()
+            chunk["family"] = family_flags(chunk["Indicator"])
+            partials.append(kpi_partials(chunk))
+            if len(partials) >= 16:
+                partials = compact_partials(partials)
+
+            columns = []
+            for col in SQL_COLUMNS:
+                if col in CATEGORY_COLUMNS:
+                    columns.append(_codes(chunk[col], dictionaries[col]))
+                elif col == "updated_at":
+                    columns.append(_epoch_ms(chunk[col]))
+                else:
+                    columns.append(_nullable(chunk[col]))
+            conn.executemany(insert, zip(*columns))
+            n_rows += len(chunk)
+
+        conn.executemany("INSERT INTO labels VALUES (?, ?, ?)",
+                         [(col, code, label) for col, mapping in dictionaries.items()
+                          for label, code in mapping.items()])
+        conn.execute("CREATE INDEX obs_lookup ON obs (country, topic, indicator, year)")
+
+        labels = {col: {code: label for label, code in mapping.items()} for col, mapping in dictionaries.items()}
+        partials = compact_partials(partials)
+        kpis = partials[0] if partials else pd.DataFrame(columns=PARTIAL_COLUMNS)
+        summary = {
+            "rows": n_rows,
+            "countries": sorted(labels["Country"][c] for (c,) in
+                                conn.execute("SELECT DISTINCT country FROM obs WHERE country IS NOT NULL")),
+            "topics": sorted(labels["Topic"][t] for (t,) in
+                             conn.execute("SELECT DISTINCT topic FROM obs WHERE topic IS NOT NULL")),
+            "years": [y for (y,) in conn.execute("SELECT DISTINCT year FROM obs WHERE year IS NOT NULL ORDER BY year")],
+        }
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("version", str(version)),
+            ("summary", json.dumps(summary)),
+            ("kpi_partials", kpis.to_json(orient="split")),
+            ("availability", json.dumps(_availability(conn, labels))),
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp, path)
+    return path
+
+
+def ensure_sqlite(base=DATA_DIR, memory_limit_mb=None):
+    """Path of the SQLite file for the current sources, building it (out of core) if needed."""
+    version = source_fingerprint(source_paths(base))
+    path = sqlite_path(base, version)
+    if os.path.exists(path):
+        return path
+    memory_limit_mb = memory_limit_mb or DEFAULT_MEMORY_MB
+    store_path, _ = cache_paths(base, version)
+    if not os.path.exists(store_path):
+        stream_ingest(base, memory_limit_mb)
+    build_sqlite(store_path, path, version, batch_rows=max(1_000, memory_limit_mb * 1024 * 1024 // ROW_BYTES))
+    remove_stale_caches(base, version)
+    return path
+
+
+# === Queries ===
+
+class SQLiteDataset:
+    """
+    Read-only stand-in for Dataset over a file built by build_sqlite. Each
+    thread gets its own connection; the KPI rollup and dropdown lookups are
+    small and kept in memory.
+    """
+
+    def __init__(self, path, cache_mb=None):
+        self.path = path
+        self.cache_mb = cache_mb or int(os.environ.get("SQLITE_CACHE_MB", DEFAULT_CACHE_MB))
+        self._uri = pathlib.Path(os.path.abspath(path)).as_uri() + "?mode=ro"
+        self._local = threading.local()
+        # Bumped by release_caches; each connection empties its page cache when it sees it
+        self._release_generation = 0
+
+        conn = self._connection()
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+        summary = json.loads(meta["summary"])
+        self.version = meta["version"]
+        self.countries = summary["countries"]
+        self.topics = summary["topics"]
+        self.years = summary["years"]
+        self._n_rows = summary["rows"]
+        self.kpis = KpiRollup(pd.read_json(io.StringIO(meta["kpi_partials"]), orient="split"))
+        self.availability = json.loads(meta["availability"])
+
+        self._labels = {col: {} for col in CATEGORY_COLUMNS}
+        for col, code, label in conn.execute("SELECT col, code, label FROM labels"):
+            self._labels[col][code] = label
+        self._codes = {col: {label: code for code, label in mapping.items()}
+                       for col, mapping in self._labels.items()}
+
+    def __len__(self):
+        return self._n_rows
+
+    def category_labels(self):
+        return sorted({label for mapping in self._labels.values() for label in mapping.values()})
+
+    def _connection(self):
+        # A connection must not cross a fork (background callback jobs)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA cache_size=-{self.cache_mb * 1024}")
+            self._local.conn, self._local.pid = conn, os.getpid()
+            self._local.released = self._release_generation
+        elif self._local.released != self._release_generation:
+            conn.execute("PRAGMA shrink_memory")
+            self._local.released = self._release_generation
+        return conn
+
+    # === Memory accounting (memory.py) ===
+
+    def column_usage(self):
+        # The rows stay on disk
+        return {}
+
+    def memory_usage(self):
+        return {
+            "label_lookups": deep_size(self._labels) + deep_size(self._codes),
+            "kpi_rollup": self.kpis.nbytes(),
+            "availability": deep_size(self.availability),
+        }
+
+    def release_caches(self):
+        """Have every connection free its page cache (on its thread's next query)."""
+        self._release_generation += 1
+
+    def _where(self, countries, topic=None, family=None, indicator=None, sector=None,
+               value_range=None, year_range=None, exclude_category=None):
+        """(WHERE clause, params, country codes), or None if no row can match."""
+        codes = [self._codes["Country"][c] for c in countries or [] if c in self._codes["Country"]]
+        if not codes:
+            return None
+        clauses = [f"country IN ({', '.join('?' * len(codes))})"]
+        params = list(codes)
+        for col, label in (("Topic", topic), ("Indicator", indicator), ("Technology or Sector", sector)):
+            if label is None:
+                continue
+            code = self._codes[col].get(label)
+            if code is None:
+                return None
+            clauses.append(f"{SQL_COLUMNS[col]} = ?")
+            params.append(code)
+        if family is not None:
+            clauses.append("(family & ?) != 0")
+            params.append(FAMILY_BITS[family])
+        if year_range is not None:
+            clauses.append("year BETWEEN ? AND ?")
+            params += [int(y) for y in year_range]
+        if value_range is not None:
+            clauses.append("value > ? AND value < ?")
+            params += [float(v) for v in value_range]
+        if exclude_category is not None:
+            # Regex evaluated once per label, not per row
+            pattern = re.compile(exclude_category)
+            skip = [code for code, label in self._labels["Indicator Categories"].items() if pattern.match(label)]
+            if skip:
+                clauses.append(f"(category IS NULL OR category NOT IN ({', '.join('?' * len(skip))}))")
+                params += skip
+        return " AND ".join(clauses), params, codes
+
+    def _cursor(self, countries, topic, columns, filters):
+        """Cursor over `columns` of the matching rows, ordered by `countries` then store order."""
+        where = self._where(countries, topic, **filters)
+        if where is None:
+            return None
+        clause, params, codes = where
+        order = "rowid" if len(codes) == 1 else (
+            "CASE country " + " ".join(f"WHEN {c} THEN {i}" for i, c in enumerate(codes)) + " END, rowid")
+        select = ", ".join(SQL_COLUMNS[c] for c in columns)
+        return self._connection().execute(f"SELECT {select} FROM obs WHERE {clause} ORDER BY {order}", params)
+
+    def _frame(self, records, columns):
+        frame = pd.DataFrame(records, columns=columns)
+        for col in columns:
+            if col in self._labels:
+                frame[col] = frame[col].map(self._labels[col])
+            elif col in NUMERIC_DTYPES:
+                # Back to the store's dtypes (SQLite widens them to 64 bits)
+                frame[col] = frame[col].astype(NUMERIC_DTYPES[col])
+        return frame
+
+    def rows(self, countries, topic, columns, **filters):
+        cursor = self._cursor(countries, topic, columns, filters)
+        if cursor is None:
+            return pd.DataFrame(columns=columns)
+        return self._frame(cursor.fetchall(), columns)
+
+    def iter_rows(self, countries, topic, columns, chunk_rows=50_000, **filters):
+        """`rows` in frames of at most `chunk_rows`, fetched from one cursor as they are consumed."""
+        cursor = self._cursor(countries, topic, columns, filters)
+        if cursor is None:
+            return
+        try:
+            while True:
+                records = cursor.fetchmany(chunk_rows)
+                if not records:
+                    return
+                yield self._frame(records, columns)
+        finally:
+            cursor.close()
+
+    def select(self, countries, topic=None, **filters):
+        return self.rows(countries, topic, [c for c in SQL_COLUMNS], **filters)
+
+    def group_means(self, column, countries, topic=None, **filters):
+        """(labels, mean Values) per `column` label, in dictionary (store) order."""
+        where = self._where(countries, topic, **filters)
+        if where is None:
+            return [], np.array([], dtype=np.float64)
+        clause, params, _ = where
+        col = SQL_COLUMNS[column]
+        result = self._connection().execute(
+            f"SELECT {col}, AVG(value) FROM obs WHERE {clause} AND {col} IS NOT NULL "
+            f"GROUP BY {col} ORDER BY {col}", params).fetchall()
+        labels = [self._labels[column][code] for code, _ in result]
+        return labels, np.array([np.nan if m is None else m for _, m in result], dtype=np.float64)
+
+    def trend(self, countries, topic=None, by=None, **filters):
+        """Same result as trends.trend_matrix on the matching rows, aggregated in SQL."""
+        # Like trend_matrix, no rows still means one (empty) series without `by`
+        empty = [None] if by is None else []
+        none = np.array([], dtype=np.int64), empty, np.empty((0, len(empty)))
+        where = self._where(countries, topic, **filters)
+        if where is None:
+            return none
+        clause, params, codes = where
+        series = SQL_COLUMNS[by] if by is not None else "0"
+        # A constant in GROUP BY would be read as a column number
+        extra, group = (f" AND {series} IS NOT NULL", f", {series}") if by is not None else ("", "")
+        groups = pd.DataFrame(self._connection().execute(
+            f"SELECT year, {series}, country, SUM(value), COUNT(value), MIN(rowid) FROM obs "
+            f"WHERE {clause} AND value IS NOT NULL{extra} GROUP BY year{group}, country", params).fetchall(),
+            columns=["year", "series", "country", "sum", "count", "first"])
+        if groups.empty:
+            return none
+
+        # Series in order of first appearance among the rows ordered by `countries`
+        rank = {code: i for i, code in enumerate(codes)}
+        groups["rank"] = groups["country"].map(rank)
+        order = groups.sort_values(["rank", "first"]).drop_duplicates("series")["series"].tolist()
+        position = {code: i for i, code in enumerate(order)}
+
+        years = np.unique(groups["year"].to_numpy())
+        yi = np.searchsorted(years, groups["year"].to_numpy())
+        si = groups["series"].map(position).to_numpy()
+        sums = np.zeros((len(years), len(order)))
+        counts = np.zeros((len(years), len(order)))
+        np.add.at(sums, (yi, si), groups["sum"].to_numpy(dtype=np.float64))
+        np.add.at(counts, (yi, si), groups["count"].to_numpy(dtype=np.float64))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            matrix = np.where(counts > 0, sums / counts, np.nan)
+        labels = [self._labels[by][code] for code in order] if by is not None else [None]
+        return years, labels, matrix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--memory-mb", type=int, default=DEFAULT_MEMORY_MB)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    built = ensure_sqlite(args.data_dir, args.memory_mb)
+    print(f"{built} ready in {time.perf_counter() - started:.1f}s "
+          f"({os.path.getsize(built) / 1e6:.1f} MB)")
@@ -0,0 +1,216 @@
+"""
+Boot-time report: how long the app takes to import, load and answer.
+
+app.py times its own boot with a BootTimer (imports, app setup, dataset
+load, first request) and serves it on /metrics as dash_startup_seconds,
+along with the per-source load report (rows, parse time, status).
+Run as a script, this module boots the app in a fresh interpreter under
+`python -X importtime`, requests the page and its layout, and prints the
+phases plus the import cost of every module app.py imports:
+
+    python startup.py [--lazy] [--runs 3] [--json boot.json]
+                      [--baseline boot.json --max-regression 0.25]
+
+With --baseline it exits non-zero when the time to the first response or
+to a loaded dataset grew by more than --max-regression (and --min-delta-ms).
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BootTimer:
+    """Seconds spent in each startup phase, counted from the timer's creation."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.first_request_s = None
+        self.source_report = []
+        self._last = self.started
+        self._lock = threading.Lock()
+
+    def mark(self, phase):
+        """Record the time since the previous mark as `phase`."""
+        now = time.perf_counter()
+        with self._lock:
+            self.phases[phase] = now - self._last
+            self._last = now
+
+    def record(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = seconds
+
+    def sources(self, report):
+        """Keep the per-source load report (utils.read_sources) of the loaded dataset."""
+        with self._lock:
+            self.source_report = list(report or [])
+
+    def first_request(self):
+        if self.first_request_s is not None:
+            return
+        with self._lock:
+            if self.first_request_s is not None:
+                return
+            self.first_request_s = time.perf_counter() - self.started
+        logger.info("Boot: %s", self.summary())
+
+    def report(self):
+        with self._lock:
+            return {"phases": dict(self.phases), "first_request_s": self.first_request_s,
+                    "sources": list(self.source_report)}
+
+    def summary(self):
+        report = self.report()
+        parts = [f"{phase} {seconds:.2f}s" for phase, seconds in report["phases"].items()]
+        if report["first_request_s"] is not None:
+            parts.append(f"first request at {report['first_request_s']:.2f}s")
+        return ", ".join(parts)
+
+    def render(self):
+        report = self.report()
+        lines = ["# HELP dash_startup_seconds Time spent in each startup phase.",
+                 "# TYPE dash_startup_seconds gauge"]
+        lines += [f'dash_startup_seconds{{phase="{phase}"}} {seconds:.6f}'
+                  for phase, seconds in report["phases"].items()]
+        if report["first_request_s"] is not None:
+            lines += ["# HELP dash_first_request_seconds Time from startup to the first request.",
+                      "# TYPE dash_first_request_seconds gauge",
+                      f"dash_first_request_seconds {report['first_request_s']:.6f}"]
+        if report["sources"]:
+            lines += ["# HELP dash_source_rows Rows loaded from each data source.",
+                      "# TYPE dash_source_rows gauge"]
+            lines += [f'dash_source_rows{{source="{s["file"]}",status="{s["status"]}"}} {s["rows"]}'
+                      for s in report["sources"]]
+            parsed = [s for s in report["sources"] if s["seconds"] is not None]
+            if parsed:
+                lines += ["# HELP dash_source_load_seconds Time spent parsing each data source.",
+                          "# TYPE dash_source_load_seconds gauge"]
+                lines += [f'dash_source_load_seconds{{source="{s["file"]}"}} {s["seconds"]:.6f}' for s in parsed]
+        return "\n".join(lines) + "\n"
+
+
+# === Measurement in a fresh interpreter ===
+
+_CHILD = """
+import json, time
+started = time.perf_counter()
+import app
+app.create_app()
+client = app.app.server.test_client()
+client.get("/")
+client.get("/_dash-layout")
+first_response_s = time.perf_counter() - started
+while app.store.peek() is None:
+    time.sleep(0.005)
+print(json.dumps({"boot": app.boot.report(), "first_response_s": first_response_s,
+                  "dataset_ready_s": time.perf_counter() - started}))
+"""
+
+
+def parse_importtime(stderr, module="app"):
+    """
+    ({direct import of `module`: cumulative seconds}, {module imported after
+    it, i.e. deferred to startup or a request: cumulative seconds}).
+    """
+    direct, deferred, pending, seen = {}, {}, {}, False
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        try:
+            seconds = int(cumulative) / 1e6
+        except ValueError:
+            continue  # header line
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        if depth == 0:
+            if name == module and not seen:
+                direct, seen = pending, True
+            elif seen:
+                deferred[name] = seconds
+            pending = {}
+        elif depth == 1:
+            pending[name] = seconds
+    return direct, deferred
+
+
+def measure(lazy=False):
+    import subprocess
+
+    env = dict(os.environ, LAZY_START="1" if lazy else "0")
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _CHILD], cwd=here, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"App failed to start:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["imports"], result["deferred_imports"] = parse_importtime(proc.stderr)
+    return result
+
+
+def run(lazy=False, runs=3, report=print):
+    samples = [measure(lazy) for _ in range(runs)]
+    # The run with the median time to first response is reported in full
+    samples.sort(key=lambda s: s["first_response_s"])
+    result = samples[len(samples) // 2]
+    result["first_response_runs_s"] = [s["first_response_s"] for s in samples]
+    result["lazy"] = lazy
+
+    report(f"{'lazy' if lazy else 'eager'} start, median of {runs}: first response "
+           f"{result['first_response_s']:.2f}s, dataset ready {result['dataset_ready_s']:.2f}s")
+    report("  boot phases: " + ", ".join(f"{p} {s:.2f}s" for p, s in result["boot"]["phases"].items()))
+    sources = result["boot"].get("sources") or []
+    if sources:
+        report("  sources: " + ", ".join(
+            f"{s['file']} {s['status']}" + (f" {s['rows']:,} rows" if s["rows"] else "")
+            + (f" {s['seconds']:.2f}s" if s["seconds"] is not None else "") for s in sources))
+    report("  imported by app.py:")
+    for name, seconds in sorted(result["imports"].items(), key=lambda kv: -kv[1])[:10]:
+        report(f"    {name:24s} {seconds * 1000:8.1f}ms")
+    deferred = sorted(result["deferred_imports"].items(), key=lambda kv: -kv[1])[:5]
+    if deferred:
+        report("  imported later: " + ", ".join(f"{n} {s * 1000:.0f}ms" for n, s in deferred))
+    return result
+
+
+def regressions(result, baseline, max_regression=0.25, min_delta_ms=50.0):
+    """(measure, baseline seconds, current seconds) for every boot regression."""
+    found = []
+    for key in ("first_response_s", "dataset_ready_s"):
+        old, new = baseline.get(key), result.get(key)
+        if old is None or new is None:
+            continue
+        if (new - old) * 1000 > min_delta_ms and new > old * (1 + max_regression):
+            found.append((key, old, new))
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lazy", action="store_true", help="measure the LAZY_START=1 mode")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    parser.add_argument("--min-delta-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    results = run(args.lazy, args.runs)
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        slower = regressions(results, baseline, args.max_regression, args.min_delta_ms)
+        for key, old, new in slower:
+            print(f"REGRESSION {key}: {old:.2f}s -> {new:.2f}s")
+        sys.exit(1 if slower else 0)
@@ -0,0 +1,149 @@
+"""
+Synthetic LinkEED-shaped sources for benchmarking.
+
+Writes the four source CSVs with the Employment.csv schema. At scale 1 the
+vocabulary mirrors the real extract: 30 countries, the 2010/2014/2018 survey
+waves, six sectors and every indicator/category combination of the four
+topics. Larger scales multiply the countries, years and indicators (about
+the cube root of `scale` each), so the row count grows by roughly `scale`
+while every partition keeps the shape the callbacks expect.
+
+Usage:
+    python synthetic.py OUT_DIR [--scale 10] [--seed 0]
+"""
+import argparse
+import itertools
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils import SOURCE_FILES
+
+COLUMNS = ["Country", "Year", "Technology or Sector", "Topic", "Indicator",
+           "Indicator Categories", "Unit", "Value", "Number of observations", "updated_at"]
+
+COUNTRIES = ["Australia", "Belgium", "Bulgaria", "Canada", "Croatia", "Cyprus", "Czech Republic",
+             "Denmark", "Estonia", "Finland", "France", "Germany", "Greece", "Hungary", "Italy",
+             "Latvia", "Lithuania", "Luxembourg", "Malta", "Netherlands", "Norway", "Poland",
+             "Portugal", "Romania", "Slovak Republic", "Slovenia", "Spain", "Sweden",
+             "United Kingdom", "United States"]
+YEARS = [2010, 2014, 2018]
+SECTORS = ["Energy", "Non-energy", "Total", "Energy generation and distribution",
+           "Important energy consumers",
+           "Services/goods that are essential to fixed capital investment with implications "
+           "for energy supply and use"]
+
+_BREAKDOWNS = {
+    "": [None],
+    " by contract type": ["Permanent contract", "Temporary contract"],
+    " by education level": ["Less than upper secondary education", "Upper secondary education",
+                            "Tertiary education"],
+    " by firm size": ["Small", "Medium", "Large"],
+    " by occupation level": [
+        "Low level (Service and sales workers; Skilled agricultural, forestry and fishery workers; "
+        "Elementary occupations)",
+        "Middle level (Clerical support workers; Craft and related trades workers; Plant and "
+        "machine operators, and assemblers)",
+        "High level (Managers; Professionals; Technicians and associate professionals)"],
+}
+
+# Topic (source file) -> [(indicator, categories)], and the Value range of its rows
+TOPICS = {
+    "Employment.csv": ("Employment", [
+        (measure + suffix, categories)
+        for measure in ["Gender employment gap", "Gender gap in hours worked", "Gender wage gap",
+                        "Gender wage gap conditional on skills"]
+        for suffix, categories in _BREAKDOWNS.items()
+    ], (-60.0, 40.0)),
+    "innovation.csv": ("Innovation", [
+        ("Number of patents", ["All", "Energy"]),
+        ("Share of female inventors", ["All", "Energy"]),
+        ("Share of patents with female inventors", ["All", "Energy"]),
+    ], (0.0, 60.0)),
+    "Senior_Management.csv": ("Senior Management", [
+        ("Share of female senior managers", ["Women", "Men", "CEO", "Board", "1990s"]),
+        ("Share of female senior managers by role", ["Women", "Men", "CEO", "Board", "1990s"]),
+    ], (0.0, 100.0)),
+    "Entrepreneurship.csv": ("Entrepreneurship", [
+        ("Share of gender diverse founding teams", ["All"]),
+        ("Start-ups count", ["All"]),
+    ], (0.0, 40.0)),
+}
+UPDATED_AT = 1659539394367
+
+
+def split_scale(scale):
+    """(countries, years, indicators) multipliers whose product is at least `scale`."""
+    countries = math.ceil(scale ** (1 / 3) - 1e-9)
+    years = math.ceil((scale / countries) ** 0.5 - 1e-9)
+    indicators = math.ceil(scale / (countries * years) - 1e-9)
+    return countries, years, indicators
+
+
+def scaled_dimensions(scale):
+    """Countries, years and indicator-variant suffixes for `scale`."""
+    n_countries, n_years, n_variants = split_scale(scale)
+    countries = [c if k == 0 else f"{c} {k + 1}" for k in range(n_countries) for c in COUNTRIES]
+    if n_years == 1:
+        years = list(YEARS)
+    else:
+        # Fill in the yearly series, then extend it backwards
+        years = list(range(YEARS[-1] - len(YEARS) * n_years + 1, YEARS[-1] + 1))
+    variants = [""] + [f" (series {k + 1})" for k in range(1, n_variants)]
+    return countries, years, variants
+
+
+def _grid(topic, indicators, years, variants):
+    """One country's rows (without Country/Value) as column arrays."""
+    combos = [(name + variant, category) for variant in variants
+              for name, categories in indicators for category in categories]
+    rows = list(itertools.product(years, SECTORS, combos))
+    return {
+        "Year": np.array([r[0] for r in rows], dtype=np.int16),
+        "Technology or Sector": [r[1] for r in rows],
+        "Topic": topic,
+        "Indicator": [r[2][0] for r in rows],
+        "Indicator Categories": [r[2][1] for r in rows],
+        "Unit": "Percent",
+    }
+
+
+def generate(out_dir, scale=1, seed=0):
+    """
+    Write the synthetic sources for `scale` to `out_dir`, one country block
+    at a time so memory stays flat at any scale. Returns {filename: rows}.
+    """
+    rng = np.random.default_rng(seed)
+    countries, years, variants = scaled_dimensions(scale)
+    os.makedirs(out_dir, exist_ok=True)
+    written = {}
+    for filename in SOURCE_FILES:
+        topic, indicators, (low, high) = TOPICS[filename]
+        block = _grid(topic, indicators, years, variants)
+        n = len(block["Year"])
+        path = os.path.join(out_dir, filename)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", newline="", encoding="utf-8") as fh:
+            for i, country in enumerate(countries):
+                frame = pd.DataFrame(block)
+                frame.insert(0, "Country", country)
+                frame["Value"] = rng.uniform(low, high, n)
+                frame["Number of observations"] = rng.integers(20, 20_000, n)
+                frame["updated_at"] = UPDATED_AT
+                frame[COLUMNS].to_csv(fh, header=i == 0, index=False)
+        os.replace(tmp, path)
+        written[filename] = n * len(countries)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    counts = generate(args.out_dir, args.scale, args.seed)
+    print(f"{sum(counts.values()):,} rows (countries x years x indicators = "
+          f"{' x '.join(map(str, split_scale(args.scale)))}) written to {args.out_dir}")
@@ -0,0 +1,43 @@
+import shutil
+
+import pytest
+
+import synthetic
+from utils import SOURCE_FILES
+
+
+@pytest.fixture(scope="session")
+def sources(tmp_path_factory):
+    """Directory with the four synthetic sources at scale 1 (shared, do not modify)."""
+    directory = tmp_path_factory.mktemp("sources")
+    synthetic.generate(str(directory), scale=1, seed=0)
+    return directory
+
+
+@pytest.fixture
+def data_dir(tmp_path, sources):
+    """Private copy of the synthetic sources that a test may change."""
+    for name in SOURCE_FILES:
+        shutil.copy(sources / name, tmp_path / name)
+    return tmp_path
+
+
+@pytest.fixture(scope="session")
+def dataset(sources):
+    from dataset import load_dataset
+
+    return load_dataset(str(sources))
+
+
+@pytest.fixture
+def store(dataset, sources):
+    from reloader import DatasetStore
+
+    return DatasetStore(dataset, base=str(sources))
+
+
+@pytest.fixture(scope="session")
+def sqlite_dataset(sources, dataset):
+    from sqlstore import SQLiteDataset, ensure_sqlite
+
+    return SQLiteDataset(ensure_sqlite(str(sources)))
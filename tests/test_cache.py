@@ -0,0 +1,106 @@
+import threading
+import time
+
+from cache import DiskBackend, FigureCache
+
+
+def test_key_covers_name_args_kwargs_and_version():
+    version = ["v1"]
+    cache = FigureCache(version=lambda: version[0])
+    key = cache.make_key("f", [1, "a"], {"x": 2})
+    assert key == cache.make_key("f", [1, "a"], {"x": 2})
+    assert key != cache.make_key("g", [1, "a"], {"x": 2})
+    assert key != cache.make_key("f", [1, "b"], {"x": 2})
+    assert key != cache.make_key("f", [1, "a"], {"x": 3})
+    version[0] = "v2"
+    assert key != cache.make_key("f", [1, "a"], {"x": 2})
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = FigureCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == (True, 1)
+    cache.set("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_memoize_reuses_results_until_the_version_changes():
+    version, calls = ["v1"], []
+    cache = FigureCache(version=lambda: version[0])
+
+    @cache.memoize
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    assert square(3) == 9
+    assert square(3) == 9
+    assert calls == [3]
+    version[0] = "v2"
+    assert square(3) == 9
+    assert calls == [3, 3]
+
+
+def test_concurrent_misses_compute_once():
+    cache, calls, started = FigureCache(), [], threading.Event()
+
+    @cache.memoize
+    def slow(x):
+        calls.append(x)
+        started.set()
+        time.sleep(0.2)
+        return x + 1
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(slow(1)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(slow(1))) for _ in range(4)]
+    for t in followers:
+        t.start()
+    for t in [leader] + followers:
+        t.join()
+    assert calls == [1]
+    assert results == [2] * 5
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_failed_computation_is_not_cached():
+    cache, calls = FigureCache(), []
+
+    @cache.memoize
+    def flaky(x):
+        calls.append(x)
+        if len(calls) == 1:
+            raise ValueError("first call fails")
+        return x
+
+    try:
+        flaky(1)
+    except ValueError:
+        pass
+    assert flaky(1) == 1
+    assert calls == [1, 1]
+
+
+def test_clear_drops_local_and_backend_entries(tmp_path):
+    backend = DiskBackend(str(tmp_path))
+    cache = FigureCache(backend=backend)
+    cache.set("a", {"x": 1})
+    assert FigureCache(backend=backend).get("a") == (True, {"x": 1})
+    cache.clear()
+    assert cache.get("a") == (False, None)
+    assert backend.get("a") is None
+
+
+def test_shed_drops_cheapest_entries_first():
+    cache = FigureCache()
+    cache.set("cheap", list(range(1000)), cost=0.01)
+    cache.set("dear", list(range(1000)), cost=5.0)
+    assert cache.shed(1) > 0
+    assert cache.get("cheap") == (False, None)
+    assert cache.get("dear")[0]
@@ -0,0 +1,71 @@
+import io
+
+import dash
+import pandas as pd
+import pytest
+
+from downloads import EXPORT_COLUMNS, RETRY_AFTER_S, Downloads
+
+QUERY = "country=France&compare=Spain&topic=Employment&start=2010&end=2014"
+
+
+@pytest.fixture
+def downloads(store):
+    return Downloads(store, max_concurrent=1, chunk_rows=100)
+
+
+@pytest.fixture
+def client(downloads):
+    app = dash.Dash(__name__)
+    app.layout = dash.html.Div()
+    downloads.attach(app)
+    return app.server.test_client()
+
+
+def expected_rows(store):
+    rows = store.current().select(["France", "Spain"], "Employment", year_range=(2010, 2014))
+    return rows[EXPORT_COLUMNS].reset_index(drop=True)
+
+
+def test_csv_has_the_selected_rows(client, store):
+    response = client.get(f"/download/explorer.csv?{QUERY}")
+    assert response.status_code == 200
+    assert "explorer-france-spain-employment-2010-2014.csv" in response.headers["Content-Disposition"]
+    frame = pd.read_csv(io.BytesIO(response.get_data()))
+    expected = expected_rows(store)
+    assert len(frame) == len(expected) > 100
+    assert list(frame.columns) == EXPORT_COLUMNS
+    assert sorted(frame["Country"].unique()) == ["France", "Spain"]
+    assert frame["Value"].sum() == pytest.approx(expected["Value"].astype(float).sum())
+
+
+def test_parquet_round_trips(client, store):
+    response = client.get(f"/download/explorer.parquet?{QUERY}")
+    assert response.status_code == 200
+    frame = pd.read_parquet(io.BytesIO(response.get_data()))
+    assert len(frame) == len(expected_rows(store))
+
+
+def test_over_the_limit_is_answered_429_until_a_download_finishes(client, downloads):
+    streaming = client.get(f"/download/explorer.csv?{QUERY}", buffered=False)
+    assert streaming.status_code == 200
+    assert downloads.in_flight == 1
+
+    rejected = client.get(f"/download/explorer.csv?{QUERY}")
+    assert rejected.status_code == 429
+    assert rejected.headers["Retry-After"] == str(RETRY_AFTER_S)
+    assert downloads.counts["rejected"] == 1
+
+    streaming.close()
+    assert downloads.in_flight == 0
+    assert client.get(f"/download/explorer.csv?{QUERY}").status_code == 200
+
+
+@pytest.mark.parametrize("url,status", [
+    ("/download/explorer.xlsx?country=France", 404),
+    ("/download/explorer.csv?topic=Employment", 400),
+    ("/download/explorer.csv?country=France&start=x&end=2014", 400),
+])
+def test_bad_requests(client, downloads, url, status):
+    assert client.get(url).status_code == status
+    assert downloads.in_flight == 0
@@ -0,0 +1,17 @@
+import shutil
+
+import pytest
+
+import export
+
+
+@pytest.mark.parametrize("name", ["app", "dataset", "trends", "indicators", "rollup", "sqlstore"])
+def test_render_version_follows_the_code_behind_the_numbers(name, tmp_path, monkeypatch):
+    module = __import__(name)
+    before = export.render_version()
+    changed = tmp_path / f"{name}.py"
+    shutil.copy(module.__file__, changed)
+    with open(changed, "a") as fh:
+        fh.write("\n# changed\n")
+    monkeypatch.setattr(module, "__file__", str(changed))
+    assert export.render_version() != before
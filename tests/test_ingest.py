@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import ingest
+from indicators import family_flags
+from rollup import KpiRollup, kpi_partials
+from utils import CATEGORY_COLUMNS, SOURCE_FILES, cache_paths, load_combined_data, load_kpi_partials
+
+EXTRACT_ROWS = 2_500
+
+
+@pytest.fixture
+def extract(data_dir):
+    """The synthetic sources cut down to their first EXTRACT_ROWS rows."""
+    for name in SOURCE_FILES:
+        path = data_dir / name
+        pd.read_csv(path, nrows=EXTRACT_ROWS).to_csv(path, index=False)
+    return str(data_dir)
+
+
+def comparable(frame):
+    return frame.astype({c: str for c in CATEGORY_COLUMNS}).reset_index(drop=True)
+
+
+def test_stream_ingest_matches_the_in_memory_load(extract, monkeypatch):
+    # Several chunks per source, so the chunk boundaries are exercised
+    monkeypatch.setattr(ingest, "PROBE_ROWS", 400)
+    monkeypatch.setattr(ingest, "MIN_CHUNK_ROWS", 300)
+    in_memory = load_combined_data(extract, use_cache=False)
+
+    report = ingest.stream_ingest(extract, memory_limit_mb=0.01)
+    assert report["chunks"] > 2 * len(SOURCE_FILES)
+    assert report["rows"] == len(in_memory)
+    assert report["skipped"] == {}
+    version = in_memory.attrs["version"]
+    assert report["version"] == version
+    streamed = pd.read_parquet(cache_paths(extract, version)[0], engine="pyarrow")
+
+    assert list(streamed.columns) == list(in_memory.columns)
+    assert streamed.dtypes.to_dict() == in_memory.dtypes.to_dict()
+    pd.testing.assert_frame_equal(comparable(streamed), comparable(in_memory))
+
+    frame = in_memory.assign(family=family_flags(in_memory["Indicator"]))
+    expected, actual = KpiRollup(kpi_partials(frame)), KpiRollup(load_kpi_partials(extract, version))
+    pd.testing.assert_frame_equal(actual.partials, expected.partials, check_dtype=False)
+    np.testing.assert_allclose(actual.cum_sums, expected.cum_sums)
+    np.testing.assert_array_equal(actual.cum_counts, expected.cum_counts)
+    countries = expected.countries
+    for years in ((2010, 2018), (2000, 2030)):
+        means, streamed_means = expected.means(countries, years), actual.means(countries, years)
+        for name in means:
+            np.testing.assert_allclose(streamed_means[name], means[name], equal_nan=True)
+
+
+def test_streaming_load_is_the_ingested_store(extract):
+    streamed = load_combined_data(extract, streaming=True, memory_limit_mb=1)
+    in_memory = load_combined_data(extract, use_cache=False)
+    pd.testing.assert_frame_equal(comparable(streamed), comparable(in_memory))
@@ -0,0 +1,23 @@
+import app
+from dataset import Dataset
+from reloader import DatasetStore
+
+
+def test_advanced_insights_are_built_once_per_version(dataset, sources, monkeypatch):
+    store = DatasetStore(dataset, base=str(sources))
+    builds = []
+    build = app.build_advanced_insights
+    monkeypatch.setattr(app, "store", store)
+    monkeypatch.setattr(app, "_insights_store", {})
+    monkeypatch.setattr(app, "build_advanced_insights", lambda data: builds.append(data.version) or build(data))
+
+    first = app.advanced_insights()
+    assert len(first) == 4
+    assert app.advanced_insights() is first
+    assert builds == [dataset.version]
+
+    store.install(Dataset.prepared(dataset.df, "next", dataset.kpis.partials, dataset.availability))
+    assert app.advanced_insights() is not first
+    assert app.advanced_insights() is app.advanced_insights()
+    assert builds == [dataset.version, "next"]
+    assert list(app._insights_store) == ["next"]
@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+
+import pytest
+
+diskcache = pytest.importorskip("diskcache")
+multiprocess = pytest.importorskip("multiprocess")
+
+from jobs import SLOT_KEY, SingleFlightManager, acquire_slot, fork_safe, release_slot  # noqa: E402
+
+
+@pytest.fixture
+def handle(tmp_path):
+    cache = fork_safe(diskcache.Cache(str(tmp_path / "jobs")))
+    yield cache
+    cache.close()
+
+
+def _slot_job(handle, workers, hold):
+    slot = acquire_slot(handle, workers, wait=60)
+    assert slot is not None
+    try:
+        with handle.transact(retry=True):
+            running = handle.incr("running", retry=True)
+            handle.set("peak", max(running, handle.get("peak", 0)), retry=True)
+        time.sleep(hold)
+        handle.decr("running", retry=True)
+    finally:
+        release_slot(handle, slot)
+    handle.incr("done", retry=True)
+
+
+def test_slot_pool_bounds_jobs_across_processes(handle):
+    workers, jobs = 2, 8
+    stop = threading.Event()
+
+    def busy():
+        # Other server threads keep writing while jobs are forked
+        while not stop.is_set():
+            with handle.transact(retry=True):
+                handle.incr("busy", retry=True)
+
+    thread = threading.Thread(target=busy)
+    thread.start()
+    processes = [multiprocess.Process(target=_slot_job, args=(handle, workers, 0.2)) for _ in range(jobs)]
+    try:
+        for process in processes:
+            process.start()
+        deadline = time.monotonic() + 60
+        for process in processes:
+            process.join(max(deadline - time.monotonic(), 0))
+    finally:
+        stop.set()
+        thread.join()
+        for process in processes:
+            if process.is_alive():
+                # A job that can never write hangs; fail instead
+                process.kill()
+    assert [p.exitcode for p in processes] == [0] * jobs
+    assert handle.get("done") == jobs
+    assert handle.get("peak") <= workers
+    assert all(handle.get(SLOT_KEY.format(i)) is None for i in range(workers))
+
+
+def test_slot_of_a_dead_job_is_reclaimed(handle):
+    process = multiprocess.Process(target=time.sleep, args=(0,))
+    process.start()
+    process.join()
+    handle.set(SLOT_KEY.format(0), process.pid)
+    slot = acquire_slot(handle, 1, wait=5)
+    assert slot == SLOT_KEY.format(0)
+    release_slot(handle, slot)
+
+
+def test_acquire_slot_gives_up_after_wait(handle):
+    # Owned by this (live) process
+    assert acquire_slot(handle, 1) == SLOT_KEY.format(0)
+    assert acquire_slot(handle, 1, wait=0.1) is None
+
+
+# === Background callbacks ===
+
+@pytest.fixture
+def background_app(handle):
+    dash = pytest.importorskip("dash")
+    from dash import Input, Output, dcc, html
+
+    manager = SingleFlightManager(handle, workers=1, version=lambda: "v1")
+    app = dash.Dash(__name__, background_callback_manager=manager)
+    app.layout = html.Div([dcc.Input(id="x"), html.Div(id="y")])
+
+    @app.callback(Output("y", "children"), Input("x", "value"), background=True)
+    def slow(value):
+        time.sleep(0.3)
+        return f"got {value}"
+
+    return app
+
+
+def _request(value):
+    return {"output": "y.children", "outputs": {"id": "y", "property": "children"},
+            "inputs": [{"id": "x", "property": "value", "value": value}], "state": [],
+            "changedPropIds": ["x.value"]}
+
+
+def _start(client, value):
+    response = client.post("/_dash-update-component", json=_request(value))
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def _poll(client, value, job, timeout=60):
+    query = f"?cacheKey={job['cacheKey']}&job={job['job']}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = client.post("/_dash-update-component" + query, json=_request(value))
+        if response.status_code == 200 and b'"response"' in response.data:
+            return json.loads(response.data)["response"]["y"]["children"]
+        # 204: the job was lost
+        assert response.status_code == 200
+        time.sleep(0.05)
+    pytest.fail(f"background job for {value!r} did not finish")
+
+
+def test_more_background_jobs_than_slots_all_finish(background_app):
+    client = background_app.server.test_client()
+    jobs = {value: _start(client, value) for value in ("a", "b", "c", "d")}
+    for value, job in jobs.items():
+        assert _poll(client, value, job) == f"got {value}"
+
+
+def test_identical_requests_share_one_job(background_app):
+    client = background_app.server.test_client()
+    first, second = _start(client, "same"), _start(client, "same")
+    assert first["job"] == second["job"]
+    assert _poll(client, "same", first) == "got same"
+    assert _poll(client, "same", second) == "got same"
@@ -0,0 +1,40 @@
+import memory
+from memory import MB, MemoryBudget
+
+
+def test_stuck_over_budget_waits_for_the_rss_to_change(monkeypatch):
+    rss = [150 * MB]
+    monkeypatch.setattr(memory, "rss_bytes", lambda: rss[0])
+    monkeypatch.setattr(memory, "release_memory", lambda: None)
+    evictions = []
+    budget = MemoryBudget(budget_mb=100)
+    budget.track("figures", lambda: 0, evict=evictions.append)
+
+    assert budget.check()
+    assert budget.over_budget and len(evictions) == 1
+    # Nothing left to free: later checks at about the same RSS do nothing
+    rss[0] += 2 * MB
+    assert not budget.check()
+    assert not budget.check()
+    assert len(evictions) == 1
+    # The caches grew back: worth another pass
+    rss[0] += 10 * MB
+    assert budget.check()
+    assert len(evictions) == 2
+
+
+def test_back_under_budget_resets(monkeypatch):
+    rss = [150 * MB]
+    monkeypatch.setattr(memory, "rss_bytes", lambda: rss[0])
+    monkeypatch.setattr(memory, "release_memory", lambda: None)
+    evictions = []
+    budget = MemoryBudget(budget_mb=100)
+    budget.track("figures", lambda: 0, evict=evictions.append)
+
+    assert budget.check()
+    rss[0] = 80 * MB
+    assert not budget.check()
+    assert not budget.over_budget
+    rss[0] = 151 * MB
+    assert budget.check()
+    assert len(evictions) == 2
@@ -0,0 +1,33 @@
+import tracemalloc
+
+from metrics import CallbackMetrics
+
+
+def test_tracemalloc_only_traces_profiled_requests(tmp_path):
+    metrics = CallbackMetrics(profile_dir=str(tmp_path), slow_ms=0)
+    tracing = []
+    dispatch = metrics._wrap(lambda: tracing.append(tracemalloc.is_tracing()) or "{}", "graph.figure")
+
+    assert not tracemalloc.is_tracing()
+    dispatch()
+    assert tracing == [True]
+    assert not tracemalloc.is_tracing()
+    assert {path.suffix for path in tmp_path.iterdir()} == {".prof", ".tracemalloc"}
+
+
+def test_unsampled_requests_are_not_traced(tmp_path):
+    metrics = CallbackMetrics(profile_dir=str(tmp_path), slow_ms=0, sample_rate=0)
+    tracing = []
+    metrics._wrap(lambda: tracing.append(tracemalloc.is_tracing()) or "{}", "graph.figure")()
+    assert tracing == [False]
+    assert not list(tmp_path.iterdir())
+
+
+def test_tracing_started_elsewhere_is_left_on(tmp_path):
+    metrics = CallbackMetrics(profile_dir=str(tmp_path), slow_ms=0)
+    tracemalloc.start()
+    try:
+        metrics._wrap(lambda: "{}", "graph.figure")()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
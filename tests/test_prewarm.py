@@ -0,0 +1,67 @@
+import threading
+
+import dash
+import pytest
+
+from prewarm import Warmer
+from reloader import DatasetStore
+
+
+@pytest.fixture
+def gate():
+    gate = threading.Event()
+    yield gate
+    gate.set()
+
+
+def make_client(store, gate, **options):
+    warmed = []
+
+    def page(data):
+        assert gate.wait(10)
+        warmed.append((None, data.version))
+
+    def tab(data, country):
+        warmed.append((country, data.version))
+
+    warmer = Warmer(store, page, {"employment": tab}, {"employment-country": "employment"},
+                    countries=["France"], **options)
+    app = dash.Dash(__name__)
+    app.layout = dash.html.Div()
+    warmer.attach(app)
+    return warmer, warmed, app.server.test_client()
+
+
+def test_ready_waits_for_the_first_warm_up(dataset, sources, gate):
+    store = DatasetStore(None, base=str(sources), loader=lambda: dataset)
+    finished = threading.Event()
+    warmer, warmed, client = make_client(store, gate, on_ready=lambda seconds: finished.set())
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.get_json()["status"] == "loading"
+
+    warmer.start(store.current())
+    response = client.get("/ready")
+    assert response.status_code == 503
+    body = response.get_json()
+    assert body["status"] == "warming" and body["version"] == dataset.version
+    assert body["warm_up"]["total"] == 2
+
+    gate.set()
+    assert finished.wait(10)
+    response = client.get("/ready")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["status"] == "ready"
+    assert body["warm_up"]["done"] == 2 and body["warm_up"]["seconds"] is not None
+    assert sorted(warmed, key=str) == sorted([(None, dataset.version), ("France", dataset.version)], key=str)
+
+
+def test_ready_without_warming_only_waits_for_the_data(dataset, sources, gate):
+    store = DatasetStore(None, base=str(sources), loader=lambda: dataset)
+    warmer, warmed, client = make_client(store, gate, enabled=False)
+    assert client.get("/ready").status_code == 503
+    warmer.start(store.current())
+    assert client.get("/ready").status_code == 200
+    assert warmed == []
@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset import MERGE_KEY, load_dataset
+from reloader import DatasetStore
+from synthetic import UPDATED_AT
+from utils import load_layout_meta, source_fingerprint, source_paths
+
+
+@pytest.fixture
+def store(data_dir):
+    base = str(data_dir)
+    return DatasetStore(load_dataset(base), base=base, loader=lambda: load_dataset(base))
+
+
+def edit(data_dir, filename, change):
+    """Rewrite a source with `change(frame)`, making sure its stamp changes."""
+    path = data_dir / filename
+    frame = change(pd.read_csv(path))
+    frame.to_csv(path, index=False)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def comparable(df):
+    columns = MERGE_KEY + ["Value", "Number of observations", "updated_at"]
+    frame = df[columns].astype({c: str for c in MERGE_KEY})
+    return frame.sort_values(MERGE_KEY, kind="stable").reset_index(drop=True)
+
+
+def assert_same_data(merged, fresh):
+    assert merged.version == fresh.version
+    pd.testing.assert_frame_equal(comparable(merged.df), comparable(fresh.df), check_dtype=False)
+    assert merged.countries == fresh.countries
+    assert merged.availability == fresh.availability
+    for countries in (["France"], ["Atlantis", "Spain"], fresh.countries):
+        expected, actual = fresh.kpis.means(countries, (2010, 2018)), merged.kpis.means(countries, (2010, 2018))
+        for name in expected:
+            np.testing.assert_allclose(actual[name], expected[name], rtol=1e-6, equal_nan=True)
+
+
+def upsert(frame):
+    changed = frame.index[frame["Country"] == "France"][:50]
+    frame.loc[changed, "Value"] += 1.5
+    frame.loc[changed, "updated_at"] = UPDATED_AT + 1000
+    added = frame[frame["Country"] == "Spain"].head(20).assign(Country="Atlantis", updated_at=UPDATED_AT + 1000)
+    return pd.concat([frame, added], ignore_index=True)
+
+
+def test_unchanged_sources_are_not_reloaded(store):
+    assert not store.check()
+
+
+def test_merge_upserts_and_matches_a_full_reload(store, data_dir):
+    before = store.current()
+    edit(data_dir, "Employment.csv", upsert)
+    assert store.check()
+    merged = store.current()
+    assert merged is not before
+    assert len(merged) == len(before) + 20
+    assert "Atlantis" in merged.countries
+    france = merged.select(["France"], "Employment")
+    assert (france["updated_at"] > pd.Timestamp(UPDATED_AT, unit="ms", tz="UTC")).sum() == 50
+    assert_same_data(merged, load_dataset(str(data_dir)))
+
+
+def test_reload_saves_the_layout_options(store, data_dir):
+    edit(data_dir, "Employment.csv", upsert)
+    assert store.check()
+    meta = load_layout_meta(str(data_dir))
+    assert meta is not None
+    assert meta["version"] == store.current().version == source_fingerprint(source_paths(str(data_dir)))
+    assert "Atlantis" in meta["countries"]
+
+
+def test_removed_rows_trigger_a_full_reload(store, data_dir):
+    before = store.current()
+    edit(data_dir, "innovation.csv", lambda frame: frame[frame["Country"] != "France"])
+    assert store.check()
+    reloaded = store.current()
+    assert len(reloaded) < len(before)
+    assert "Innovation" not in reloaded.availability["indicators"]["France"]
+    assert_same_data(reloaded, load_dataset(str(data_dir)))
+
+
+def test_removed_source_triggers_a_full_reload(store, data_dir):
+    os.remove(data_dir / "Entrepreneurship.csv")
+    assert store.check()
+    assert "Entrepreneurship" not in store.current().topics
+
+
+def test_rows_without_timestamp_are_merged(store, data_dir):
+    def restamp(frame):
+        frame["updated_at"] = frame["updated_at"].astype("Int64")
+        rows = frame.index[frame["Country"] == "Germany"][:10]
+        frame.loc[rows, "Value"] = 99.0
+        frame.loc[rows, "updated_at"] = pd.NA
+        return frame
+
+    edit(data_dir, "Employment.csv", restamp)
+    assert store.check()
+    assert (store.current().select(["Germany"], "Employment")["Value"] == 99.0).sum() == 10
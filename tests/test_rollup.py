@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import in_family
+from rollup import KPI_MEASURES, KpiRollup
+
+
+def direct_means(frame, countries, year_range):
+    """The KPI means filtered straight from the rows."""
+    rows = frame[frame["Country"].isin(countries).to_numpy()
+                 & frame["Year"].between(*year_range).to_numpy()]
+    means = {}
+    for name, (topic, family, category) in KPI_MEASURES.items():
+        mask = np.ones(len(rows), dtype=bool)
+        if topic is not None:
+            mask &= (rows["Topic"] == topic).to_numpy()
+        if family is not None:
+            mask &= in_family(rows, family)
+        if category is not None:
+            mask &= (rows["Indicator Categories"].str.lower() == category).fillna(False).to_numpy(dtype=bool)
+        values = rows.loc[mask, "Value"].astype(np.float64)
+        means[name] = values.mean() if len(values) else np.nan
+    return means
+
+
+def assert_means_equal(actual, expected):
+    assert actual.keys() == expected.keys()
+    for name in expected:
+        np.testing.assert_allclose(actual[name], expected[name], rtol=1e-9, equal_nan=True, err_msg=name)
+
+
+@pytest.mark.parametrize("countries,year_range", [
+    (["France"], (2010, 2018)),
+    (["France", "Germany", "Spain"], (2014, 2018)),
+    (["Norway"], (2011, 2013)),
+    (["Greece", "Italy"], (2000, 2010)),
+    (["Atlantis"], (2010, 2018)),
+    ([], (2010, 2018)),
+])
+def test_means_match_direct_filtering(dataset, countries, year_range):
+    assert_means_equal(dataset.kpis.means(countries, year_range),
+                       direct_means(dataset.df, countries, year_range))
+
+
+def test_every_country_and_range(dataset):
+    rollup = KpiRollup.from_frame(dataset.df)
+    countries = dataset.countries[::4]
+    for lo in dataset.years:
+        for hi in dataset.years:
+            assert_means_equal(rollup.means(countries, (lo, hi)),
+                               direct_means(dataset.df, countries, (lo, hi)))
+
+
+def test_updated_matches_rebuild(dataset):
+    df = dataset.df
+    removed = df[(df["Country"] == "France").to_numpy()]
+    added = removed.assign(Value=removed["Value"] * 2)
+    rest = df[(df["Country"] != "France").to_numpy()]
+    updated = KpiRollup.from_frame(df).updated(removed, added)
+    rebuilt = KpiRollup.from_frame(pd.concat([rest, added]))
+    for countries in (["France"], ["France", "Germany"], ["Germany"]):
+        assert_means_equal(updated.means(countries, (2010, 2018)), rebuilt.means(countries, (2010, 2018)))
+
+
+def test_updated_with_nothing_removed(dataset):
+    df = dataset.df
+    added = df[(df["Country"] == "Spain").to_numpy()].assign(Country="Atlantis")
+    updated = KpiRollup.from_frame(df).updated(df.iloc[0:0], added)
+    rebuilt = KpiRollup.from_frame(pd.concat([df, added]))
+    assert_means_equal(updated.means(["Atlantis"], (2010, 2018)), rebuilt.means(["Atlantis"], (2010, 2018)))
@@ -0,0 +1,57 @@
+import os
+import threading
+
+import pandas as pd
+
+import shared
+from reloader import DatasetStore
+from synthetic import UPDATED_AT
+from utils import source_fingerprint, source_paths
+
+
+def test_concurrent_builds_write_the_file_once(data_dir, monkeypatch):
+    base, built = str(data_dir), []
+    materialize = shared.materialize
+
+    def counted(dataset, path):
+        built.append(path)
+        return materialize(dataset, path)
+
+    monkeypatch.setattr(shared, "materialize", counted)
+    barrier, paths = threading.Barrier(4), []
+
+    def build():
+        barrier.wait()
+        paths.append(shared.ensure_shared(base))
+
+    threads = [threading.Thread(target=build) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1
+    assert set(paths) == set(built)
+
+
+def test_store_without_merge_maps_the_new_shared_file(data_dir):
+    base = str(data_dir)
+
+    def load():
+        return shared.open_shared(shared.ensure_shared(base))
+
+    store = DatasetStore(None, base=base, loader=load, merge=False)
+    before = store.current()
+    path = data_dir / "Employment.csv"
+    frame = pd.read_csv(path)
+    frame.loc[frame["Country"] == "France", "updated_at"] = UPDATED_AT + 1000
+    frame.to_csv(path, index=False)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert store.check()
+    after = store.current()
+    version = source_fingerprint(source_paths(base))
+    assert after.version == version != before.version
+    assert os.path.exists(shared.shared_path(base, version))
+    newer = after.df["updated_at"] > before.df["updated_at"].max()
+    assert newer.sum() == (frame["Country"] == "France").sum()
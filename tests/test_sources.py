@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+
+from utils import SOURCE_FILES, load_combined_data, read_sources, source_paths
+
+
+def statuses(combined):
+    return {entry["file"]: entry["status"] for entry in combined.attrs["sources"]}
+
+
+def entry(combined, name):
+    return next(e for e in combined.attrs["sources"] if e["file"] == name)
+
+
+def test_every_source_read_then_cached(data_dir):
+    base = str(data_dir)
+    parsed = load_combined_data(base)
+    assert set(statuses(parsed).values()) == {"ok"}
+    cached = load_combined_data(base)
+    assert set(statuses(cached).values()) == {"cached"}
+    for name in SOURCE_FILES:
+        assert entry(cached, name)["rows"] == entry(parsed, name)["rows"] > 0
+
+
+def test_missing_source_is_reported_and_skipped(data_dir):
+    base = str(data_dir)
+    (data_dir / "innovation.csv").unlink()
+    for combined in (load_combined_data(base), load_combined_data(base)):
+        assert statuses(combined)["innovation.csv"] == "missing"
+        assert "Innovation" not in set(combined["Source"].astype(str))
+        assert len(combined) > 0
+
+
+def test_invalid_source_stays_invalid_after_a_cache_reload(data_dir):
+    base = str(data_dir)
+    path = data_dir / "Entrepreneurship.csv"
+    pd.read_csv(path).drop(columns="Value").to_csv(path, index=False)
+
+    parsed = load_combined_data(base)
+    assert statuses(parsed)["Entrepreneurship.csv"] == "invalid"
+    assert "Value" in entry(parsed, "Entrepreneurship.csv")["error"]
+    cached = load_combined_data(base)
+    assert statuses(cached)["Entrepreneurship.csv"] == "invalid"
+    assert entry(cached, "Entrepreneurship.csv")["error"] == entry(parsed, "Entrepreneurship.csv")["error"]
+    assert statuses(cached)["Employment.csv"] == "cached"
+
+
+def test_source_without_rows_is_empty_after_a_cache_reload(data_dir):
+    base = str(data_dir)
+    path = data_dir / "Senior_Management.csv"
+    pd.read_csv(path).head(0).to_csv(path, index=False)
+
+    parsed = load_combined_data(base)
+    assert statuses(parsed)["Senior_Management.csv"] == "ok"
+    assert entry(parsed, "Senior_Management.csv")["rows"] == 0
+    assert statuses(load_combined_data(base))["Senior_Management.csv"] == "empty"
+
+
+def test_streaming_cache_reports_invalid_sources(data_dir):
+    base = str(data_dir)
+    path = data_dir / "Entrepreneurship.csv"
+    pd.read_csv(path).drop(columns="Country").to_csv(path, index=False)
+    combined = load_combined_data(base, streaming=True)
+    assert statuses(combined)["Entrepreneurship.csv"] == "invalid"
+
+
+def test_no_readable_source_fails(data_dir):
+    for name in SOURCE_FILES:
+        (data_dir / name).write_text("a,b\n1,2\n")
+    frames, report = read_sources(source_paths(str(data_dir)))
+    assert frames == [] and {e["status"] for e in report} == {"invalid"}
+    with pytest.raises(FileNotFoundError):
+        load_combined_data(str(data_dir))
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+# Compared as source values: the backends type categories and timestamps differently
+COLUMNS = ["Country", "Year", "Technology or Sector", "Topic", "Indicator", "Indicator Categories",
+           "Unit", "Value", "Number of observations", "Source"]
+
+QUERIES = [
+    (["France"], "Employment", {}),
+    (["Spain", "France"], "Employment", {"year_range": (2014, 2018)}),
+    (["Germany", "Atlantis"], None, {}),
+    (["France", "Germany"], "Employment", {"family": "wage_gap", "value_range": (-20, 20)}),
+    (["France"], "Innovation", {"family": "female_inventors", "sector": "Energy"}),
+    (["Italy"], "Senior Management", {"indicator": "Share of female senior managers by role"}),
+    (["Norway"], "Senior Management", {"family": "senior_managers", "exclude_category": r"^\d{4}s$"}),
+    (["France"], "Entrepreneurship", {"year_range": (2030, 2040)}),
+]
+
+
+def normalized(frame):
+    frame = frame[COLUMNS].reset_index(drop=True)
+    return frame.astype({c: object for c in COLUMNS if c not in ("Year", "Value", "Number of observations")})
+
+
+def test_summary_matches(dataset, sqlite_dataset):
+    assert sqlite_dataset.version == dataset.version
+    assert len(sqlite_dataset) == len(dataset)
+    assert sqlite_dataset.countries == dataset.countries
+    assert sqlite_dataset.topics == dataset.topics
+    assert [int(y) for y in sqlite_dataset.years] == [int(y) for y in dataset.years]
+    assert sqlite_dataset.availability == dataset.availability
+
+
+@pytest.mark.parametrize("countries,topic,filters", QUERIES)
+def test_select_matches(dataset, sqlite_dataset, countries, topic, filters):
+    expected = normalized(dataset.select(countries, topic, **filters))
+    actual = normalized(sqlite_dataset.select(countries, topic, **filters))
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize("countries,topic,filters", QUERIES)
+def test_iter_rows_matches(dataset, sqlite_dataset, countries, topic, filters):
+    chunks = list(sqlite_dataset.iter_rows(countries, topic, COLUMNS, chunk_rows=50, **filters))
+    assert all(len(chunk) <= 50 for chunk in chunks)
+    expected = normalized(dataset.rows(countries, topic, COLUMNS, **filters))
+    if not chunks:
+        assert expected.empty
+        return
+    pd.testing.assert_frame_equal(normalized(pd.concat(chunks)), expected, check_dtype=False)
+
+
+@pytest.mark.parametrize("countries,topic,filters", QUERIES)
+@pytest.mark.parametrize("column", ["Indicator", "Technology or Sector"])
+def test_group_means_match(dataset, sqlite_dataset, countries, topic, filters, column):
+    # The backends order the labels differently
+    expected = dict(zip(*dataset.group_means(column, countries, topic, **filters)))
+    actual = dict(zip(*sqlite_dataset.group_means(column, countries, topic, **filters)))
+    assert actual.keys() == expected.keys()
+    for label in expected:
+        np.testing.assert_allclose(actual[label], expected[label], rtol=1e-6)
+
+
+@pytest.mark.parametrize("countries,topic,filters", QUERIES)
+@pytest.mark.parametrize("by", [None, "Technology or Sector", "Indicator Categories"])
+def test_trend_matches(dataset, sqlite_dataset, countries, topic, filters, by):
+    years, labels, matrix = dataset.trend(countries, topic, by=by, **filters)
+    sql_years, sql_labels, sql_matrix = sqlite_dataset.trend(countries, topic, by=by, **filters)
+    assert list(sql_years) == list(years)
+    assert list(sql_labels) == list(labels)
+    np.testing.assert_allclose(sql_matrix, matrix, rtol=1e-6, equal_nan=True)
+
+
+def test_kpis_match(dataset, sqlite_dataset):
+    for countries in (["France"], ["France", "Spain", "Norway"], dataset.countries):
+        for year_range in ((2010, 2018), (2014, 2014), (2011, 2013)):
+            expected = dataset.kpis.means(countries, year_range)
+            actual = sqlite_dataset.kpis.means(countries, year_range)
+            for name in expected:
+                np.testing.assert_allclose(actual[name], expected[name], rtol=1e-9, equal_nan=True)
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from trends import trend_matrix, trend_series
+
+
+def expected(frame, by):
+    means = frame.groupby(["Year", by], observed=True)["Value"].mean().dropna()
+    return {(int(year), label): mean for (year, label), mean in means.items()}
+
+
+def actual(years, labels, matrix):
+    return {(int(year), label): matrix[i, j] for i, year in enumerate(years)
+            for j, label in enumerate(labels) if not np.isnan(matrix[i, j])}
+
+
+@pytest.fixture
+def frame():
+    country = pd.Categorical(["France", "Spain", "France", "Spain", "France", "Spain", None, "France"],
+                             categories=["Atlantis", "France", "Spain"])
+    return pd.DataFrame({
+        "Year": np.array([2010, 2010, 2010, 2011, 2011, 2012, 2012, 2012], dtype=np.int16),
+        "Country": country,
+        "Value": pd.array([1.0, 2.0, 3.0, None, 5.0, 6.0, 7.0, np.nan], dtype="Float64"),
+    })
+
+
+def test_matches_groupby_means(frame):
+    years, labels, matrix = trend_matrix(frame, by="Country")
+    assert list(years) == [2010, 2011, 2012]
+    # The unused level gets no series; missing labels and Values are ignored
+    assert labels == ["France", "Spain"]
+    assert matrix.shape == (3, 2)
+    assert actual(years, labels, matrix) == pytest.approx(expected(frame, "Country"))
+    assert np.isnan(matrix[2, 0]) and np.isnan(matrix[1, 1])
+
+
+def test_single_year(frame):
+    one_year = frame[frame["Year"] == 2010]
+    years, labels, matrix = trend_matrix(one_year, by="Country")
+    assert list(years) == [2010]
+    assert actual(years, labels, matrix) == pytest.approx(expected(one_year, "Country"))
+
+
+def test_without_by_is_one_series(frame):
+    years, labels, matrix = trend_matrix(frame)
+    assert labels == [None]
+    means = frame.groupby("Year")["Value"].mean()
+    np.testing.assert_allclose(matrix[:, 0], means.to_numpy(dtype=float, na_value=np.nan))
+
+
+def test_no_rows():
+    empty = pd.DataFrame({"Year": np.array([], dtype=np.int16), "Country": pd.Categorical([]),
+                          "Value": np.array([], dtype=float)})
+    years, labels, matrix = trend_matrix(empty, by="Country")
+    assert len(years) == 0 and labels == [] and matrix.shape == (0, 0)
+
+
+def test_series_skip_missing_years(frame):
+    series = dict((label, (years, means)) for label, years, means in
+                  trend_series(*trend_matrix(frame, by="Country")))
+    assert list(series["France"][0]) == [2010, 2011]
+    np.testing.assert_allclose(series["France"][1], [2.0, 5.0])
+    assert list(series["Spain"][0]) == [2010, 2012]
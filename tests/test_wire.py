@@ -0,0 +1,93 @@
+import copy
+import gzip
+import json
+
+import dash
+import pytest
+from dash import dcc, html
+
+from wire import CODE_KEY, WireFormat, encode_labels
+
+
+def decode(value, labels):
+    if isinstance(value, dict):
+        if set(value) == {CODE_KEY}:
+            return [labels[code] for code in value[CODE_KEY]]
+        return {k: decode(v, labels) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode(v, labels) for v in value]
+    return value
+
+
+def test_encode_labels_codes_only_lists_made_of_known_labels():
+    index = {"France": 0, "Spain": 1}
+    value = {"x": ["France", "Spain"], "y": ["France", "Mars"], "z": [1, 2], "n": [{"c": ["Spain"]}], "e": []}
+    assert encode_labels(value, index) == {"x": {CODE_KEY: [0, 1]}, "y": ["France", "Mars"], "z": [1, 2],
+                                           "n": [{"c": {CODE_KEY: [1]}}], "e": []}
+    assert decode(encode_labels(value, index), ["France", "Spain"]) == value
+
+
+def make_client(store, **options):
+    app = dash.Dash(__name__)
+    countries = store.current().countries
+    app.layout = html.Div([dcc.Dropdown(id="country", options=countries, value=countries[0])])
+    wire = WireFormat(store, **options)
+    wire.attach(app)
+    return app.server.test_client()
+
+
+def test_compact_layout_round_trips_through_the_label_dictionary(store):
+    client = make_client(store, compact=True, compress=False)
+    plain = client.get("/_dash-layout").get_json()
+    response = client.get("/_dash-layout", headers={"X-Compact-Labels": "1"})
+    coded = response.get_json()
+    assert coded != plain
+    assert CODE_KEY in json.dumps(coded)
+    version = response.headers["X-Label-Dictionary"]
+    assert version == store.current().version
+    labels = client.get(f"/_wire-labels/{version}")
+    assert "immutable" in labels.headers["Cache-Control"]
+    assert decode(coded, labels.get_json()) == plain
+    assert client.get("/_wire-labels/unknown").status_code == 404
+
+
+def test_uncoded_without_the_request_header(store):
+    client = make_client(store, compact=True, compress=False)
+    response = client.get("/_dash-layout")
+    assert "X-Label-Dictionary" not in response.headers
+    assert CODE_KEY not in response.get_data(as_text=True)
+
+
+def test_matching_etag_is_answered_304_until_the_version_changes(store):
+    client = make_client(store, compress=False)
+    first = client.get("/_dash-layout")
+    etag = first.headers["ETag"]
+    assert etag.startswith(f'W/"{store.current().version}-')
+
+    again = client.get("/_dash-layout", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.get_data() == b""
+    assert again.headers["ETag"] == etag
+
+    reloaded = copy.copy(store.current())
+    reloaded.version = "next"
+    store.swap(reloaded)
+    after = client.get("/_dash-layout", headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    assert after.headers["ETag"] != etag
+    assert after.get_json() == first.get_json()
+
+
+@pytest.mark.parametrize("min_bytes,compressed", [(1, True), (10**9, False)])
+def test_compression_above_the_threshold(store, min_bytes, compressed):
+    client = make_client(store, compress=True, min_bytes=min_bytes)
+    plain = make_client(store, compress=False).get("/_dash-layout").get_data()
+    response = client.get("/_dash-layout", headers={"Accept-Encoding": "gzip"})
+    body = response.get_data()
+    if compressed:
+        assert response.headers["Content-Encoding"] == "gzip"
+        body = gzip.decompress(body)
+    else:
+        assert "Content-Encoding" not in response.headers
+    assert body == plain
+    assert "Accept-Encoding" in response.headers["Vary"]
@@ -0,0 +1,53 @@
+"""
+Vectorized engine behind the time-series charts.
+
+`trend_matrix` turns rows into a Year x series matrix of mean Values in a
+single pass: rows are binned by (year, series) code and summed with
+np.bincount, so the cost is linear in the rows whatever the number of
+series (indicator categories, overlaid countries, ...).
+"""
+import numpy as np
+
+
+def trend_matrix(frame, by=None, value="Value"):
+    """
+    Mean `value` per Year and per distinct `by` value of `frame`.
+
+    Returns (years, labels, matrix): the sorted years, the series labels in
+    order of first appearance, and a float64 array of shape
+    (len(years), len(labels)) that is NaN where a series has no rows for a
+    year. Without `by` there is one series, labelled None. Rows with a
+    missing `by` label or Value are ignored.
+    """
+    import pandas as pd
+
+    values = frame[value].to_numpy(dtype=np.float64, na_value=np.nan)
+    if by is None:
+        codes, labels = np.zeros(len(frame), dtype=np.intp), [None]
+    else:
+        codes, uniques = pd.factorize(frame[by], sort=False)
+        labels = list(uniques)
+    row_years = frame["Year"].to_numpy()
+    keep = (codes >= 0) & ~np.isnan(values)
+    if not keep.all():
+        codes, values, row_years = codes[keep], values[keep], row_years[keep]
+
+    years, year_idx = np.unique(row_years, return_inverse=True)
+    n_series = len(labels)
+    flat = year_idx * n_series + codes
+    size = len(years) * n_series
+    sums = np.bincount(flat, weights=values, minlength=size).reshape(len(years), n_series)
+    counts = np.bincount(flat, minlength=size).reshape(len(years), n_series)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        matrix = np.where(counts > 0, sums / counts, np.nan)
+    return years, labels, matrix
+
+
+def trend_series(years, labels, matrix):
+    """[(label, years, means)] per column of a trend matrix, skipping the years a series has no data."""
+    series = []
+    for i, label in enumerate(labels):
+        column = matrix[:, i]
+        present = ~np.isnan(column)
+        series.append((label, years[present], column[present]))
+    return series
@@ -1,14 +1,292 @@
-import pandas as pd
+import glob
+import hashlib
+import json
+import logging
 import os
+import time
 
-def load_combined_data():
-    base = r"C:\Users\niyim\Downloads\gender-gap-dash\data"
-    files = ["Employment.csv", "innovation.csv", "Senior_Management.csv", "Entrepreneurship.csv"]
-    dfs = []
-    for f in files:
-        df = pd.read_csv(os.path.join(base, f))
-        df["Source"] = f.split(".")[0].capitalize().replace("_", " ")
-        dfs.append(df)
+# pandas is imported by the functions that need it, so the path and
+# fingerprint helpers stay cheap to import (app startup)
+
+logger = logging.getLogger(__name__)
+
+# Data root: DATA_DIR from the environment, else the data/ folder next to this file
+DATA_DIR = os.environ.get("DATA_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# Source manifest: file under the data root -> the Topic (dashboard tab) it
+# holds. A sources.json of the same shape in the data root replaces it.
+SOURCES = {
+    "Employment.csv": "Employment",
+    "innovation.csv": "Innovation",
+    "Senior_Management.csv": "Senior Management",
+    "Entrepreneurship.csv": "Entrepreneurship",
+}
+SOURCE_FILES = list(SOURCES)
+MANIFEST_FILE = "sources.json"
+# A source without these columns is skipped (its tab shows as unavailable)
+REQUIRED_COLUMNS = ["Country", "Year", "Topic", "Indicator", "Value"]
+
+# Bump whenever the compact layout below changes so stale caches get rebuilt
+CACHE_SCHEMA = 1
+CACHE_DIRNAME = ".cache"
+
+# Low-cardinality text columns are stored as categoricals (one copy of each string)
+CATEGORY_COLUMNS = ["Country", "Technology or Sector", "Topic", "Indicator",
+                    "Indicator Categories", "Unit", "Source"]
+CSV_DTYPES = {col: "category" for col in CATEGORY_COLUMNS if col != "Source"}
+CSV_DTYPES.update({
+    "Year": "int16",
+    "Value": "float32",
+    "Number of observations": "Int32",
+})
+
+
+def source_name(filename):
+    return filename.split(".")[0].capitalize().replace("_", " ")
+
+
+def source_manifest(base):
+    """{filename: topic} of the sources expected under `base`."""
+    try:
+        with open(os.path.join(base, MANIFEST_FILE)) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return dict(SOURCES)
+
+
+def source_paths(base):
+    """Paths of every source in the manifest of `base`, whether present or not."""
+    return [os.path.join(base, f) for f in source_manifest(base)]
+
+
+def source_fingerprint(paths):
+    """Short hash of the source files' size and mtime, used as the dataset version."""
+    stamp = [CACHE_SCHEMA]
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            # A source that appears later changes the version too
+            stamp.append([os.path.basename(path), None])
+            continue
+        stamp.append([os.path.basename(path), st.st_size, st.st_mtime_ns])
+    return hashlib.sha1(json.dumps(stamp).encode()).hexdigest()[:16]
+
+
+def check_columns(columns, path):
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise ValueError(f"{os.path.basename(path)} lacks required columns {missing}")
+
+
+def read_source(path):
+    import pandas as pd
+
+    df = pd.read_csv(path, dtype=CSV_DTYPES)
+    check_columns(df.columns, path)
+    df["Source"] = pd.Categorical([source_name(os.path.basename(path))] * len(df))
+    if "updated_at" in df.columns:
+        df["updated_at"] = pd.to_datetime(df["updated_at"], unit="ms", utc=True)
+    return df
+
+
+def _read_timed(path):
+    started = time.perf_counter()
+    df = read_source(path)
+    return df, time.perf_counter() - started
+
+
+def read_sources(paths, workers=None):
+    """
+    Parse the present sources in `paths` concurrently. Returns (frames, report)
+    where report has one entry per path: file, status (ok / missing /
+    invalid), rows, seconds and error. Missing or unreadable sources are
+    reported and skipped rather than failing the load.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    report = {os.path.basename(p): {"file": os.path.basename(p), "status": "missing", "rows": 0,
+                                    "seconds": None, "error": None} for p in paths}
+    present = [p for p in paths if os.path.exists(p)]
+    # Largest first: the load then takes about as long as the largest file
+    present.sort(key=os.path.getsize, reverse=True)
+    workers = workers or int(os.environ.get("INGEST_WORKERS", 0)) or min(len(present), os.cpu_count() or 1) or 1
+
+    frames = {}
+    # pandas' C parser releases the GIL, so threads overlap the files without
+    # pickling the frames back from worker processes
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest") as pool:
+        futures = {path: pool.submit(_read_timed, path) for path in present}
+        for path, future in futures.items():
+            entry = report[os.path.basename(path)]
+            try:
+                df, seconds = future.result()
+            except (ValueError, OSError) as exc:
+                entry.update(status="invalid", error=str(exc))
+                logger.warning("Skipping source %s: %s", entry["file"], exc)
+                continue
+            frames[path] = df
+            entry.update(status="ok", rows=len(df), seconds=seconds)
+            logger.info("Loaded %s: %d rows in %.2fs", entry["file"], len(df), seconds)
+    for entry in report.values():
+        if entry["status"] == "missing":
+            logger.warning("Source %s is missing; its tab will show no data", entry["file"])
+    # Frames keep the manifest order so the combined row order does not depend on timing
+    return [frames[p] for p in paths if p in frames], list(report.values())
+
+
+def concat_compact(dfs):
+    """pd.concat that keeps categorical columns categorical across frames."""
+    import pandas as pd
+    from pandas.api.types import union_categoricals
+
+    dfs = [d for d in dfs if len(d)]
+    if not dfs:
+        return pd.DataFrame(columns=list(CSV_DTYPES) + ["Source"])
     combined = pd.concat(dfs, ignore_index=True)
+    for col in CATEGORY_COLUMNS:
+        if col in combined.columns and not isinstance(combined[col].dtype, pd.CategoricalDtype):
+            combined[col] = union_categoricals([d[col] for d in dfs], ignore_order=True)
     return combined
 
+
+def cache_paths(base, version):
+    """(compact store, KPI partials) cache files for a dataset version."""
+    directory = os.path.join(base, CACHE_DIRNAME)
+    return (os.path.join(directory, f"combined-{version}.parquet"),
+            os.path.join(directory, f"kpis-{version}.parquet"))
+
+
+def remove_stale_caches(base, version):
+    """Drop caches built from older versions of the sources."""
+    for pattern in ("combined-*.parquet", "kpis-*.parquet", "shared-*.arrow", "query-*.sqlite",
+                    "layout-*.json"):
+        for stale in glob.glob(os.path.join(base, CACHE_DIRNAME, pattern)):
+            if f"-{version}." not in os.path.basename(stale):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+
+def layout_meta_path(base, version):
+    return os.path.join(base, CACHE_DIRNAME, f"layout-{version}.json")
+
+
+def save_layout_meta(base, data):
+    """Keep the option lists the layout needs from a loaded dataset, for the next cold start."""
+    path = layout_meta_path(base, data.version)
+    if os.path.exists(path):
+        return
+    meta = {
+        "version": data.version,
+        "countries": list(data.countries),
+        "years": [int(y) for y in data.years],
+        "topics": list(data.topics),
+        "availability": data.availability,
+    }
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "w") as fh:
+            json.dump(meta, fh)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def load_layout_meta(base):
+    """Option lists saved for the current sources (see save_layout_meta), or None."""
+    try:
+        version = source_fingerprint(source_paths(base))
+        with open(layout_meta_path(base, version)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    df.to_parquet(tmp, engine="pyarrow", index=False)
+    os.replace(tmp, path)
+
+
+def save_cache(base, version, df, kpi_partials=None):
+    """Write a snapshot (and optionally its KPI partials) as the cache for `version`."""
+    store_path, kpi_path = cache_paths(base, version)
+    _write_cache(df, store_path)
+    if kpi_partials is not None:
+        _write_cache(kpi_partials, kpi_path)
+    remove_stale_caches(base, version)
+
+
+def load_combined_data(base=DATA_DIR, use_cache=True, streaming=False, memory_limit_mb=None):
+    """
+    Compact combined frame for the sources under `base`. With `streaming`, a
+    cache miss is filled by the chunked ingest in ingest.py instead of
+    parsing every file into memory first.
+    """
+    import pandas as pd
+
+    paths = source_paths(base)
+    version = source_fingerprint(paths)
+    cache, _ = cache_paths(base, version)
+
+    if use_cache and streaming and not os.path.exists(cache):
+        from ingest import DEFAULT_MEMORY_MB, stream_ingest
+        stream_ingest(base, memory_limit_mb or DEFAULT_MEMORY_MB)
+
+    if use_cache and os.path.exists(cache):
+        combined = pd.read_parquet(cache, engine="pyarrow")
+        sources = cached_source_report(combined, paths)
+    else:
+        frames, sources = read_sources(paths)
+        if not frames:
+            raise FileNotFoundError(f"No readable data sources under {base} "
+                                    f"(expected {[os.path.basename(p) for p in paths]})")
+        combined = concat_compact(frames)
+        if use_cache:
+            try:
+                _write_cache(combined, cache)
+                remove_stale_caches(base, version)
+            except OSError:
+                pass  # read-only data dir: just parse every time
+
+    combined.attrs["version"] = version
+    combined.attrs["sources"] = sources
+    return combined
+
+
+def cached_source_report(combined, paths):
+    """
+    read_sources-style report for a frame loaded from the cache. A present
+    source with no cached rows has its header re-checked, so one that was
+    skipped as invalid is not reported as empty.
+    """
+    import pandas as pd
+
+    rows = combined["Source"].value_counts()
+    report = []
+    for path in paths:
+        name = os.path.basename(path)
+        count = int(rows.get(source_name(name), 0))
+        status, error = "missing" if not os.path.exists(path) else "cached" if count else "empty", None
+        if status == "empty":
+            try:
+                check_columns(pd.read_csv(path, nrows=0).columns, path)
+            except (ValueError, OSError) as exc:
+                status, error = "invalid", str(exc)
+        report.append({"file": name, "status": status,
+                       "rows": count, "seconds": None, "error": error})
+    return report
+
+
+def load_kpi_partials(base, version):
+    """KPI partial aggregates written by the streaming ingest, or None."""
+    import pandas as pd
+
+    _, path = cache_paths(base, version)
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path, engine="pyarrow")
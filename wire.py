@@ -0,0 +1,169 @@
+"""
+Transport of Dash responses: label coding, conditional requests, compression.
+
+Figure payloads repeat long category labels (a sector name of 100+
+characters per treemap tile, an Indicator per Employment bar). With
+COMPACT_WIRE=1, a JSON list made only of dataset labels is sent as
+{"__l": [codes]} into a per-version label dictionary. The browser
+(assets/wire.js) fetches the dictionary once per page from
+/_wire-labels/<version> (immutable, cached) and restores the lists before
+Dash's renderer sees the response. Only requests that announce support
+(X-Compact-Labels) get coded responses.
+
+Every callback and layout response also gets a weak ETag, made of the
+dataset version and a hash of the body. A request whose If-None-Match
+matches is answered 304 with no body, and wire.js replays its copy.
+Bodies over WIRE_COMPRESS_MIN_BYTES are compressed with brotli when the
+module is installed and the client accepts it, else with gzip.
+WIRE_COMPRESS=0 turns compression off, e.g. behind a compressing proxy.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+from memory import deep_size
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CODE_KEY = "__l"
+PATHS = ("_dash-update-component", "_dash-layout")
+
+
+def _loads(body):
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+def _dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def encode_labels(value, index):
+    """Copy of a decoded JSON `value` with every list of known labels replaced by its codes."""
+    if isinstance(value, list):
+        if value and all(isinstance(v, str) and v in index for v in value):
+            return {CODE_KEY: [index[v] for v in value]}
+        return [encode_labels(v, index) for v in value]
+    if isinstance(value, dict):
+        return {k: encode_labels(v, index) for k, v in value.items()}
+    return value
+
+
+class WireFormat:
+    """after_request processing for the Dash endpoints, bound to a DatasetStore."""
+
+    def __init__(self, store, compact=False, compress=True, min_bytes=1024, gzip_level=6,
+                 dictionaries=2):
+        self.store = store
+        self.compact = compact
+        self.compress = compress
+        self.min_bytes = min_bytes
+        self.gzip_level = gzip_level
+        # A page loaded just before a reload may still ask for the previous version
+        self._dictionaries = OrderedDict()
+        self._max_dictionaries = dictionaries
+        self._lock = threading.Lock()
+
+    def attach(self, app):
+        server = app.server
+        prefix = app.config.routes_pathname_prefix
+        server.add_url_rule(prefix + "_wire-labels/<version>", "wire_labels", self.labels_endpoint)
+        server.after_request(self.process)
+
+    def dictionary(self, data):
+        """(labels, {label: code}) for a loaded dataset."""
+        with self._lock:
+            entry = self._dictionaries.get(data.version)
+            if entry is None:
+                labels = data.category_labels()
+                entry = (labels, {label: code for code, label in enumerate(labels)})
+                self._dictionaries[data.version] = entry
+                while len(self._dictionaries) > self._max_dictionaries:
+                    self._dictionaries.popitem(last=False)
+            else:
+                self._dictionaries.move_to_end(data.version)
+            return entry
+
+    def memory_usage(self):
+        with self._lock:
+            return deep_size(list(self._dictionaries.values()))
+
+    def clear(self):
+        """Drop the label dictionaries; the current one is rebuilt on the next response."""
+        with self._lock:
+            self._dictionaries.clear()
+
+    def labels_endpoint(self, version):
+        data = self.store.peek()
+        if data is not None and data.version == version:
+            labels, _ = self.dictionary(data)
+        else:
+            with self._lock:
+                entry = self._dictionaries.get(version)
+            if entry is None:
+                return Response("Unknown label dictionary", status=404)
+            labels = entry[0]
+        response = Response(_dumps(labels), mimetype="application/json")
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return self._compressed(response, response.get_data())
+
+    def process(self, response):
+        if (response.status_code != 200 or response.direct_passthrough
+                or not request.path.endswith(PATHS) or "Content-Encoding" in response.headers):
+            return response
+        data = self.store.peek()
+        if data is None:
+            # Lazy start: the layout is served before the data (and its labels) is loaded
+            return response
+        body = response.get_data()
+
+        if self.compact and request.headers.get("X-Compact-Labels") == "1":
+            _, index = self.dictionary(data)
+            body = _dumps(encode_labels(_loads(body), index))
+            response.headers["X-Label-Dictionary"] = data.version
+
+        etag = f"{data.version}-{hashlib.sha1(body).hexdigest()[:20]}"
+        response.set_etag(etag, weak=True)
+        if request.if_none_match.contains_weak(etag):
+            not_modified = Response(status=304)
+            not_modified.set_etag(etag, weak=True)
+            return not_modified
+        response.set_data(body)
+        return self._compressed(response, body)
+
+    def _compressed(self, response, body):
+        response.vary.add("Accept-Encoding")
+        if not self.compress or len(body) < self.min_bytes:
+            return response
+        accepted = request.accept_encodings
+        if brotli is not None and accepted["br"]:
+            response.set_data(brotli.compress(body, quality=5))
+            response.headers["Content-Encoding"] = "br"
+        elif accepted["gzip"]:
+            response.set_data(gzip.compress(body, self.gzip_level))
+            response.headers["Content-Encoding"] = "gzip"
+        return response
+
+
+def wire_from_env(store):
+    """WireFormat configured from COMPACT_WIRE, WIRE_COMPRESS and WIRE_COMPRESS_MIN_BYTES."""
+    return WireFormat(
+        store,
+        compact=os.environ.get("COMPACT_WIRE") == "1",
+        compress=os.environ.get("WIRE_COMPRESS", "1") != "0",
+        min_bytes=int(os.environ.get("WIRE_COMPRESS_MIN_BYTES", 1024)),
+    )
@@ -0,0 +1,29 @@
+"""
+WSGI entry point for multi-process servers:
+
+    gunicorn -c gunicorn.conf.py wsgi:server
+
+The dataset is materialized once into a memory-mapped Arrow file (by the
+on_starting hook in gunicorn.conf.py, or here if that file does not exist
+yet) and every worker maps it read-only instead of loading its own copy.
+On a reload, one worker builds the file for the new sources and every
+worker maps that one.
+With QUERY_BACKEND=sqlite the workers instead open the on-disk SQLite store
+(also built once by on_starting). With LAZY_START=1 a worker accepts
+requests before the data is mapped (see app.create_app).
+"""
+import os
+
+from app import create_app
+
+
+def load_shared():
+    from shared import ensure_shared, open_shared
+    return open_shared(ensure_shared())
+
+
+if os.environ.get("QUERY_BACKEND", "pandas") == "sqlite":
+    app = create_app()
+else:
+    app = create_app(loader=load_shared, merge=False)
+server = app.server